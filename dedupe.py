@@ -3,21 +3,37 @@
 from __future__ import print_function, division, unicode_literals
 
 import re
+import sys
 import time
+import random
 import json
+import signal
 import logging
 import argparse
-from collections import OrderedDict, defaultdict, Counter
+from itertools import chain
+from collections import OrderedDict, defaultdict, Counter, deque
+from multiprocessing import Pool, cpu_count
 from operator import itemgetter
 
 from readchar import readchar
+from sqlalchemy import select, bindparam, func as sql_func
 from Levenshtein import ratio as str_similarity
 
-from lib.common import getFilteredPaths, path_usable_str
+from lib.common import path_usable_str
 from lib.log_handling import LogManager, OutputManager
 from lib.alchemy_db import AlchemyDatabase, DBTable
 from lib.output_formatting import fTime, Printer, format_percent, format_output, OutputTable, OutputColumn
 from lib.mp3_handling import MusicFile, MusicFileOpenException, NoTagVal, TagVersionMismatchException, AcoustidDB, TagReplacementDB, TagValueException
+from lib.mp3_handling import stream_hashes, partial_hash
+from lib.audio_region import reference_audio_hash
+from lib.acoustid_lookup import cache_key
+from lib.scan_index import ScanIndex
+from lib.music_tags import MusicTags, tag_rows
+from lib.snapshot import MusicSnapshot
+from lib.fingerprints import FingerprintCache
+from lib.audio_frames import FrameHashCache, audio_frames_hash
+from lib.frame_index import FrameIndexCache, build_frame_index
+from lib.near_dupes import NearDupeIndex, FingerprintDecodeException, decode_fingerprint, cluster
 from lib._constants import tag_name_map
 from songinfo import show_songinfo
 
@@ -48,6 +64,12 @@ def main():
 
     parser1 = sparsers.add_parser("scan", help="Scan the given directory")
     parser1.add_argument("scan_dir", help="The directory to scan for music")
+    parser1.add_argument("--workers", "-w", type=int, default=1, help="Number of worker processes used to hash/parse files; 0 to use 1 per CPU (default: %(default)s)")
+    parser1.add_argument("--staged", "-s", action="store_true", default=False, help="Skip the full-file hash of new / changed files; the full analysis mode of the dupes / unique reports only hashes files that share a size and partial hash with another file")
+    parser1.add_argument("--fingerprint", "-f", action="store_true", default=False, help="After scanning, generate acoustic fingerprints for audio that has not been fingerprinted yet")
+    parser1.add_argument("--fingerprint_workers", "-fw", type=int, metavar="N", help="Number of worker processes used for fingerprinting; 0 to use 1 per CPU (default: same as --workers)")
+    parser1.add_argument("--precise", "-p", action="store_true", default=False, help="After scanning, index every MPEG frame of audio that has not been indexed yet, and replace the estimated length / bitrate of each file with the exact values")
+    parser1.add_argument("--frame_hash", "-fh", action="store_true", default=False, help="After scanning, hash only the MPEG audio frames (excluding Xing / LAME header frames) of audio that has not been frame-hashed yet, for the frames analysis mode of the dupes / unique reports")
     parser2 = sparsers.add_parser("view", help="View current DB")
     parser2.add_argument("--tags", "-t", nargs="+", help="Only include MP3s with the given tags")
 
@@ -55,11 +77,20 @@ def main():
     #parser3.add_argument("scan_dir", help="The directory to scan for music")
 
     parser4 = sparsers.add_parser("report", help="")
-    parser4.add_argument("report_name", choices=("mismatch", "unique", "dupes", "sketchy", "tag_popularity", "files_with_tag", "name_variations"), help="Name of report to run")
-    parser4.add_argument("--analysis_mode", "-am", choices=("audio", "full"), default="full", help="")
+    parser4.add_argument("report_name", choices=("mismatch", "unique", "dupes", "near_dupes", "sketchy", "bitrates", "tag_popularity", "files_with_tag", "name_variations"), help="Name of report to run")
+    parser4.add_argument("--analysis_mode", "-am", choices=("audio", "full", "frames"), default="full", help="")
     parser4.add_argument("--tag", "-t", help="Tag to find for files_with_tag report")
+    parser4.add_argument("--similarity", "-s", type=float, default=0.8, help="Minimum fingerprint similarity (1 - bit error rate) for the near_dupes report (default: %(default)s)")
+    parser4.add_argument("--snapshot", "-S", action="store_true", default=False, help="Use the cached columnar snapshot of the DB for the dupes and unique reports instead of querying it")
+    parser4.add_argument("--refresh", "-r", action="store_true", default=False, help="Rebuild the cached snapshot of the DB even if it is up to date")
 
-    parser5 = sparsers.add_parser("lookup", help="")
+    parser_v = sparsers.add_parser("verify", help="Verify that the stored audio hashes match the original tag-stripping implementation")
+    parser_v.add_argument("--sample", "-n", type=int, metavar="N", help="Only verify a random sample of N files (default: all)")
+
+    parser5 = sparsers.add_parser("lookup", help="Look up fingerprinted files in the AcoustID DB")
+    parser5.add_argument("--workers", "-w", type=int, default=4, help="Number of concurrent lookup requests (default: %(default)s)")
+    parser5.add_argument("--rate", type=float, default=3, help="Maximum number of lookup requests per second (default: %(default)s)")
+    parser5.add_argument("--endpoint", "-e", metavar="URL", help="Base URL of the lookup service, e.g., a local acoustid_standin.py server (default: AcoustID's)")
     parser6 = sparsers.add_parser("organize", help="")
     parser6m = parser6.add_mutually_exclusive_group()
     parser6m.add_argument("--forget", "-F", nargs=2, metavar="field, value", help="Remove rows from the sorting table with the given value in the given field")
@@ -77,7 +108,13 @@ def main():
 
     if args.action == "scan":
         deduper = Deduper(lm, args.db_path)
-        deduper.scan(args.scan_dir)
+        deduper.scan(args.scan_dir, args.workers, not args.staged)
+        if args.fingerprint:
+            deduper.fingerprint(args.workers if args.fingerprint_workers is None else args.fingerprint_workers)
+        if args.precise:
+            deduper.index_frames(args.workers)
+        if args.frame_hash:
+            deduper.frame_hash(args.workers)
     elif args.action == "organize":
         deduper = Deduper(lm, args.db_path)
         if args.forget:
@@ -97,10 +134,14 @@ def main():
                     print(row["path"], json.dumps(tags.keys()))
     elif args.action == "report":
         deduper = Deduper(lm, args.db_path)
-        deduper.report(args.report_name, analysis_mode=args.analysis_mode, find_tag=args.tag)
+        deduper.report(args.report_name, analysis_mode=args.analysis_mode, find_tag=args.tag, use_snapshot=args.snapshot, refresh=args.refresh, min_similarity=args.similarity)
+    elif args.action == "verify":
+        deduper = Deduper(lm, args.db_path)
+        if not deduper.verify_audio_hashes(args.sample):
+            sys.exit(1)
     elif args.action == "lookup":
         deduper = Deduper(lm, args.db_path)
-        deduper.lookup()
+        deduper.lookup(args.workers, args.rate, args.endpoint)
 
 
 class Deduper:
@@ -108,9 +149,12 @@ class Deduper:
         self.lm = OutputManager(log_manager)
         self.lm.verbose("Opening DB: {}".format(db_path))
         self.db = AlchemyDatabase.get_db(db_path, logger=self.lm)
-        self.music = DBTable(self.db, "music", zip(db_columns, db_types), "path")
+        self.music = DBTable(self.db, "music", zip(db_columns, db_types), "path", indexes=["sha256", "audio_sha256", "size"])
         self.fixing = DBTable(self.db, "fixed", zip(fixing_cols, fixing_types), "path")
-        self.acoustid_db = AcoustidDB()
+        self.music_tags = MusicTags(self.db, self.music)
+        self.fingerprints = FingerprintCache(self.db, self.music)
+        self.frame_hashes = FrameHashCache(self.db, self.music)
+        self.frame_indexes = FrameIndexCache(self.db, self.music)
         self.p = Printer("json-pretty")
         self.tag_repl_db = TagReplacementDB.instance
 
@@ -233,6 +277,36 @@ class Deduper:
                 suggest replacement
         """
 
+        fixed = {row["path"]: row.as_dict() for row in self.fixing}
+        new_fields = []
+        try:
+            self._organize_rows(placement_tags, organizing, width_finders, fixed, new_fields)
+        finally:
+            self.fixing.insert_many(new_fields)                     #Keep the answers given so far even if interrupted
+
+        rows = []
+        for artist in sorted(organizing.keys()):
+            for album in sorted(organizing[artist].keys()):
+                for song in sorted(organizing[artist][album], key=itemgetter("track")):
+                    rows.append(song)
+
+        tbl = OutputTable([
+            ("artist", OutputColumn("Artist", width_finders["artist"], True)),
+            ("year", OutputColumn("Year", 4, True)),
+            ("album", OutputColumn("Album", width_finders["album"], True)),
+            ("track", OutputColumn("Track", 5, True)),
+            ("title", OutputColumn("Title", width_finders["title"], True)),
+            ("bitrate", OutputColumn("Bitrate", width_finders["bitrate"], True)),
+            ("path", OutputColumn("Source", width_finders["path"], True)),
+        ])
+        tbl.print_header(True)
+        tbl.print_rows(rows)
+
+    def _organize_rows(self, placement_tags, organizing, width_finders, fixed, new_fields):
+        """
+        Resolves the placement fields for each song, reusing the ones that were previously stored in the fixed table.
+        Newly resolved fields are appended to new_fields so that they can be stored in a single batch.
+        """
         for row in self.music:
             try:
                 song = MusicFile(row["path"], row)
@@ -243,7 +317,7 @@ class Deduper:
                 #continue
 
             try:
-                song_fields = self.fixing[song.file_path]
+                song_fields = fixed[song.file_path]
             except KeyError:
                 song_fields = {"bitrate": song.info["bitrate_readable"], "path": song.file_path}
                 try:
@@ -261,30 +335,12 @@ class Deduper:
                 artist = song_fields["albumArtist"] if song_fields["albumArtist"] else song_fields["artist"]
                 song_fields["artist"] = artist
                 del song_fields["albumArtist"]
-                self.fixing[song.file_path] = song_fields
+                new_fields.append(song_fields)
 
             for field, value in song_fields.iteritems():
                 width_finders[field].add(value)
             organizing[song_fields["artist"]][song_fields["album"]].append(song_fields)
 
-        rows = []
-        for artist in sorted(organizing.keys()):
-            for album in sorted(organizing[artist].keys()):
-                for song in sorted(organizing[artist][album], key=itemgetter("track")):
-                    rows.append(song)
-
-        tbl = OutputTable([
-            ("artist", OutputColumn("Artist", width_finders["artist"], True)),
-            ("year", OutputColumn("Year", 4, True)),
-            ("album", OutputColumn("Album", width_finders["album"], True)),
-            ("track", OutputColumn("Track", 5, True)),
-            ("title", OutputColumn("Title", width_finders["title"], True)),
-            ("bitrate", OutputColumn("Bitrate", width_finders["bitrate"], True)),
-            ("path", OutputColumn("Source", width_finders["path"], True)),
-        ])
-        tbl.print_header(True)
-        tbl.print_rows(rows)
-
     def dedupe(self):
         """
         Generate a deduplication plan
@@ -301,15 +357,12 @@ class Deduper:
             p.pprint([row for row in self.music], include_header=True, add_bar=True)
         else:
             rows = []
-            for row in self.music:
-                orow = {}
-                tags = json.loads(row["tags"])
-                v1, v2 = row["v1"], row["v2"]
-
-                for tid in with_tags:
-                    orow[tid] = tags.get(v2, {}).get(tid, None)
+            for path, frames in self.music_tags.v2_values(with_tags):
+                orow = {tid: None for tid in with_tags}
+                for tid, value in frames:
+                    orow[tid] = value if orow[tid] is None else "{}, {}".format(orow[tid], value)
                 if reduce(lambda a, b: a or b, orow.values()):
-                    orow["path"] = row["path"]
+                    orow["path"] = path
                     rows.append(orow)
 
             cols = [("path", OutputColumn("Path", (rows, "path"), True))]
@@ -324,74 +377,100 @@ class Deduper:
         if report_name == "mismatch":
             cols = ["path", "tag", "v1", "v2", "v1_val", "v2_val"]
             report_rows = []
-            for row in self.music:
-                mismatches = json.loads(row["tag_mismatches"])
-                if mismatches:
-                    tags = json.loads(row["tags"])
-                    v1, v2 = row["v1"], row["v2"]
-                    for tid in mismatches:
-                        report_row = {
-                            "path": row["path"], "tag": tid, "v1": v1, "v2": v2,
-                            "v1_val": tags[v1].get(tid, None), "v2_val": tags[v2].get(tid, None)
-                        }
-                        report_rows.append(OrderedDict([(k, report_row[k]) for k in cols]))
+            mismatched = [
+                (path, v1, v2, json.loads(mismatches)) for path, v1, v2, mismatches in self.music.column_values(
+                    "path", "v1", "v2", "tag_mismatches", where=self.music.table.c.tag_mismatches != "[]"
+                )
+            ]
+            tags = self.music_tags.values_for(path for path, v1, v2, mismatches in mismatched)
+            for path, v1, v2, mismatches in mismatched:
+                file_tags = tags.get(path, {})
+                for tid in mismatches:
+                    v1_val, v2_val = (", ".join(file_tags.get(ver, {}).get(tid, [])) or None for ver in (v1, v2))
+                    report_row = {"path": path, "tag": tid, "v1": v1, "v2": v2, "v1_val": v1_val, "v2_val": v2_val}
+                    report_rows.append(OrderedDict([(k, report_row[k]) for k in cols]))
             p.pprint(report_rows, include_header=True, add_bar=True)
+        elif (report_name in ("unique", "dupes")) and (kwargs["analysis_mode"] == "frames"):
+            if kwargs.get("use_snapshot"):
+                raise ValueError("The frames analysis mode does not support --snapshot")
+            if report_name == "unique":
+                for path in self.frame_hashes.unique_paths():
+                    print(path)
+            else:
+                for frames_hash, paths in self.frame_hashes.duplicate_groups():
+                    print(frames_hash)
+                    for path in paths:
+                        print("\t" + path)
         elif report_name == "unique":
-            for rows in self.analyze(*args, **kwargs).itervalues():
-                if len(rows) == 1:
-                    print(rows[0]["path"])
+            hash_column = self._hash_column(kwargs["analysis_mode"])
+            staged = (hash_column == "sha256") and self.resolve_full_hashes()
+            if kwargs.get("use_snapshot"):
+                snapshot = self.snapshot(kwargs.get("refresh"))
+                paths = snapshot["path"][snapshot.unique(hash_column, include_missing=staged)]
+            else:
+                paths = (path for path, in self.music.unique_rows(hash_column, "path"))
+                if staged:      #Files that were never fully hashed do not share a size / partial hash with any other
+                    unhashed = self.music.column_values("path", where=self.music.table.c.sha256.is_(None))
+                    paths = chain(paths, sorted(path for path, in unhashed))
+            for path in paths:
+                print(path)
         elif report_name == "dupes":
-            for sha256, rows in self.analyze(*args, **kwargs).iteritems():
-                if len(rows) != 1:
-                    print(sha256)
-                    for row in rows:
-                        print("\t" + row["path"])
+            hash_column = self._hash_column(kwargs["analysis_mode"])
+            if hash_column == "sha256":
+                self.resolve_full_hashes()
+            if kwargs.get("use_snapshot"):
+                snapshot = self.snapshot(kwargs.get("refresh"))
+                all_paths = snapshot["path"]
+                groups = ((value, sorted(all_paths[rows])) for value, rows in snapshot.duplicate_groups(hash_column))
+            else:
+                groups = ((value, [path for path, in rows]) for value, rows in self.music.duplicate_groups(hash_column, "path"))
+            for sha256, paths in groups:
+                print(sha256)
+                for path in paths:
+                    print("\t" + path)
+        elif report_name == "near_dupes":
+            clusters = self.near_dupes(kwargs.get("min_similarity", 0.8))
+            if not clusters:
+                print("No near-duplicates found")
+            for i, (best, members) in enumerate(clusters):
+                if i > 0:
+                    print()
+                print("[{}] Best match: {:.2%}".format(i + 1, best))
+                for sim, path, bitrate, length in members:
+                    print("    {:7.2%}  {:>16}  {:>8}  {}".format(sim, bitrate, length, path))
+        elif report_name == "bitrates":
+            snapshot = self.snapshot(kwargs.get("refresh"))
+            report = []
+            cols = ["bitrate", "mode", "count", "percent"]
+            for kbps, mode, count in snapshot.bitrate_distribution():
+                row = {"bitrate": kbps, "mode": mode, "count": count, "percent": format_output(format_percent(count, len(snapshot)), False, None, 6, "r")}
+                report.append(OrderedDict([(k, row[k]) for k in cols]))
+            p.pprint(report, include_header=True, add_bar=True)
         elif report_name == "sketchy":
-            sketchy = [row for row in self.music if row["sketchy"]]
+            snapshot = self.snapshot(kwargs.get("refresh"))
+            sketchy = [self.music[path] for path in snapshot["path"][snapshot.sketchy()]]
             if len(sketchy) > 0:
                 p.pprint(sketchy, include_header=True, add_bar=True)
             else:
                 print("Nothing sketchy!")
         elif report_name == "tag_popularity":
-            count = 0
-            all_tags = Counter()
-            for row in self.music:
-                count += 1
-                tags = json.loads(row["tags"])
-                if row["v2"] is not None:
-                    vtags = tags[row["v2"]]
-                elif row["v1"] is not None:
-                    vtags = tags[row["v1"]]
-                else:
-                    continue
-                all_tags.update(vtags.keys())
-
+            count, all_tags = self.music_tags.popularity()
             print("Rows: {}".format(count))
             report = []
             cols = ["tag", "count", "percent"]
-            for key in sorted(all_tags.keys()):
-                row = {"tag": key, "count": all_tags[key], "percent": format_output(format_percent(all_tags[key], count), False, None, 6, "r")}
+            for key, tag_count in all_tags.iteritems():
+                row = {"tag": key, "count": tag_count, "percent": format_output(format_percent(tag_count, count), False, None, 6, "r")}
                 report.append(OrderedDict([(k, row[k]) for k in cols]))
             p.pprint(report, include_header=True, add_bar=True)
         elif report_name == "files_with_tag":
             find_tag = kwargs["find_tag"].upper()
-            count = 0
-            for row in self.music:
-                tags = json.loads(row["tags"])
-                if row["v2"] is not None:
-                    vtags = tags[row["v2"]]
-                elif row["v1"] is not None:
-                    vtags = tags[row["v1"]]
-                else:
-                    continue
-                if find_tag in vtags:
-                    count += 1
-                    if count > 1:
-                        print()
-                    print(row["path"])
-                    for tag, value in vtags.iteritems():
-                        friendly = tag_name_map.get(tag, "[unknown]")
-                        print("    [{} / {}]: {}".format(tag, friendly, value))
+            for count, (path, frames) in enumerate(self.music_tags.files_with(find_tag)):
+                if count > 0:
+                    print()
+                print(path)
+                for tag, value in frames:
+                    friendly = tag_name_map.get(tag, "[unknown]")
+                    print("    [{} / {}]: {}".format(tag, friendly, value))
         elif report_name == "name_variations":
             # TODO: Improve variation detection (punctuation, equivalent chars (e.g., +/&/and), unicode normalization)
 
@@ -440,85 +519,512 @@ class Deduper:
             if album_variations == 0:
                 print("None!")
 
-    def analyze(self, analysis_mode):
+    def near_dupes(self, min_similarity=0.8):
+        """
+        Finds files whose audio differs, but whose fingerprints are similar enough that they are likely to be
+        re-encodes of the same recording.  Only files that have been fingerprinted (see scan --fingerprint) are included.
+
+        :param float min_similarity: Minimum similarity (1 - bit error rate) between fingerprints
+        :return list: (best similarity, [(similarity, path, bitrate, length)]) for each cluster of similar files, most
+          similar first
+        """
+        index = NearDupeIndex()
+        for audio_hash, fingerprint in self.fingerprints.fingerprinted():
+            try:
+                index.add(audio_hash, decode_fingerprint(fingerprint)[1])
+            except FingerprintDecodeException as e:
+                self.lm.error("Unable to decode fingerprint for audio {}: {}".format(audio_hash, e))
+        self.lm.verbose("Comparing fingerprints for {:,d} distinct audio streams".format(len(index)))
+        clusters = cluster(index.matches(min_similarity))
+
+        files = defaultdict(list)
+        clustered = {audio_hash for best, members in clusters for audio_hash in members}
+        for path, audio_hash, kbps, mode, time_str in self.music.column_values("path", "audio_sha256", "bitrate_kbps", "bitrate_mode", "time"):
+            if audio_hash in clustered:
+                files[audio_hash].append((path, "{} kbps {}".format(kbps, mode), time_str))
+
+        results = []
+        for best, members in clusters:
+            rows = [(sim, path, bitrate, time_str) for audio_hash, sim in members.iteritems() for path, bitrate, time_str in files[audio_hash]]
+            results.append((best, sorted(rows, key=lambda row: (-row[0], row[1]))))
+        return results
+
+    def resolve_full_hashes(self, batch_size=100):
+        """
+        Computes the full hashes that were skipped by staged scans, but only for files that could be identical to some
+        other file.  Files are grouped by size, files that share a size are grouped by a hash of their first and last
+        64 KB, and only the files that still share a group are fully hashed.  Any file left without a full hash is
+        therefore unique.
+
+        :param int batch_size: Number of full hashes to store at a time
+        :return bool: True if any files were scanned without a full hash, False otherwise
+        """
+        music = self.music.table
+        if not self.db.engine.execute(select([sql_func.count()]).where(music.c.sha256.is_(None))).scalar():
+            return False
+
+        to_hash, partially_hashed = [], 0
+        for size, rows in self.music.duplicate_groups("size", "path", "sha256"):
+            if all(full_hash is not None for path, full_hash in rows):
+                continue
+            by_partial = defaultdict(list)
+            for path, full_hash in rows:
+                try:
+                    by_partial[partial_hash(path)].append((path, full_hash))
+                except (IOError, OSError) as e:
+                    self.lm.error("Unable to hash {}: {}".format(path, e))
+            partially_hashed += len(rows)
+            for group in by_partial.itervalues():
+                if len(group) > 1:
+                    to_hash.extend(path for path, full_hash in group if full_hash is None)
+        self.lm.verbose("Partially hashed {:,d} files that share a size; {:,d} need a full hash".format(partially_hashed, len(to_hash)))
+        if not to_hash:
+            return True
+
+        stmt = music.update().where(music.c.path == bindparam("b_path")).values(sha256=bindparam("b_sha256"))
+        rows = []
+        with ProgressMonitor(to_hash, self.lm) as pm:
+            for path in to_hash:
+                pm.incr()
+                try:
+                    rows.append({"b_path": path, "b_sha256": stream_hashes(path, audio_hash=False)[0]})
+                except (IOError, OSError, ValueError) as e:
+                    pm.record_error("Unable to hash {}: {}".format(path, e))
+                if len(rows) >= batch_size:
+                    self.db.engine.execute(stmt, rows)
+                    rows = []
+        if rows:
+            self.db.engine.execute(stmt, rows)
+        return True
+
+    def verify_audio_hashes(self, sample=None):
+        """
+        Recomputes audio hashes with both the zero-copy hashing used by scans and the original implementation, which
+        copied each file and removed its tags with ID3().delete(), and compares them with each other and the DB.
+
+        :param int sample: Number of randomly chosen files to verify (default: all)
+        :return bool: True if every hash matched, False otherwise
+        """
+        rows = list(self.music.column_values("path", "audio_sha256"))
+        if sample is not None:
+            rows = random.sample(rows, min(sample, len(rows)))
+        mismatches = 0
+        with ProgressMonitor(rows, self.lm) as pm:
+            for path, stored in rows:
+                pm.incr()
+                try:
+                    reference = reference_audio_hash(path)
+                except (IOError, OSError) as e:
+                    pm.record_skip(path, "skipped:", e)
+                    continue
+                except ValueError as e:             #ID3().delete fails if the tag's size exceeds the file's size
+                    reference = None
+                try:
+                    current = stream_hashes(path, full_hash=False)[1]
+                except ValueError as e:
+                    current = None
+                if not (reference == current == stored):
+                    mismatches += 1
+                    pm.record_error("Audio hash mismatch for {}: reference={}, current={}, stored={}".format(path, reference, current, stored))
+        self.lm.info("Verified {:,d} audio hashes: {:,d} mismatches".format(len(rows), mismatches))
+        return mismatches == 0
+
+    def snapshot(self, refresh=False):
+        """
+        :param bool refresh: Rebuild the cached snapshot even if the DB has not changed since it was saved
+        :return MusicSnapshot: Columnar snapshot of the music table
+        """
+        return MusicSnapshot.load(self.music, refresh)
+
+    @staticmethod
+    def _hash_column(analysis_mode):
         if analysis_mode not in ("full", "audio"):
             raise ValueError("mode can be full or audio, not {}".format(analysis_mode))
+        return "sha256" if analysis_mode == "full" else "audio_sha256"
 
-        hashkey = "sha256" if analysis_mode == "full" else "audio_sha256"
-        analyzed = defaultdict(list)
-        for row in self.music:
-            analyzed[row[hashkey]].append(row)
-        return analyzed
-
-    def lookup(self):
+    def lookup(self, workers=4, rate=3, base_url=None):
+        acoustid_db = AcoustidDB(base_url=base_url, rate=rate)
+        rows = list(self.music.column_values("path", "duration", "fingerprint", where=self.music.table.c.fingerprint.isnot(None)))
+        responses = acoustid_db.lookup_many(((duration, fingerprint) for path, duration, fingerprint in rows), workers)
         p = Printer("json-pretty")
-        for row in self.music:
-            print("{}:".format(row["path"]))
-            info = self.acoustid_db.lookup(row["duration"], row["fingerprint"])
-            p.pprint(info)
-
-    def scan(self, scan_dir):
-        paths = getFilteredPaths(scan_dir, "mp3")
-        with ProgressMonitor(paths, self.lm) as pm:
-            for file_path in paths:
-                try:
-                    pm.incr()
-                    try:
-                        mf = MusicFile(file_path)
-                    except MusicFileOpenException as e:
-                        pm.record_error(e)
-                        continue
-
-                    if file_path in self.music:
-                        db_file = self.music[file_path]
-                        modified_changed = (db_file["modified"] != mf.modified)
-                        size_changed = (db_file["size"] != mf.size)
-                        if not (modified_changed or size_changed):
-                            pm.record_skip("Skipping", file_path, "(already in db)")
-                            continue
-
-                        why = ["file updated" if modified_changed else None, "size changed" if size_changed else None]
-                        why = " and ".join([reason for reason in why if reason is not None])
-                        pm.record_message("Updating", file_path, "({})".format(why))
+        for path, duration, fingerprint in rows:
+            resp = responses.get(cache_key(duration, fingerprint))
+            if resp is None:
+                continue
+            print("{}:".format(path))
+            p.pprint(acoustid_db.best_track(resp))
+
+    def scan(self, scan_dir, workers=1, full_hash=True):
+        """
+        :param str scan_dir: The directory to scan for music
+        :param int workers: Number of worker processes; 0 to use 1 per CPU
+        :param bool full_hash: Compute the full-file hash of each file (see resolve_full_hashes for the alternative)
+        """
+        workers = workers if workers > 0 else cpu_count()
+        with ScanIndex(self.db) as index:
+            pm = ProgressMonitor(None, self.lm)
+            to_scan = pm.counted(self._find_changes(scan_dir, index))
+            try:
+                first = next(to_scan)
+            except StopIteration:
+                self.lm.info("Nothing new to scan")
+                return
 
-                    try:
-                        info = mf.info
-                        row = {
-                            "path": file_path, "modified": mf.modified, "size": mf.size,
-                            "tags": json.dumps(mf.tag_dict), "sha256": mf.full_hash, "audio_sha256": mf.audio_hash,
-                            "v1": mf.v1_ver, "v2": mf.v2_ver, "tag_mismatches": json.dumps(mf.get_mismatch_keys()),
-                            #"duration": mf.fingerprint[0], "fingerprint": mf.fingerprint[1]
-                            "duration": None, "fingerprint": None
-                        }
-                    except Exception as e:
-                        pm.record_error("{}: {}".format(file_path, e))
-                        logging.debug("{}:{}".format(type(e).__name__, e))
-                        continue
+            to_scan = chain([first], to_scan)
+            with pm, MusicTableWriter(self.music, self.music_tags, index) as writer:
+                try:
+                    if workers > 1:
+                        self._scan_parallel(to_scan, pm, writer, workers, full_hash)
                     else:
-                        row.update({key: info[key] for key in info_columns})
-                        self.music.insert(row)
+                        self._scan_serial(to_scan, pm, writer, full_hash)
                 except KeyboardInterrupt:
-                    break
+                    pass
+
+    def fingerprint(self, workers=1, batch_size=100):
+        """
+        Fingerprints one file for each distinct audio hash that is not in the fingerprint cache yet, then copies the
+        results to every file with that audio hash.  Results are stored in batches, so an interrupted run only loses
+        the current batch and the next run resumes with whatever is left.
+
+        :param int workers: Number of worker processes; 0 to use 1 per CPU
+        :param int batch_size: Number of results to store at a time
+        """
+        workers = workers if workers > 0 else cpu_count()
+        self.fingerprints.fill_music()
+        pending = self.fingerprints.pending()
+        if not pending:
+            self.lm.info("Nothing new to fingerprint")
+            return
+
+        self.lm.info("Fingerprinting {:,d} distinct audio streams with {} worker(s)".format(len(pending), workers))
+        self._run_stage(self.fingerprints, pending, _fingerprint, workers, batch_size, "Unable to fingerprint audio {}: {}")
+
+    def frame_hash(self, workers=1, batch_size=100):
+        """
+        Hashes the MPEG audio frames of one file for each distinct audio hash that has not been frame-hashed yet, so
+        that files whose audio only differs in the Xing / LAME header frame (e.g., the same rip written by different
+        encoder versions) can be found by the frames analysis mode of the dupes / unique reports.
+
+        :param int workers: Number of worker processes; 0 to use 1 per CPU
+        :param int batch_size: Number of results to store at a time
+        """
+        workers = workers if workers > 0 else cpu_count()
+        pending = self.frame_hashes.pending()
+        if not pending:
+            self.lm.info("Nothing new to frame-hash")
+            return
+
+        self.lm.info("Hashing the audio frames of {:,d} distinct audio streams with {} worker(s)".format(len(pending), workers))
+        self._run_stage(self.frame_hashes, pending, audio_frames_hash, workers, batch_size, "Unable to hash the audio frames of {}: {}")
+
+    def index_frames(self, workers=1, batch_size=100):
+        """
+        Indexes the MPEG frames of one file for each distinct audio hash that has not been indexed yet, then replaces
+        the estimated length / bitrate of every file with that audio hash with the exact values from the index.
+
+        :param int workers: Number of worker processes; 0 to use 1 per CPU
+        :param int batch_size: Number of results to store at a time
+        """
+        workers = workers if workers > 0 else cpu_count()
+        self.frame_indexes.fill_music()
+        pending = self.frame_indexes.pending()
+        if not pending:
+            self.lm.info("Nothing new to index")
+            return
+
+        self.lm.info("Indexing the frames of {:,d} distinct audio streams with {} worker(s)".format(len(pending), workers))
+        self._run_stage(self.frame_indexes, pending, build_frame_index, workers, batch_size, "Unable to index the frames of {}: {}")
+
+    def _run_stage(self, cache, pending, func, workers, batch_size, error_fmt):
+        """
+        Calls func(path) for each pending item via _stage_worker, in a pool of worker processes if workers > 1, and
+        stores the (audio_hash, values, error) results in the given cache in batches, so an interrupted run only loses
+        the current batch.
+
+        :param cache: AudioHashCache with a store(results) method, e.g., FingerprintCache
+        :param list pending: (audio_hash, path) tuples
+        :param func: Module-level function (so that it can be pickled) that is given a path and returns a tuple of
+          values for the cache
+        :param int workers: Number of worker processes
+        :param int batch_size: Number of results to store at a time
+        :param str error_fmt: Format string for errors, given the audio hash and the error message
+        """
+        results = []
+        pool = Pool(workers, _init_scan_worker) if workers > 1 else None
+        try:
+            with ProgressMonitor(pending, self.lm) as pm:
+                if pool is not None:
+                    processed = pool.imap_unordered(_stage_worker_star, [(func,) + args for args in pending])
+                else:
+                    processed = (_stage_worker(func, *args) for args in pending)
+                for result in processed:
+                    pm.incr()
+                    audio_hash, values, error = result
+                    if error is not None:
+                        pm.record_error(error_fmt.format(audio_hash, error))
+                    results.append(result)
+                    if len(results) >= batch_size:
+                        cache.store(results)
+                        results = []
+        except KeyboardInterrupt:
+            if pool is not None:
+                pool.terminate()
+        else:
+            if pool is not None:
+                pool.close()
+        finally:
+            if pool is not None:
+                pool.join()
+            if results:
+                cache.store(results)
+
+    def _find_changes(self, scan_dir, index):
+        """
+        Uses the scan index to find files that are new or that changed since they were last scanned.  Files that were
+        renamed / moved are updated in place rather than being scanned again.  Only the (path, modified, size) columns
+        of the music table are loaded, once, to handle files that were scanned before the index was recorded.
+
+        Files are yielded as the directory tree is walked, so scanning can start before the walk is complete.
+
+        :param str scan_dir: The directory to scan for music
+        :param ScanIndex index: The scan index
+        :return: Generator that yields (path, signature) 2-tuples for the files that need to be scanned
+        """
+        known = {path: (modified, size) for path, modified, size in self.music.column_values("path", "modified", "size")}
+        unchanged, moved, changed = 0, 0, 0
+        for file_path, sig in index.walk(scan_dir, "mp3"):
+            if index.is_unchanged(file_path, sig):
+                unchanged += 1
+                continue
+
+            old_path = index.find_moved(file_path, sig)
+            if (old_path is not None) and (old_path in known) and (file_path not in known):
+                self.lm.verbose("Moved: {} -> {}".format(old_path, file_path))
+                self.music.rename(old_path, file_path)
+                self.music_tags.rename(old_path, file_path)
+                known[file_path] = known.pop(old_path)
+                index.forget(old_path)
+                index.record(file_path, sig)
+                moved += 1
+                continue
+
+            try:
+                modified, size = known[file_path]
+            except KeyError:
+                changed += 1
+                yield file_path, sig
+                continue
+
+            modified_changed = (modified != sig[3] // 1000000000)
+            size_changed = (size != sig[2])
+            if not (modified_changed or size_changed):
+                index.record(file_path, sig)
+                unchanged += 1
+                continue
+
+            why = ["file updated" if modified_changed else None, "size changed" if size_changed else None]
+            why = " and ".join([reason for reason in why if reason is not None])
+            self.lm.verbose("Updating {} ({})".format(file_path, why))
+            changed += 1
+            yield file_path, sig
+
+        self.lm.verbose("Unchanged: {:,d}; Moved: {:,d}; New or changed: {:,d}".format(unchanged, moved, changed))
+
+    def _scan_serial(self, to_scan, pm, writer, full_hash=True):
+        for file_path, sig in to_scan:
+            pm.incr()
+            file_path, result, error = _scan_worker(file_path, full_hash)
+            self._record_scan_result(pm, writer, result, error, sig)
+
+    def _scan_parallel(self, to_scan, pm, writer, workers, full_hash=True):
+        """
+        Files are hashed / parsed by a pool of worker processes, while this process remains the only one that reads
+        from or writes to the DB.  A bounded number of files are submitted at a time so that results are written (and
+        progress is reported) as they arrive rather than after every path has been queued.
+        """
+        max_pending = workers * 4
+        pending = deque()
+        pool = Pool(workers, _init_scan_worker)
+        try:
+            for file_path, sig in to_scan:
+                pending.append((pool.apply_async(_scan_worker, (file_path, full_hash)), sig))
+                while len(pending) >= max_pending:
+                    self._collect_scan_result(pm, writer, *pending.popleft())
+            while pending:
+                self._collect_scan_result(pm, writer, *pending.popleft())
+        except KeyboardInterrupt:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def _collect_scan_result(self, pm, writer, async_result, sig):
+        pm.incr()
+        file_path, result, error = async_result.get()
+        self._record_scan_result(pm, writer, result, error, sig)
+
+    def _record_scan_result(self, pm, writer, result, error, sig):
+        if error is not None:
+            pm.record_error(error)
+        else:
+            row, tags = result
+            writer.add(row, tags, sig)
+
+
+def scan_file(file_path, full_hash=True):
+    """
+    Hashes / parses the given file without touching the DB, so that it can be called from worker processes.
+
+    :param str file_path: Path of an MP3 file
+    :param bool full_hash: Compute the full-file hash (otherwise it is left as None)
+    :return tuple: (row for the music table, rows for the music_tags table)
+    """
+    mf = MusicFile(file_path)
+    info = mf.info
+    full_sha256, audio_sha256 = stream_hashes(file_path, full_hash=full_hash)
+    row = {
+        "path": file_path, "modified": mf.modified, "size": mf.size,
+        "tags": json.dumps(mf.tag_dict), "sha256": full_sha256, "audio_sha256": audio_sha256,
+        "v1": mf.v1_ver, "v2": mf.v2_ver, "tag_mismatches": json.dumps(mf.get_mismatch_keys()),
+        #"duration": mf.fingerprint[0], "fingerprint": mf.fingerprint[1]
+        "duration": None, "fingerprint": None
+    }
+    row.update({key: info[key] for key in info_columns})
+    return row, tag_rows(file_path, mf.tag_dict)
+
+
+def _fingerprint(file_path):
+    """
+    :param str file_path: Path of an MP3 file
+    :return tuple: (duration, fingerprint)
+    """
+    duration, fingerprint = MusicFile(file_path).fingerprint
+    if isinstance(fingerprint, bytes):
+        fingerprint = fingerprint.decode("ascii")
+    return duration, fingerprint
+
+
+def _stage_worker(func, audio_hash, file_path):
+    """
+    :param func: Function that is given the path and returns a tuple of values for the stage's cache, e.g.,
+      audio_frames_hash
+    :param str audio_hash: The audio_sha256 of the given file
+    :param str file_path: Path of an MP3 file
+    :return tuple: (audio_hash, values, error), where either error or values is None
+    """
+    try:
+        return audio_hash, tuple(func(file_path)), None
+    except Exception as e:
+        logging.debug("{}:{}".format(type(e).__name__, e))
+        return audio_hash, None, "{}: {}".format(type(e).__name__, e)
+
+
+def _stage_worker_star(args):
+    return _stage_worker(*args)
+
+
+def _init_scan_worker():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # Let the parent handle Ctrl+C and terminate the pool
+
+
+def _scan_worker(file_path, full_hash=True):
+    """
+    :param str file_path: Path of an MP3 file
+    :param bool full_hash: Compute the full-file hash
+    :return tuple: (file_path, result, error), where result is the output of scan_file; exactly one of result / error
+      is None
+    """
+    try:
+        return file_path, scan_file(file_path, full_hash), None
+    except MusicFileOpenException as e:
+        return file_path, None, "{}".format(e)
+    except Exception as e:
+        logging.debug("{}:{}".format(type(e).__name__, e))
+        return file_path, None, "{}: {}".format(file_path, e)
+
+
+class MusicTableWriter:
+    """
+    Buffers scanned rows and writes them to the given tables in batches, one transaction per batch, so a file's tags are
+    always written along with its music row.  Only one of these should exist at a time for a given DB so that SQLite
+    never has to deal with concurrent writers.  Files are only recorded in the scan index once their rows have been
+    written.
+    """
+    def __init__(self, db_table, music_tags, scan_index, batch_size=500):
+        self.table = db_table
+        self.music_tags = music_tags
+        self.index = scan_index
+        self.batch_size = batch_size
+        self.rows = []
+        self.tags = {}
+        self.signatures = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.flush()
+
+    def add(self, row, tags, signature):
+        path = row[self.table.pk]
+        self.rows.append(row)
+        self.tags[path] = tags
+        self.signatures[path] = signature
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            with self.table.db.engine.begin() as conn:
+                self.table.upsert_many(self.rows, self.batch_size, conn=conn)
+                self.music_tags.replace(self.tags, conn)
+        for path, sig in self.signatures.iteritems():
+            self.index.record(path, sig)
+        self.rows, self.tags, self.signatures = [], {}, {}
 
 
 class ProgressMonitor:
     def __init__(self, to_be_processed, log_manager):
+        """
+        :param to_be_processed: The number of items to be processed, or a list / dict of them, or None if the total
+          is not known yet; in that case the total grows as items are found (see counted)
+        :param log_manager: LogManager / OutputManager used for output
+        """
         self.lm = log_manager
-        if isinstance(to_be_processed, (list, dict)):
+        self.counting = to_be_processed is None
+        if self.counting:
+            self.total = 0
+        elif isinstance(to_be_processed, (list, dict)):
             self.total = len(to_be_processed)
         else:
             try:
                 self.total = int(to_be_processed)
             except Exception:
-                raise TypeError("expected number, list, or dict; found {}".format(type(to_be_processed)))
-        self.tl = str(len(str(self.total)))
-        self.base_fmt = "[{{:7.2%}}|{{:{}d}}/{}]".format(self.tl, self.total)
-        self.pfmt = self.base_fmt + " {} {} {}"
-        self.spfmt = self.base_fmt + "[Elapsed: {}][Skipped: {:8,d}][Errors: {:8,d}][Rate: {:,.2f} files/sec][Remaining: ~{}]"
+                raise TypeError("expected number, list, dict, or None; found {}".format(type(to_be_processed)))
+        self.sfmt = "[Elapsed: {}][Skipped: {:8,d}][Errors: {:8,d}][Rate: {:,.2f} files/sec][Remaining: ~{}]"
         self.skipped, self.errors, self.c = 0, 0, 0
         self.start = time.time()
         self.last_time = self.elapsed()
 
+    def counted(self, iterable):
+        """
+        Passes through the items in the given iterable, adding each one to the total when it is found.  The total is
+        treated as final once the iterable is exhausted.
+        """
+        self.counting = True
+        for item in iterable:
+            self.total += 1
+            yield item
+        self.counting = False
+
+    def _prefix(self):
+        if self.counting:
+            return "[  ?.??%|{:d}/{:d}+]".format(self.c, self.total)
+        tl = len(str(self.total))
+        return "[{:7.2%}|{:{}d}/{}]".format(self.c / self.total if self.total else 1, self.c, tl, self.total)
+
     def elapsed(self, since=None):
         sinceTime = self.start if (since is None) else since
         return time.time() - sinceTime
@@ -530,11 +1036,12 @@ class ProgressMonitor:
         return self
 
     def __exit__(self, *args, **kwargs):
-        fmt = "{{}}   {{:{}d}} ({{:.2%}})".format(self.tl)
+        fmt = "{{}}   {{:{}d}} ({{:.2%}})".format(len(str(self.total)))
+        processed = max(self.c, 1)
         self.lm.printf("Done!", end=True, append=False)
         self.lm.printf("Processed: {:d}", self.c, end=True, append=False)
-        self.lm.printf(fmt, "Skipped:", self.skipped, self.skipped / self.c, end=True, append=False)
-        self.lm.printf(fmt, "Errors: ", self.errors, self.errors / self.c, end=True, append=False)
+        self.lm.printf(fmt, "Skipped:", self.skipped, self.skipped / processed, end=True, append=False)
+        self.lm.printf(fmt, "Errors: ", self.errors, self.errors / processed, end=True, append=False)
         self.lm.printf("Runtime: {}", self.elapsedf(), end=True, append=False)
 
     def incr(self):
@@ -543,9 +1050,11 @@ class ProgressMonitor:
         if (dt - self.last_time) > 0.33:
             processed = self.c - self.skipped
             rate = processed / dt if dt > 0 else 1
-            remaining = fTime((self.total - processed) / rate) if (processed > 5) else "??:??:??"
+            known = (not self.counting) and (processed > 5)
+            remaining = fTime((self.total - processed) / rate) if known else "??:??:??"
             self.last_time = dt
-            self.lm.printf(self.spfmt, self.c / self.total, self.c, self.elapsedf(), self.skipped, self.errors, rate, remaining, end=False, append=False)
+            status = self.sfmt.format(self.elapsedf(), self.skipped, self.errors, rate, remaining)
+            self.lm.printf("{}{}", self._prefix(), status, end=False, append=False)
 
     def record_error(self, *args, **kwargs):
         self.errors += 1
@@ -556,7 +1065,7 @@ class ProgressMonitor:
         self.record_message(*args, **kwargs)
 
     def record_message(self, *args, **kwargs):
-        self.lm.verbose(self.pfmt.format(self.c / self.total, self.c, *args, **kwargs))
+        self.lm.verbose(self._prefix() + " {} {} {}".format(*args, **kwargs))
 
 
 class HashException(Exception):
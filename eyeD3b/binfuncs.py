@@ -19,6 +19,15 @@
 #
 ################################################################################
 
+import struct
+
+# The bits of every byte value (MSB first), so that bytes can be converted to
+# bits with a lookup per byte rather than a loop per bit.
+_BYTE_BITS = tuple(tuple((b >> i) & 1 for i in range(7, -1, -1))
+                   for b in range(256))
+_BYTE_BITS_LISTS = [list(bits) for bits in _BYTE_BITS]
+_UINT32 = struct.Struct(">I")
+
 # Accepts a string of bytes (chars) and returns an array of bits
 # representing the bytes in big endian byte (Most significant byte/bit first)
 # order.  Each byte can have it's higher bits ignored by passing an sz arg.
@@ -26,22 +35,13 @@ def bytes2bin(bytes, sz = 8):
    if sz < 1 or sz > 8:
       raise ValueError("Invalid sz value: " + str(sz))
 
-   retVal = []
-   for b in bytes:
-      bits = []
-      b = ord(b)
-      while b > 0:
-         bits.append(b & 1)
-         b >>= 1
-
-      if len(bits) < sz:
-         bits.extend([0] * (sz - len(bits)))
-      elif len(bits) > sz:
-         bits = bits[:sz]
-
-      # Big endian byte order.
-      bits.reverse()
-      retVal.extend(bits)
+   if len(bytes) == 1:
+      retVal = list(_BYTE_BITS_LISTS[ord(bytes)][8 - sz:])
+   else:
+      retVal = []
+      skip = 8 - sz
+      for b in bytes:
+         retVal.extend(_BYTE_BITS[ord(b)][skip:])
 
    if len(retVal) == 0:
       retVal = [0]
@@ -49,65 +49,53 @@ def bytes2bin(bytes, sz = 8):
 
 # Convert am array of bits (MSB first) into a string of characters.
 def bin2bytes(x):
-   bits = []
-   bits.extend(x)
-   bits.reverse()
-
-   i = 0
-   out = ''
-   multi = 1
-   ttl = 0
-   for b in bits:
-      i += 1
-      ttl += b * multi
-      multi *= 2
-      if i == 8:
-         i = 0
-         out += chr(ttl)
-         multi = 1
-         ttl = 0
-
-   if multi > 1:
-      out += chr(ttl)
-
-   out = list(out)
-   out.reverse()
-   out = ''.join(out)
-   return out
+   if not len(x):
+      return ''
+   n_bytes = (len(x) + 7) // 8
+   return ('%0*x' % (n_bytes * 2, bin2dec(x))).decode('hex')
 
 # Convert and array of "bits" (MSB first) to it's decimal value.
 def bin2dec(x):
-   bits = []
-   bits.extend(x)
-   bits.reverse()
-
-   multi = 1
-   value = long(0)
-   for b in bits:
-      value += b * multi
-      multi *= 2
-   return value
+   value = 0
+   for b in x:
+      value = (value << 1) | b
+   return long(value)
 
+# Convert a string of bytes (MSB first) to its decimal value, using only the
+# low sz bits of each byte (e.g., 7 for synch safe integers).
 def bytes2dec(bytes, sz = 8):
-    return bin2dec(bytes2bin(bytes, sz))
+   if sz < 1 or sz > 8:
+      raise ValueError("Invalid sz value: " + str(sz))
+
+   if sz == 8:
+      if len(bytes) == 4:
+         return long(_UINT32.unpack(bytes)[0])
+      return long(bytes.encode('hex') or '0', 16)
+
+   mask = (1 << sz) - 1
+   value = 0
+   for b in bytes:
+      value = (value << sz) | (ord(b) & mask)
+   return long(value)
 
 # Convert a decimal value to an array of bits (MSB first), optionally
 # padding the overall size to p bits.
 def dec2bin(n, p = 0):
    assert(n >= 0)
-   retVal = []
-
-   while n > 0:
-      retVal.append(n & 1)
-      n >>= 1
-
-   if p > 0:
-      retVal.extend([0] * (p - len(retVal)))
-   retVal.reverse()
+   bits = bin(n)[2:] if n else ''
+   retVal = [0] * (p - len(bits))
+   retVal.extend(b == '1' and 1 or 0 for b in bits)
    return retVal
 
+# Convert a decimal value to a string of bytes (MSB first), optionally padded
+# to p bits (rounded up to whole bytes).
 def dec2bytes(n, p = 0):
-    return bin2bytes(dec2bin(n, p))
+   assert(n >= 0)
+   n_bits = max(p, n.bit_length())
+   if not n_bits:
+      return ''
+   n_bytes = (n_bits + 7) // 8
+   return ('%0*x' % (n_bytes * 2, n)).decode('hex')
 
 # Convert a list of bits (MSB first) to a synch safe list of bits (section 6.2
 # of the ID3 2.4 spec).
@@ -117,17 +105,15 @@ def bin2synchsafe(x):
    elif len(x) < 8:
       return x
 
-   n = bin2dec(x)
-   bites = ""
-   bites += chr((n >> 21) & 0x7f)
-   bites += chr((n >> 14) & 0x7f)
-   bites += chr((n >>  7) & 0x7f)
-   bites += chr((n >>  0) & 0x7f)
-   bits = bytes2bin(bites)
-   if len(bits) < 32:
-      bits = ([0] * (32 - len(x))) + bits
-
-   return bits
+   return bytes2bin(dec2synchsafe(bin2dec(x)))
+
+# Convert a decimal value to a 4 byte synch safe integer (section 6.2 of the
+# ID3 2.4 spec), i.e., bin2bytes(bin2synchsafe(dec2bin(n, 32))).
+def dec2synchsafe(n):
+   if n < 0 or n > 268435456:   # 2^28
+      raise ValueError("Invalid value")
+   return _UINT32.pack(((n & 0xfe00000) << 3) | ((n & 0x1fc000) << 2) |
+                       ((n & 0x3f80) << 1) | (n & 0x7f))
 
 def bytes2str(bytes):
     s = ""
@@ -415,9 +415,9 @@ class FrameHeader:
       data = self.id
 
       if self.minorVersion == 3:
-         data += bin2bytes(dec2bin(dataSize, 32))
+         data += dec2bytes(dataSize, 32)
       else:
-         data += bin2bytes(bin2synchsafe(dec2bin(dataSize, 32)))
+         data += dec2synchsafe(dataSize)
 
       self.setBitMask()
       self.flags = NULL_FRAME_FLAGS
@@ -447,7 +447,7 @@ class FrameHeader:
          # dataSize corresponds to the size of the data segment after
          # encryption, compression, and unsynchronization.
          sz = f.read(3)
-         self.dataSize = bin2dec(bytes2bin(sz, 8))
+         self.dataSize = bytes2dec(sz)
          TRACE_MSG("FrameHeader [data size]: %d (0x%X)" % (self.dataSize,
                                                            self.dataSize))
          return True
@@ -486,9 +486,9 @@ class FrameHeader:
          # In ID3 v2.4 this value became a synch-safe integer, meaning only
          # the low 7 bits are used per byte.
          if self.minorVersion == 3:
-            self.dataSize = bin2dec(bytes2bin(sz, 8))
+            self.dataSize = bytes2dec(sz)
          else:
-            self.dataSize = bin2dec(bytes2bin(sz, 7))
+            self.dataSize = bytes2dec(sz, 7)
          TRACE_MSG("FrameHeader [data size]: %d (0x%X)" % (self.dataSize,
                                                            self.dataSize))
 
@@ -537,37 +537,30 @@ class FrameHeader:
       flags = [0] * 16
 
 ################################################################################
+# \xff bytes that must be followed by a \x00 to keep them from looking like
+# the start of an mp3 frame sync (i.e., those followed by \x00 or >= \xe0)
+_UNSYNC_RE = re.compile(r'\xff(?=[\x00\xe0-\xff])')
+# Unsynchronisation pairs: an \xff and the byte after it
+_DEUNSYNC_RE = re.compile(r'\xff[\x00\xff]')
+_DEUNSYNC_PAIRS = {'\xff\x00': '\xff', '\xff\xff': '\xff\xff'}
+
 def unsyncData(data):
-    output = []
-    safe = True
-    for val in data:
-        if safe:
-            output.append(val)
-            if val == '\xff':
-                safe = False
-        elif val == '\x00' or val >= '\xe0':
-            output.append('\x00')
-            output.append(val)
-            safe = (val != '\xff')
-        else:
-            output.append(val)
-            safe = True
-    if not safe:
-        output.append('\x00')
-    return ''.join(output)
+    if '\xff' not in data:
+        return data
+    output = _UNSYNC_RE.sub('\xff\x00', data)
+    if output[-1] == '\xff':
+        output += '\x00'
+    return output
 
 def deunsyncData(data):
-    output = []
-    safe = True
-    for val in data:
-        if safe:
-            output.append(val)
-            safe = (val != '\xff')
-        else:
-            if val != '\x00':
-                output.append(val)
-            safe = True
-    return ''.join(output)
+    if '\xff' not in data:
+        return data
+    if '\xff\xff' not in data:
+        # Every \xff starts a new pair, so the pairs can't overlap
+        return data.replace('\xff\x00', '\xff')
+    # Each \xff that is not the 2nd byte of a pair is followed by a \x00 to
+    # drop, or by another \xff that the pair includes
+    return _DEUNSYNC_RE.sub(lambda m: _DEUNSYNC_PAIRS[m.group()], data)
 
 
 ################################################################################
@@ -619,29 +612,29 @@ class Frame:
       if self.header.minorVersion <= 3:
          # 2.3:  compression(4), encryption(1), group(1) 
          if self.header.compressed:
-            self.decompressedSize = bin2dec(bytes2bin(data[:4]))
+            self.decompressedSize = bytes2dec(data[:4])
             data = data[4:]
             TRACE_MSG("Decompressed Size: %d" % self.decompressedSize)
          if self.header.encrypted:
-            self.encryptionMethod = bin2dec(bytes2bin(data[0]))
+            self.encryptionMethod = bytes2dec(data[0])
             data = data[1:]
             TRACE_MSG("Encryption Method: %d" % self.encryptionMethod)
          if self.header.grouped:
-            self.groupId = bin2dec(bytes2bin(data[0]))
+            self.groupId = bytes2dec(data[0])
             data = data[1:]
             TRACE_MSG("Group ID: %d" % self.groupId)
       else:
          # 2.4:  group(1), encrypted(1), dataLenIndicator(4,7)
          if self.header.grouped:
-            self.groupId = bin2dec(bytes2bin(data[0]))
+            self.groupId = bytes2dec(data[0])
             data = data[1:]
          if self.header.encrypted:
-            self.encryptionMethod = bin2dec(bytes2bin(data[0]))
+            self.encryptionMethod = bytes2dec(data[0])
             data = data[1:]
             TRACE_MSG("Encryption Method: %d" % self.encryptionMethod)
             TRACE_MSG("Group ID: %d" % self.groupId)
          if self.header.dataLenIndicator:
-            self.dataLen = bin2dec(bytes2bin(data[:4], 7))
+            self.dataLen = bytes2dec(data[:4], 7)
             data = data[4:]
             TRACE_MSG("Data Length: %d" % self.dataLen)
             if self.header.compressed:
@@ -660,20 +653,20 @@ class Frame:
       formatFlagData = ""
       if self.header.minorVersion == 3:
          if self.header.compressed:
-            formatFlagData += bin2bytes(dec2bin(len(data), 32))
+            formatFlagData += dec2bytes(len(data), 32)
          if self.header.encrypted:
-            formatFlagData += bin2bytes(dec2bin(self.encryptionMethod, 8))
+            formatFlagData += dec2bytes(self.encryptionMethod, 8)
          if self.header.grouped:
-            formatFlagData += bin2bytes(dec2bin(self.groupId, 8))
+            formatFlagData += dec2bytes(self.groupId, 8)
       else:
          if self.header.grouped:
-            formatFlagData += bin2bytes(dec2bin(self.groupId, 8))
+            formatFlagData += dec2bytes(self.groupId, 8)
          if self.header.encrypted:
-            formatFlagData += bin2bytes(dec2bin(self.encryptionMethod, 8))
+            formatFlagData += dec2bytes(self.encryptionMethod, 8)
          if self.header.compressed or self.header.dataLenIndicator:
             # Just in case, not sure about this?
             self.header.dataLenIndicator = 1
-            formatFlagData += bin2bytes(dec2bin(len(data), 32))
+            formatFlagData += dec2bytes(len(data), 32)
 
       if self.header.compressed:
           data = self.compress(data)
@@ -1280,7 +1273,7 @@ class ImageFrame(Frame):
 
        frameData = DEFAULT_ENCODING
        frameData += mt + "\x00"
-       frameData += bin2bytes(dec2bin(type, 8))
+       frameData += dec2bytes(type, 8)
        frameData += desc.encode(id3EncodingToString(encoding)) + "\x00"
        frameData += imgData
 
@@ -1386,7 +1379,7 @@ class ImageFrame(Frame):
 
    def render(self):
       data = self.encoding + self.mimeType + "\x00" +\
-             bin2bytes(dec2bin(self.pictureType, 8)) +\
+             dec2bytes(self.pictureType, 8) +\
              self.description.encode(id3EncodingToString(self.encoding)) +\
              self.getTextDelim()
       if self.imageURL:
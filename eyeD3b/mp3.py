@@ -20,6 +20,10 @@ from binfuncs import *
 from utils import *
 from math import log10
 
+# The frame tables, frame sync search and frame walk are shared with eyed3_79
+from mpeg_frames import FRAME_LENGTHS, FRAME_SECONDS, FRAME_LENGTHS_LIST, \
+     MAX_FRAME_LENGTH, find_syncs, find_header, find_frames
+
 #######################################################################
 class Mp3Exception(Exception):
    '''Error reading mp3'''
@@ -38,7 +42,7 @@ BIT_RATE_TABLE = ((0,    0,    0,    0,    0),
                   (96,   56,   48,   56,   24),
                   (128,  64,   56,   64,   32),
                   (160,  80,   64,   80,   40),
-                  (192,  96,   80,   96,   44),
+                  (192,  96,   80,   96,   48),
                   (224,  112,  96,   112,  56),
                   (256,  128,  112,  128,  64),
                   (288,  160,  128,  144,  80),
@@ -105,31 +109,6 @@ def is_valid_mp_header(header):
 
     return True
 
-def find_header(fp, start_pos=0):
-    def find_sync(fp, start_pos=0):
-        CHUNK_SIZE = 65536
-
-        fp.seek(start_pos)
-        data = fp.read(CHUNK_SIZE)
-        data_len = len(data)
-
-        while data:
-            sync_pos = data.find('\xff', 0)
-            if sync_pos >= 0:
-                header = data[sync_pos:sync_pos + 4]
-                if len(header) == 4:
-                    return (start_pos + sync_pos, header)
-            data = fp.read(CHUNK_SIZE)
-            data_len = len(data)
-        return (None, None)
-    sync_pos, header_bytes = find_sync(fp, start_pos)
-    while sync_pos is not None:
-        header = bytes2dec(header_bytes)
-        if is_valid_mp_header(header):
-            return (sync_pos, header, header_bytes)
-        sync_pos, header_bytes = find_sync(fp, start_pos + sync_pos + 2)
-    return (None, None, None)
-
 def computeTimePerFrame(frameHeader):
    return (float(TIME_PER_FRAME_TABLE[frameHeader.layer]) /
            float(frameHeader.sampleFreq))
@@ -140,7 +140,7 @@ class TagHeader:
       TRACE_MSG("TagHeader [size string]: 0x%02x%02x%02x%02x" %\
                 (ord(tagSizeStr[0]), ord(tagSizeStr[1]),
                  ord(tagSizeStr[2]), ord(tagSizeStr[3])))
-      self.tagSize = bin2dec(bytes2bin(tagSizeStr, 7))
+      self.tagSize = bytes2dec(tagSizeStr, 7)
       TRACE_MSG("TagHeader [size]: %d (0x%x)" % (self.tagSize, self.tagSize))
 
       return 1
@@ -158,7 +158,7 @@ class TagHeader:
                          not not self.footer,
                          0, 0, 0, 0])
       TRACE_MSG("Setting tag size to %d" % tagLen)
-      szBytes = bin2bytes(bin2synchsafe(dec2bin(tagLen, 32)))
+      szBytes = dec2synchsafe(tagLen)
       data += szBytes
       TRACE_MSG("TagHeader rendered %d bytes" % len(data))
       return data
@@ -288,10 +288,10 @@ class ExtendedTagHeader:
          TRACE_MSG("Rendered extended header data (%d bytes)" % len(data))
 
          # Extended header size.
-         size = bin2bytes(bin2synchsafe(dec2bin(len(data) + 6, 32)))
+         size = dec2synchsafe(len(data) + 6)
          assert(len(size) == 4)
 
-         data = size + "\x01" + bin2bytes(dec2bin(self.flags)) + data
+         data = size + "\x01" + dec2bytes(self.flags) + data
          TRACE_MSG("Rendered extended header of size %d" % len(data))
       else:
          # Version 2.3
@@ -304,16 +304,16 @@ class ExtendedTagHeader:
             # about the type of this value.
             self.crc = int(math.fabs(binascii.crc32(frameData +\
                                                     ("\x00" * padding))))
-            crc = bin2bytes(dec2bin(self.crc))
+            crc = dec2bytes(self.crc)
             assert(len(crc) == 4)
             size += 4
          flags = bin2bytes(f)
          assert(len(flags) == 2)
          # Extended header size.
-         size = bin2bytes(dec2bin(size, 32))
+         size = dec2bytes(size, 32)
          assert(len(size) == 4)
          # Padding size
-         paddingSize = bin2bytes(dec2bin(padding, 32))
+         paddingSize = dec2bytes(padding, 32)
 
          data = size + flags + paddingSize
          if crc:
@@ -329,7 +329,7 @@ class ExtendedTagHeader:
       data = fp.read(4)
       if header.minorVersion == 4:
          # sync-safe
-         sz = bin2dec(bytes2bin(data, 7))
+         sz = bytes2dec(data, 7)
          self.size = sz
          TRACE_MSG("Extended header size (includes the 4 size bytes): %d" % sz)
          data = fp.read(sz - 4)
@@ -353,7 +353,7 @@ class ExtendedTagHeader:
             offset += 1
             crcData = data[offset:offset + 5]
             # This is sync-safe.
-            self.crc = bin2dec(bytes2bin(crcData, 7))
+            self.crc = bytes2dec(crcData, 7)
             TRACE_MSG("Extended header CRC: %d" % self.crc)
             offset += 5
          if self.hasRestrictions():
@@ -364,20 +364,20 @@ class ExtendedTagHeader:
             offset += 1
       else:
          # v2.3 is totally different... *sigh*
-         sz = bin2dec(bytes2bin(data))
+         sz = bytes2dec(data)
          TRACE_MSG("Extended header size (not including 4 size bytes): %d" % sz)
          self.size = sz + 4  # +4 to include size bytes
          tmpFlags = fp.read(2)
          # Read the padding size, but it'll be computed during the parse.
          ps = fp.read(4)
          TRACE_MSG("Extended header says there is %d bytes of padding" %
-                   bin2dec(bytes2bin(ps)))
+                   bytes2dec(ps))
          # Make this look like a v2.4 mask.
          self.flags = ord(tmpFlags[0]) >> 2
          if self.hasCRC():
             TRACE_MSG("Extended header has CRC bit set")
             crcData = fp.read(4)
-            self.crc = bin2dec(bytes2bin(crcData))
+            self.crc = bytes2dec(crcData)
             TRACE_MSG("Extended header CRC: %d" % self.crc)
 
 
@@ -18,10 +18,11 @@
 ################################################################################
 '''Basic core types and utilities.'''
 import os
+import stat
 import time
 import functools
 from . import LOCAL_FS_ENCODING
-from .utils import guessMimetype
+from .utils import guessMimetype, ID3_MIME_TYPE, ID3_MIME_TYPE_EXTENSIONS
 from . import compat
 
 from .utils.log import getLogger
@@ -57,7 +58,50 @@ artist/band. i.e. where they are from.
 The format is: city<tab>state<tab>country'''
 
 
-def load(path, tag_version=None):
+_SNIFFED_MIME_TYPES = {}
+'''Mime-types of files that :func:`load` had to sniff, by (path, mtime).'''
+_MAX_SNIFFED_MIME_TYPES = 4096
+
+
+def _guessFileMimetype(path, mtime):
+    '''A quicker :func:`eyed3.utils.guessMimetype` for :func:`load`. The
+    extensions that :func:`load` handles are recognized without a lookup, and
+    a file whose extension has no mime-type at all is sniffed for an ID3 tag
+    or mp3 frame header, as is one whose mime-type may or may not be mp3 (see
+    :data:`eyed3.mp3.OTHER_MIME_TYPES`); sniffed results are cached by
+    ``path`` and ``mtime``.'''
+    from . import mp3
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext in mp3.EXTENSIONS:
+        return mp3.MIME_TYPES[0]
+    elif ext in ID3_MIME_TYPE_EXTENSIONS:
+        return ID3_MIME_TYPE
+
+    mtype = guessMimetype(path)
+    if mtype is not None and mtype not in mp3.OTHER_MIME_TYPES:
+        return mtype
+
+    key = (path, mtime)
+    if key not in _SNIFFED_MIME_TYPES:
+        from .mp3.headers import isValidHeader
+        from .utils.binfuncs import bytes2dec
+
+        with open(path, "rb") as fp:
+            header = fp.read(10)
+        if len(header) < 4:
+            pass
+        elif ((header[:3] == b"ID3" and header[3] in b"\x02\x03\x04") or
+                isValidHeader(bytes2dec(header[:4]))):
+            mtype = mp3.MIME_TYPES[0]
+        if len(_SNIFFED_MIME_TYPES) >= _MAX_SNIFFED_MIME_TYPES:
+            _SNIFFED_MIME_TYPES.clear()
+        _SNIFFED_MIME_TYPES[key] = mtype
+    return _SNIFFED_MIME_TYPES[key]
+
+
+def load(path, tag_version=None, precise=False, lazy_frames=False,
+         frame_ids=None, audio_info="eager"):
     '''Loads the file identified by ``path`` and returns a concrete type of
     :class:`eyed3.core.AudioFile`. If ``path`` is not a file an ``IOError`` is
     raised. ``None`` is returned when the file type (i.e. mime-type) is not
@@ -70,25 +114,39 @@ def load(path, tag_version=None):
     If ``tag_version`` is not None (the default) only a specific version of
     metadata is loaded. This value must be a version constant specific to the
     eventual format of the metadata.
+
+    If ``precise`` is True, the play time and bit rate of mp3 files are
+    computed from every frame rather than estimated (see
+    :class:`eyed3.mp3.Mp3AudioInfo`).
+
+    If ``lazy_frames`` is True, ID3v2 frames are only decoded when they are
+    first accessed. If ``frame_ids`` is given, only ID3v2 frames with those
+    IDs are read, and the tag is read only (see :meth:`eyed3.id3.Tag.parse`).
+
+    If ``audio_info`` is ``"lazy"``, the audio details of mp3 files (the mp3
+    header search, Xing / VBRI / LAME headers and file size) are only read
+    when ``info`` is first accessed, so loading only reads the tags.
     '''
     from . import mp3, id3
     log.debug("Loading file: %s" % path)
 
-    if os.path.exists(path):
-        if not os.path.isfile(path):
-            raise IOError("not a file: %s" % path)
-    else:
+    try:
+        stat_result = os.stat(path)
+    except OSError:
         raise IOError("file not found: %s" % path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise IOError("not a file: %s" % path)
 
-    mtype = guessMimetype(path)
+    mtype = _guessFileMimetype(path, stat_result.st_mtime)
     log.debug("File mime-type: %s" % mtype)
 
     if (mtype in mp3.MIME_TYPES or
         (mtype in mp3.OTHER_MIME_TYPES and
          os.path.splitext(path)[1].lower() in mp3.EXTENSIONS)):
-        return mp3.Mp3AudioFile(path, tag_version)
+        return mp3.Mp3AudioFile(path, tag_version, precise, lazy_frames,
+                                frame_ids, audio_info)
     elif mtype == "application/x-id3":
-        return id3.TagFile(path, tag_version)
+        return id3.TagFile(path, tag_version, lazy_frames, frame_ids)
     else:
         return None
 
@@ -315,8 +315,11 @@ class TagFile(core.AudioFile):
     '''
     A shim class for dealing with files that contain only ID3 data, no audio.
     '''
-    def __init__(self, path, version=ID3_ANY_VERSION):
+    def __init__(self, path, version=ID3_ANY_VERSION, lazy_frames=False,
+                 frame_ids=None):
         self._tag_version = version
+        self._lazy_frames = lazy_frames
+        self._frame_ids = frame_ids
         core.AudioFile.__init__(self, path)
         assert(self.type == core.AUDIO_NONE)
 
@@ -325,7 +328,8 @@ class TagFile(core.AudioFile):
 
         with file(self.path, 'rb') as file_obj:
             tag = Tag()
-            tag_found = tag.parse(file_obj, self._tag_version)
+            tag_found = tag.parse(file_obj, self._tag_version,
+                                  self._lazy_frames, self._frame_ids)
             self._tag = tag if tag_found else None
 
         self.type = core.AUDIO_NONE
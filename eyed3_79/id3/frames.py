@@ -22,7 +22,7 @@ from collections import namedtuple
 from .. import core
 from ..utils import requireUnicode
 from ..utils.binfuncs import *
-from ..compat import StringIO, unicode, BytesType
+from ..compat import StringIO, unicode, BytesType, StringTypes
 from .. import Error
 from . import ID3_V2, ID3_V2_3, ID3_V2_4
 from . import (LATIN1_ENCODING, UTF_8_ENCODING, UTF_16BE_ENCODING,
@@ -1337,11 +1337,28 @@ class ChapterFrame(Frame):
 class FrameSet(dict):
     def __init__(self):
         dict.__init__(self)
-
-    def parse(self, f, tag_header, extended_header):
+        self._clearLazy()
+
+    def _clearLazy(self):
+        ## Frames that have not been decoded yet, by frame ID; each is a
+        #  (frame header, offset, size) tuple locating its data in _lazy_source
+        self._lazy = {}
+        ## The path of the file that lazy frames are read from, or a buffer
+        #  holding the tag when it had to be de-unsynch'd as a whole.
+        self._lazy_source = None
+        self._tag_header = None
+
+    def parse(self, f, tag_header, extended_header, lazy=False,
+              frame_ids=None):
         '''Read frames starting from the current read position of the file
         object. Returns the amount of padding which occurs after the tag, but
-        before the audio content.  A return valule of 0 does not mean error.'''
+        before the audio content.  A return valule of 0 does not mean error.
+
+        If ``lazy`` is True only the frame headers are read, and the data of
+        each frame is read and decoded the first time that frames with its ID
+        are accessed; ``f`` must have a ``name`` and the file must not change
+        in the meantime.  If ``frame_ids`` is given, frames with other IDs are
+        skipped without being read at all.'''
         self.clear()
 
         padding_size = 0
@@ -1349,28 +1366,39 @@ class FrameSet(dict):
         start_size = size_left
         consumed_size = 0
 
-        # Handle a tag-level unsync.  Some frames may have their own unsync bit
-        # set instead.
-        tag_data = f.read(size_left)
-
-        # If the tag is 2.3 and the tag header unsync bit is set then all the
-        # frame data is deunsync'd at once, otherwise it will happen on a per
-        # frame basis.
-        if tag_header.unsync and tag_header.version <= ID3_V2_3:
-            log.debug("De-unsynching %d bytes at once (<= 2.3 tag)" %
-                      len(tag_data))
-            og_size = len(tag_data)
-            tag_data = deunsyncData(tag_data)
-            size_left = len(tag_data)
-            log.debug("De-unsynch'd %d bytes at once (<= 2.3 tag) to %d bytes" %
-                      (og_size, size_left))
-
-        # Adding bytes to simulate the tag header(s) in the buffer.  This keeps
-        # f.tell() values matching the file offsets for logging.
-        prepadding = '\x00' * 10  # Tag header
-        prepadding += '\x00' * extended_header.size
-        tag_buffer = StringIO(prepadding + tag_data)
-        tag_buffer.seek(len(prepadding))
+        tag_unsync = tag_header.unsync and tag_header.version <= ID3_V2_3
+        if (lazy or frame_ids is not None) and not tag_unsync:
+            # Frame headers are read straight from the file so that the data
+            # of frames that are not (yet) needed can be skipped.
+            tag_buffer = f
+            self._lazy_source = f.name
+        else:
+            # Handle a tag-level unsync.  Some frames may have their own unsync
+            # bit set instead.
+            tag_data = f.read(size_left)
+
+            # If the tag is 2.3 and the tag header unsync bit is set then all
+            # the frame data is deunsync'd at once, otherwise it will happen on
+            # a per frame basis.
+            if tag_unsync:
+                log.debug("De-unsynching %d bytes at once (<= 2.3 tag)" %
+                          len(tag_data))
+                og_size = len(tag_data)
+                tag_data = deunsyncData(tag_data)
+                size_left = len(tag_data)
+                log.debug("De-unsynch'd %d bytes at once (<= 2.3 tag) to %d "
+                          "bytes" % (og_size, size_left))
+
+            # Adding bytes to simulate the tag header(s) in the buffer.  This
+            # keeps f.tell() values matching the file offsets for logging.
+            prepadding = '\x00' * 10  # Tag header
+            prepadding += '\x00' * extended_header.size
+            tag_buffer = StringIO(prepadding + tag_data)
+            tag_buffer.seek(len(prepadding))
+            self._lazy_source = tag_buffer
+
+        tag_end = tag_buffer.tell() + size_left
+        self._tag_header = tag_header
 
         while size_left > 0:
             log.debug("size_left: " + str(size_left))
@@ -1390,28 +1418,82 @@ class FrameSet(dict):
 
             # Frame data.
             if frame_header.data_size:
-                log.debug("FrameSet: Reading %d (0x%X) bytes of data from byte "
-                          "pos %d (0x%X)" % (frame_header.data_size,
-                                             frame_header.data_size,
-                                             tag_buffer.tell(),
-                                             tag_buffer.tell()))
-                data = tag_buffer.read(frame_header.data_size)
-
-                log.debug("FrameSet: %d bytes of data read" % len(data))
-
                 consumed_size += (frame_header.size +
                                   frame_header.data_size)
-                frame = createFrame(tag_header, frame_header, data)
-                self[frame.id] = frame
+                offset = tag_buffer.tell()
+                # Data past the end of the tag is not part of the frame.
+                data_size = min(frame_header.data_size, tag_end - offset)
+
+                if (frame_ids is not None and
+                        frame_header.id not in frame_ids):
+                    log.debug("FrameSet: Skipping %d bytes of '%s' data" %
+                              (data_size, frame_header.id))
+                    tag_buffer.seek(data_size, 1)
+                elif lazy:
+                    log.debug("FrameSet: Deferring %d bytes of '%s' data at "
+                              "byte pos %d (0x%X)" % (data_size,
+                                                      frame_header.id,
+                                                      offset, offset))
+                    tag_buffer.seek(data_size, 1)
+                    if frame_header.id not in self:
+                        dict.__setitem__(self, frame_header.id, [])
+                    self._lazy.setdefault(frame_header.id, []).append(
+                        (frame_header, offset, data_size))
+                else:
+                    log.debug("FrameSet: Reading %d (0x%X) bytes of data from "
+                              "byte pos %d (0x%X)" % (frame_header.data_size,
+                                                      frame_header.data_size,
+                                                      offset, offset))
+                    data = tag_buffer.read(data_size)
+
+                    log.debug("FrameSet: %d bytes of data read" % len(data))
+
+                    frame = createFrame(tag_header, frame_header, data)
+                    self[frame.id] = frame
 
             # Each frame contains data_size + headerSize bytes.
             size_left -= (frame_header.size +
                           frame_header.data_size)
 
+        if tag_buffer is f:
+            # Leave the file where a full read of the tag would have.
+            f.seek(tag_end)
+        if not self._lazy:
+            self._lazy_source = None
+
         return padding_size
 
+    def decodeFrames(self, fids=None):
+        '''Decode the frames with the given IDs (default: all of them) that a
+        lazy parse deferred, with a single read of the file.'''
+        if fids is None:
+            fids = list(self._lazy)
+        pending = [(fid, self._lazy.pop(fid)) for fid in fids
+                   if fid in self._lazy]
+        if not pending:
+            return
+
+        source = self._lazy_source
+        if not self._lazy:
+            self._lazy_source = None
+        opened = isinstance(source, StringTypes)
+        if opened:
+            source = open(source, "rb")
+        try:
+            for fid, entries in pending:
+                frames = dict.__getitem__(self, fid)
+                for frame_header, offset, size in entries:
+                    source.seek(offset)
+                    frames.append(createFrame(self._tag_header, frame_header,
+                                              source.read(size)))
+        finally:
+            if opened:
+                source.close()
+
     def __getitem__(self, fid):
         if fid in self:
+            if fid in self._lazy:
+                self.decodeFrames([fid])
             return dict.__getitem__(self, fid)
         else:
             return None
@@ -1424,6 +1506,37 @@ class FrameSet(dict):
         else:
             dict.__setitem__(self, fid, [frame])
 
+    def __delitem__(self, fid):
+        self._lazy.pop(fid, None)
+        dict.__delitem__(self, fid)
+
+    def clear(self):
+        dict.clear(self)
+        self._clearLazy()
+
+    def get(self, fid, default=None):
+        return self[fid] if fid in self else default
+
+    def pop(self, fid, *default):
+        self.decodeFrames([fid])
+        return dict.pop(self, fid, *default)
+
+    def values(self):
+        self.decodeFrames()
+        return dict.values(self)
+
+    def itervalues(self):
+        self.decodeFrames()
+        return dict.itervalues(self)
+
+    def items(self):
+        self.decodeFrames()
+        return dict.items(self)
+
+    def iteritems(self):
+        self.decodeFrames()
+        return dict.iteritems(self)
+
     def getAllFrames(self):
         '''Return all the frames in the set as a list. The list is sorted
         in an arbitrary but consistent order.'''
@@ -1452,18 +1565,20 @@ class FrameSet(dict):
                 self[fid] = TextFrame(fid, text=text)
 
 
+# Unsynchronisation pairs: an \xff and the byte after it
+_DEUNSYNC_RE = re.compile(b'\\xff[\\x00\\xff]')
+_DEUNSYNC_PAIRS = {b'\xff\x00': b'\xff', b'\xff\xff': b'\xff\xff'}
+
+
 def deunsyncData(data):
-    output = []
-    safe = True
-    for val in data:
-        if safe:
-            output.append(val)
-            safe = (val != '\xff')
-        else:
-            if val != '\x00':
-                output.append(val)
-            safe = True
-    return ''.join(output)
+    if b'\xff' not in data:
+        return data
+    if b'\xff\xff' not in data:
+        # Every \xff starts a new pair, so the pairs can't overlap
+        return data.replace(b'\xff\x00', b'\xff')
+    # Each \xff that is not the 2nd byte of a pair is followed by a \x00 to
+    # drop, or by another \xff that the pair includes
+    return _DEUNSYNC_RE.sub(lambda m: _DEUNSYNC_PAIRS[m.group()], data)
 
 
 # Create and return the appropriate frame.
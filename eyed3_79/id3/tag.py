@@ -72,7 +72,14 @@ class Tag(core.Tag):
         self._popularities = PopularitiesAccessor(self.frame_set)
         self.file_info = None
 
-    def parse(self, fileobj, version=ID3_ANY_VERSION):
+    def parse(self, fileobj, version=ID3_ANY_VERSION, lazy_frames=False,
+              frame_ids=None):
+        '''Parse the tag from ``fileobj`` (a file object or path). If
+        ``lazy_frames`` is True, v2 frames are only decoded when they are
+        first accessed (see :meth:`eyed3.id3.frames.FrameSet.parse`). If
+        ``frame_ids`` is given, v2 frames with other IDs are not read at all,
+        and the tag is made read only since saving it would drop them.
+        '''
         assert(fileobj)
         self.clear()
         version = version or ID3_ANY_VERSION
@@ -95,7 +102,8 @@ class Tag(core.Tag):
             padding = 0
             # The & is for supporting the "meta" versions, any, etc.
             if version[0] & 2:
-                tag_found, padding = self._loadV2Tag(fileobj)
+                tag_found, padding = self._loadV2Tag(fileobj, lazy_frames,
+                                                     frame_ids)
 
             if not tag_found and version[0] & 1:
                 tag_found, padding = self._loadV1Tag(fileobj)
@@ -115,7 +123,7 @@ class Tag(core.Tag):
         return tag_found
 
     ## returns (tag_found, padding_len)
-    def _loadV2Tag(self, fp):
+    def _loadV2Tag(self, fp, lazy_frames=False, frame_ids=None):
         padding = 0
         # Look for a tag and if found load it.
         if not self.header.parse(fp):
@@ -127,7 +135,10 @@ class Tag(core.Tag):
 
         # Header is definitely there so at least one frame *must* follow.
         padding = self.frame_set.parse(fp, self.header,
-                                       self.extended_header)
+                                       self.extended_header, lazy_frames,
+                                       frame_ids)
+        if frame_ids is not None:
+            self.read_only = True
 
         log.debug("Tag contains %d bytes of padding." % padding)
         return (True, padding)
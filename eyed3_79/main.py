@@ -46,7 +46,7 @@ def main(args, config):
     # Process paths (files/directories)
     for p in args.paths:
         eyed3.utils.walk(args.plugin, p, excludes=args.excludes,
-                         fs_encoding=args.fs_encoding)
+                         fs_encoding=args.fs_encoding, jobs=args.jobs)
 
     retval = args.plugin.handleDone()
 
@@ -186,6 +186,11 @@ def makeCmdLineParser(subparser=None):
                         "but this option is still useful when reading "
                         "from mounted file systems." %
                         eyed3.LOCAL_FS_ENCODING)
+    p.add_argument("-j", "--jobs", action="store", type=int, dest="jobs",
+                   default=1, metavar="N",
+                   help="Load up to N files at a time in worker threads, "
+                        "for plugins that support it. Files are still "
+                        "handled one at a time, in order. The default is 1.")
     p.add_argument("--no-config", action="store_true", dest="no_config",
                    help="Do not load the default user config '%s'. "
                         "The -c/--config options are still honored if "
@@ -46,6 +46,28 @@ OTHER_MIME_TYPES = ['application/octet-stream', # ???
 EXTENSIONS = [".mp3"]
 '''Valid file extensions.'''
 
+AUDIO_INFO_MODES = ("eager", "lazy")
+'''Values for the ``audio_info`` argument of :func:`eyed3.load`.'''
+
+
+def _id3v1Size(file_obj, file_size):
+    '''Returns the size of the ID3v1 tag at the end of the file, or 0 if
+    there is none.  Follows mutagen's find_id3v1 rules (as does
+    audio_region._id3v1_size): "TAG" is looked for in the last 131 bytes,
+    is ignored when it is part of an APEv2 "APETAGEX" marker, and the tag
+    may be 124 to 128 bytes long.'''
+    tail_size = min(file_size, 131)
+    file_obj.seek(file_size - tail_size)
+    tail = file_obj.read(tail_size)
+    idx = tail.find(b"TAG")
+    if idx == -1:
+        return 0
+    ape_idx = tail.find(b"APETAGEX")
+    if ape_idx != -1 and idx == ape_idx + 3:
+        return 0
+    size = len(tail) - idx
+    return size if 124 <= size <= 128 else 0
+
 
 def isMp3File(file_name):
     '''Does a mime-type check on ``file_name`` and returns ``True`` it the
@@ -53,12 +75,17 @@ def isMp3File(file_name):
     return utils.guessMimetype(file_name) in MIME_TYPES
 
 class Mp3AudioInfo(core.AudioInfo):
-    def __init__(self, file_obj, start_offset, tag):
+    def __init__(self, file_obj, start_offset, tag, precise=False):
+        '''If ``precise`` is True, every frame is located (see
+        :func:`eyed3.mp3.headers.findFrames`), so that ``time_secs`` and
+        ``bit_rate`` are computed from the actual frames rather than estimated
+        from the first one, and ``frame_index`` and ``sketchy`` are set.'''
         from . import headers
         from .headers import timePerFrame
 
         log.debug("mp3 header search starting @ %x" % start_offset)
         core.AudioInfo.__init__(self)
+        audio_offset = start_offset
 
         self.mp3_header = None
         self.xing_header = None
@@ -68,6 +95,12 @@ class Mp3AudioInfo(core.AudioInfo):
         See :class:`eyed3.mp3.headers.LameHeader`'''
         self.bit_rate = (None, None)
         '''2-tuple, (vrb?:boolean, bitrate:int)'''
+        self.frame_index = None
+        '''If computed (see ``precise``), an ``array('I')`` of the offset of
+        each audio frame in the file.'''
+        self.sketchy = None
+        '''If computed (see ``precise``), the fraction (0-1) of the bytes
+        between the tag and the end of the file that are not in any frame.'''
 
         while self.mp3_header is None:
             # Find first mp3 header
@@ -148,6 +181,42 @@ class Mp3AudioInfo(core.AudioInfo):
         self.sample_freq = self.mp3_header.sample_freq
         self.mode = self.mp3_header.mode
 
+        if precise:
+            self._computePrecise(file_obj, audio_offset, header_pos)
+
+    def _computePrecise(self, file_obj, audio_offset, header_pos):
+        '''Replaces the estimated play time and bit rate with ones computed
+        from a full frame index, built in 1 pass starting with the first
+        header.'''
+        from array import array
+        from .headers import findFrames
+
+        end_pos = self.size_bytes - _id3v1Size(file_obj, self.size_bytes)
+
+        offsets, lengths, seconds = findFrames(file_obj, header_pos, end_pos)
+        info_bytes = 0
+        if ((self.xing_header or self.vbri_header) and len(offsets) and
+                offsets[0] == header_pos):
+            # The first frame holds the Xing / VBRI header rather than audio
+            info_bytes = int(lengths[0])
+            offsets, lengths, seconds = offsets[1:], lengths[1:], seconds[1:]
+
+        self.frame_index = array('I', offsets.tolist())
+        self.time_secs = float(seconds.sum())
+        audio_bytes = int(lengths.sum())
+        if self.time_secs:
+            # Frame lengths vary by more than the padding slot (up to 4 bytes)
+            # when the bit rate varies
+            vbr = bool(self.bit_rate[0]) or int(lengths.ptp()) > 4
+            self.bit_rate = (vbr, int(round((audio_bytes * 8) /
+                                            (self.time_secs * 1000))))
+
+        region = end_pos - audio_offset
+        if region > 0:
+            self.sketchy = 1 - float(audio_bytes + info_bytes) / region
+        else:
+            self.sketchy = 1.0
+
     ##
     # Helper to get the bitrate as a string. The prefix '~' is used to denote
     # variable bit rates.
@@ -162,8 +231,16 @@ class Mp3AudioInfo(core.AudioInfo):
 class Mp3AudioFile(core.AudioFile):
     '''Audio file container for mp3 files.'''
 
-    def __init__(self, path, version=id3.ID3_ANY_VERSION):
+    def __init__(self, path, version=id3.ID3_ANY_VERSION, precise=False,
+                 lazy_frames=False, frame_ids=None, audio_info="eager"):
+        if audio_info not in AUDIO_INFO_MODES:
+            raise ValueError("Invalid audio_info mode: %s" % audio_info)
         self._tag_version = version
+        self._precise = precise
+        self._lazy_frames = lazy_frames
+        self._frame_ids = frame_ids
+        self._audio_info = audio_info
+        self._info_pending = False
 
         core.AudioFile.__init__(self, path)
         assert(self.type == core.AUDIO_MP3)
@@ -171,30 +248,85 @@ class Mp3AudioFile(core.AudioFile):
     def _read(self):
         with open(self.path, 'rb') as file_obj:
             self._tag = id3.Tag()
-            tag_found = self._tag.parse(file_obj, self._tag_version)
-
-            # Compute offset for starting mp3 data search
-            if tag_found and self._tag.isV1():
-                mp3_offset = 0
-            elif tag_found and self._tag.isV2():
-                mp3_offset = self._tag.header.SIZE + self._tag.header.tag_size
-            else:
-                mp3_offset = 0
+            tag_found = self._tag.parse(file_obj, self._tag_version,
+                                        self._lazy_frames, self._frame_ids)
+            if not tag_found:
                 self._tag = None
 
-            try:
-                self._info = Mp3AudioInfo(file_obj, mp3_offset, self._tag)
-            except Mp3Exception as ex:
-                # Only logging a warning here since we can still operate on
-                # the tag.
-                log.warning(ex)
-                self._info = None
+            if self._audio_info == "lazy":
+                # Read by the info property, with the tag as it is now
+                self._info_pending = True
+                self._info_tag = self._tag
+            else:
+                self._info = _readAudioInfo(file_obj, self._tag, self._precise)
 
             self.type = core.AUDIO_MP3
 
+    @property
+    def info(self):
+        '''The :class:`Mp3AudioInfo`, or None if no mp3 frames were found. A
+        lazy load (see :func:`eyed3.load`) reads it the first time it is
+        accessed, so the file must not change in the meantime.'''
+        if self._info_pending:
+            self._info_pending = False
+            self._info = loadAudioInfo(self.path, self._info_tag,
+                                       self._precise)
+            self._info_tag = None
+        return self._info
+
     def initTag(self, version=id3.ID3_DEFAULT_VERSION):
         '''Add a id3.Tag to the file (removing any existing tag if one exists).
         '''
         self.tag = id3.Tag()
         self.tag.version = version
         self.tag.file_info = id3.FileInfo(self.path)
+
+
+def _readAudioInfo(file_obj, tag, precise=False):
+    # Compute offset for starting mp3 data search
+    if tag and tag.isV2():
+        mp3_offset = tag.header.SIZE + tag.header.tag_size
+    else:
+        mp3_offset = 0
+
+    try:
+        return Mp3AudioInfo(file_obj, mp3_offset, tag, precise)
+    except Mp3Exception as ex:
+        # Only logging a warning here since we can still operate on the tag.
+        log.warning(ex)
+        return None
+
+
+def loadAudioInfo(path, tag=None, precise=False):
+    '''Reads the :class:`Mp3AudioInfo` of the mp3 file at ``path``, given
+    the tag that was parsed from it (if any), which determines where the audio
+    starts. Returns None if no mp3 frames are found.
+    '''
+    with open(path, 'rb') as file_obj:
+        return _readAudioInfo(file_obj, tag, precise)
+
+
+def loadAllTags(path, precise=False, lazy_frames=False, audio_info=True):
+    '''Reads both the v1 and v2 tags of the mp3 file at ``path``, along with
+    its :class:`Mp3AudioInfo`, through a single open of the file (rather than
+    one :func:`eyed3.load` per tag version, each of which opens the file,
+    guesses its mime-type and locates the audio again). Returns a
+    ``(v1 tag, v2 tag, audio info)`` tuple in which each item is None if it was
+    not found; ``precise`` and ``lazy_frames`` are as for :func:`eyed3.load`.
+    If ``audio_info`` is False the audio info is not read (and is None), so
+    only the tags are touched; :func:`loadAudioInfo` can read it later.
+    '''
+    with open(path, 'rb') as file_obj:
+        v2_tag = id3.Tag()
+        if not v2_tag.parse(file_obj, id3.ID3_V2, lazy_frames):
+            v2_tag = None
+        v1_tag = id3.Tag()
+        if not v1_tag.parse(file_obj, id3.ID3_V1):
+            v1_tag = None
+
+        # The audio starts after the v2 tag, if there is one
+        info = None
+        if audio_info:
+            info = _readAudioInfo(file_obj, v2_tag or v1_tag, precise)
+
+    return (v1_tag, v2_tag, info)
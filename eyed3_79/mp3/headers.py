@@ -17,6 +17,9 @@
 ################################################################################
 from math import log10
 
+# The header search and frame walk are shared with eyeD3b
+from mpeg_frames import find_header as findHeader, find_frames as findFrames
+
 from . import Mp3Exception
 
 from ..utils.binfuncs import bytes2bin, bytes2dec, bin2dec
@@ -65,37 +68,6 @@ def isValidHeader(header):
 
     return True
 
-def findHeader(fp, start_pos=0):
-    '''Locate the first mp3 header in file stream ``fp`` starting a offset
-    ``start_pos`` (defaults to 0). Returned is a 3-tuple containing the offset
-    where the header was found, the header as an integer, and the header as 4
-    bytes. If no header is found header_int will equal 0.
-    '''
-
-    def find_sync(fp, start_pos=0):
-        CHUNK_SIZE = 8192 # Measured as optimal
-
-        fp.seek(start_pos)
-        data = fp.read(CHUNK_SIZE)
-
-        while data:
-            sync_pos = data.find(b'\xff', 0)
-            if sync_pos >= 0:
-                header = data[sync_pos:sync_pos + 4]
-                if len(header) == 4:
-                    return (start_pos + sync_pos, header)
-            data = fp.read(CHUNK_SIZE)
-        return (None, None)
-
-    sync_pos, header_bytes = find_sync(fp, start_pos)
-    while sync_pos is not None:
-        header = bytes2dec(header_bytes)
-        if isValidHeader(header):
-            return (sync_pos, header, header_bytes)
-        sync_pos, header_bytes = find_sync(fp, start_pos + sync_pos + 2)
-    return (None, None, None)
-
-
 def timePerFrame(mp3_header, vbr):
     '''Computes the number of seconds per mp3 frame. It can be used to
     compute overall playtime and bitrate. The mp3 layer and sample
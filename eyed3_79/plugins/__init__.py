@@ -163,6 +163,35 @@ class LoaderPlugin(Plugin):
         self._num_loaded = 0
         self._file_cache = [] if cache_files else None
         self._dir_images = [] if track_images else None
+        self._preloaded = {}
+
+    def loadArgs(self):
+        '''Returns the keyword arguments passed to :func:`eyed3.core.load`
+        when preloading. Subclasses that pass arguments to ``handleFile``
+        should override this and pass the same ones, otherwise preloaded
+        files are ignored and loaded again.'''
+        return {}
+
+    def preloadFile(self, f):
+        '''Loads ``f`` with ``loadArgs`` ahead of ``handleFile``, which uses
+        the result if it is given the same arguments. Only used when
+        ``PRELOAD_SAFE`` is set by the subclass, since core.load is then
+        called from worker threads.'''
+        kwargs = self.loadArgs()
+        try:
+            self._preloaded[f] = (kwargs, core.load(f, **kwargs), None)
+        except Exception as ex:
+            self._preloaded[f] = (kwargs, None, ex)
+
+    def _load(self, f, args, kwargs):
+        preloaded = self._preloaded.pop(f, None)
+        if preloaded is None or args or preloaded[0] != kwargs:
+            return core.load(f, *args, **kwargs)
+
+        _, audio_file, ex = preloaded
+        if ex is not None:
+            raise ex
+        return audio_file
 
     def handleFile(self, f, *args, **kwargs):
         '''Loads ``f`` and sets ``self.audio_file`` to an instance of
@@ -174,7 +203,7 @@ class LoaderPlugin(Plugin):
         self.audio_file = None
 
         try:
-            self.audio_file = core.load(f, *args, **kwargs)
+            self.audio_file = self._load(f, args, kwargs)
         except NotImplementedError as ex:
             # Frame decryption, for instance...
             printError(str(ex))
@@ -193,6 +222,7 @@ class LoaderPlugin(Plugin):
         '''Override to make use of ``self._file_cache``. By default the list
         is cleared, subclasses should consider doing the same otherwise every
         AudioFile will be cached.'''
+        self._preloaded.clear()
         if self._file_cache is not None:
             self._file_cache = []
 
@@ -67,6 +67,7 @@ class ArtPlugin(LoaderPlugin):
     SUMMARY = u"Art for albums, artists, etc."
     DESCRIPTION = u""
     NAMES = ["art"]
+    PRELOAD_SAFE = True
 
     def __init__(self, arg_parser):
         super(ArtPlugin, self).__init__(arg_parser, cache_files=True,
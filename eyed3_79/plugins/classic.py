@@ -47,6 +47,7 @@ All date options (-Y, --release-year excepted) follow ISO 8601 format. This is
 optional. For example, 2012-03 is valid, 2012--12 is not.
 """
     NAMES = ["classic"]
+    PRELOAD_SAFE = True
 
     def __init__(self, arg_parser):
         super(ClassicPlugin, self).__init__(arg_parser)
@@ -430,10 +431,13 @@ optional. For example, 2012-03 is valid, 2012--12 is not.
                           help=ARGS_HELP["--preserve-file-times"])
 
 
+    def loadArgs(self):
+        return {"tag_version": self.args.tag_version}
+
     def handleFile(self, f):
         parse_version = self.args.tag_version
 
-        super(ClassicPlugin, self).handleFile(f, tag_version=parse_version)
+        super(ClassicPlugin, self).handleFile(f, **self.loadArgs())
 
         if not self.audio_file:
             return
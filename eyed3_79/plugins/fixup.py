@@ -67,6 +67,7 @@ def dirDate(d):
 
 class FixupPlugin(LoaderPlugin):
     NAMES = ["fixup"]
+    PRELOAD_SAFE = True
     SUMMARY = "Performs various checks and fixes to directories of audio files."
     DESCRIPTION = u"""
 Operates on directories at a time, fixing each as a unit (album,
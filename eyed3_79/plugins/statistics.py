@@ -390,6 +390,7 @@ class Id3ImageTypeCounter(AudioStat):
 
 class StatisticsPlugin(LoaderPlugin):
     NAMES = ['stats']
+    PRELOAD_SAFE = True
     SUMMARY = u"Computes statistics for all audio files scanned."
 
     def __init__(self, arg_parser):
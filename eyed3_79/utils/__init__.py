@@ -24,6 +24,7 @@ import logging
 import argparse
 import warnings
 import threading
+from collections import deque
 from ..compat import unicode, StringIO, PY2
 
 ID3_MIME_TYPE = "application/x-id3"
@@ -51,9 +52,17 @@ def guessMimetype(filename, with_encoding=False):
     return mime if not with_encoding else (mime, enc)
 
 
-def walk(handler, path, excludes=None, fs_encoding=LOCAL_FS_ENCODING):
+def walk(handler, path, excludes=None, fs_encoding=LOCAL_FS_ENCODING,
+         jobs=1):
     '''A wrapper around os.walk which handles exclusion patterns and unicode
-    conversion.'''
+    conversion.
+
+    When ``jobs`` is greater than 1 and the handler sets ``PRELOAD_SAFE``,
+    ``jobs`` worker threads call ``handler.preloadFile`` ahead of the main
+    thread, which still calls ``handleFile`` for each file, and then
+    ``handleDirectory``, in the same order as a serial walk. Preloading never
+    runs past the end of a directory, so nothing is read from the next
+    directory until ``handleDirectory`` has returned.'''
     path = unicode(path, fs_encoding) if type(path) is not unicode else path
 
     excludes = excludes if excludes else []
@@ -75,26 +84,78 @@ def walk(handler, path, excludes=None, fs_encoding=LOCAL_FS_ENCODING):
         handler.handleFile(os.path.abspath(path))
         return
 
-    for (root, dirs, files) in os.walk(path):
-        root = root if type(root) is unicode else unicode(root, fs_encoding)
-        dirs.sort()
-        files.sort()
-        for f in files:
-            f = f if type(f) is unicode else unicode(f, fs_encoding)
-            f = os.path.abspath(os.path.join(root, f))
-            if not _isExcluded(f):
-                try:
-                    handler.handleFile(f)
-                except StopIteration:
-                    return
-
-        if files:
-            handler.handleDirectory(root, files)
+    pool = None
+    if jobs > 1 and getattr(handler, "PRELOAD_SAFE", False):
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(jobs)
+
+    try:
+        for (root, dirs, files) in os.walk(path):
+            root = root if type(root) is unicode else unicode(root, fs_encoding)
+            dirs.sort()
+            files.sort()
+            paths = []
+            for f in files:
+                f = f if type(f) is unicode else unicode(f, fs_encoding)
+                f = os.path.abspath(os.path.join(root, f))
+                if not _isExcluded(f):
+                    paths.append(f)
+
+            try:
+                if pool is not None:
+                    _preloadAndHandle(handler, pool, paths, jobs * 2)
+                else:
+                    for f in paths:
+                        handler.handleFile(f)
+            except StopIteration:
+                return
+
+            if files:
+                handler.handleDirectory(root, files)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _preloadAndHandle(handler, pool, paths, lookahead):
+    '''Calls ``handler.handleFile`` for each of ``paths`` in order, with at
+    most ``lookahead`` calls to ``handler.preloadFile`` queued or running in
+    ``pool`` ahead of it. Every preload has finished when this returns, even
+    if ``handleFile`` raised.'''
+    pending = deque()
+    remaining = iter(paths)
+    try:
+        for f in remaining:
+            pending.append(pool.apply_async(handler.preloadFile, (f,)))
+            if len(pending) == lookahead:
+                break
+
+        for f in paths:
+            pending.popleft().wait()
+            for nxt in remaining:
+                pending.append(pool.apply_async(handler.preloadFile, (nxt,)))
+                break
+            handler.handleFile(f)
+    finally:
+        for result in pending:
+            result.wait()
 
 
 class FileHandler(object):
     '''A handler interface for :func:`eyed3.utils.walk` callbacks.'''
 
+    PRELOAD_SAFE = False
+    '''True if ``preloadFile`` may be called from worker threads, ahead of
+    ``handleFile``, when :func:`eyed3.utils.walk` is given ``jobs > 1``.'''
+
+    def preloadFile(self, f):
+        '''Called from a worker thread, before ``handleFile`` is called for
+        the same file on the main thread, when the walk is concurrent and
+        ``PRELOAD_SAFE`` is set. Exceptions should be kept and raised from
+        ``handleFile``, the return value is ignored.'''
+        pass
+
     def handleFile(self, f):
         '''Called for each file walked. The file ``f`` is the full path and
         the return value is ignored. If the walk should abort the method should
@@ -0,0 +1,97 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import time
+import hashlib
+import threading
+
+import requests
+import acoustid
+
+"""
+HTTP client for AcoustID lookups that can run several requests at once while staying under the service's rate limit.
+pyacoustid's own client holds a global lock for the duration of each request, so it can only make 1 at a time.
+"""
+
+DEFAULT_BASE_URL = acoustid.API_BASE_URL
+
+
+def cache_key(duration, fingerprint):
+    """
+    :param duration: Duration of the audio in seconds (only the integer part is sent to AcoustID)
+    :param str fingerprint: Encoded chromaprint fingerprint
+    :return str: Compact, fixed-length key for the lookup's response
+    """
+    if isinstance(fingerprint, unicode):
+        fingerprint = fingerprint.encode("ascii")
+    return hashlib.sha1(b"%d:%s" % (int(duration), fingerprint)).hexdigest()
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        """
+        :param float rate: Maximum number of calls per second; 0 or None for no limit
+        """
+        self.interval = (1 / rate) if rate else 0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the caller may proceed.  The lock is only held while reserving a slot, not while sleeping."""
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class AcoustidClient:
+    def __init__(self, apikey, base_url=None, rate=3, timeout=30, meta="recordings releasegroups"):
+        """
+        :param str apikey: AcoustID API key
+        :param str base_url: Base URL of the web service (default: the real AcoustID service); e.g., the URL of a local
+          stand-in server (see acoustid_standin.py) for testing and benchmarking
+        :param float rate: Maximum number of requests per second across all threads
+        :param float timeout: Request timeout in seconds
+        :param str meta: Metadata to request
+        """
+        self.apikey = apikey
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/") + "/"
+        self.limiter = RateLimiter(rate)
+        self.timeout = timeout
+        self.meta = meta
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """One requests.Session (and therefore 1 connection pool) per thread"""
+        try:
+            return self._local.session
+        except AttributeError:
+            self._local.session = requests.Session()
+            return self._local.session
+
+    def lookup(self, duration, fingerprint):
+        """
+        :return dict: The parsed response; raises acoustid.WebServiceError if the request or the lookup failed
+        """
+        params = {
+            "format": "json", "client": self.apikey, "duration": int(duration), "fingerprint": fingerprint,
+            "meta": self.meta
+        }
+        self.limiter.wait()
+        try:
+            resp = self.session.post(self.base_url + "lookup", data=params, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            raise acoustid.WebServiceError("HTTP request failed: {}".format(e))
+        try:
+            parsed = resp.json()
+        except ValueError:
+            raise acoustid.WebServiceError("Response is not valid JSON (HTTP {})".format(resp.status_code))
+        if parsed.get("status") != "ok":
+            raise acoustid.WebServiceError("Lookup failed: {}".format(parsed.get("error", parsed)), parsed)
+        return parsed
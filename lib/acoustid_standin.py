@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+from io import BytesIO
+from urlparse import parse_qs
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+"""
+Local stand-in for the AcoustID lookup web service, for testing and benchmarking lookups without an API key or network
+access, and without being subject to the real service's rate limit.  Responses are derived from a hash of the submitted
+fingerprint, so the same fingerprint always gets the same (made-up) recordings, artists, and albums.
+
+Usage: python lib/acoustid_standin.py --port 8080
+       python dedupe.py lookup --endpoint http://localhost:8080/v2/
+"""
+
+
+def fake_response(duration, fingerprint, miss_rate=0.0):
+    """
+    :param int duration: Duration of the audio in seconds
+    :param str fingerprint: Encoded fingerprint
+    :param float miss_rate: Fraction of fingerprints (chosen by hash) for which no results are returned
+    :return dict: A response shaped like an AcoustID lookup with meta=recordings+releasegroups
+    """
+    digest = hashlib.sha1(fingerprint.encode("utf-8") if isinstance(fingerprint, unicode) else fingerprint).hexdigest()
+    rand = random.Random(digest)
+    if rand.random() < miss_rate:
+        return {"status": "ok", "results": []}
+
+    artist = {"id": "artist-" + digest[:8], "name": "Artist {}".format(digest[:4])}
+    album_artist = artist if rand.random() < 0.8 else {"id": "artist-" + digest[8:16], "name": "Various Artists"}
+    recording = {
+        "id": "recording-" + digest[:12], "title": "Track {}".format(digest[4:8]), "duration": duration,
+        "artists": [artist],
+        "releasegroups": [
+            {"id": "album-" + digest[16:24], "title": "Album {}".format(digest[16:20]), "type": "Album", "artists": [album_artist]}
+        ]
+    }
+    if rand.random() < 0.3:
+        recording["releasegroups"].append({
+            "id": "album-" + digest[24:32], "title": "Compilation {}".format(digest[24:28]), "type": "Album",
+            "secondarytypes": ["Compilation"], "artists": [{"id": "artist-various", "name": "Various Artists"}]
+        })
+    result = {"id": "result-" + digest[:16], "score": round(0.5 + rand.random() / 2, 6), "recordings": [recording]}
+    return {"status": "ok", "results": [result]}
+
+
+class StandinRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip("/").split("?")[0] != "/v2/lookup":
+            return self._respond(404, {"status": "error", "error": {"code": 404, "message": "unknown path"}})
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.GzipFile(fileobj=BytesIO(body)).read()
+        params = {key: vals[0] for key, vals in parse_qs(body).iteritems()}
+        missing = [param for param in ("client", "duration", "fingerprint") if not params.get(param)]
+        if missing:
+            return self._respond(400, {"status": "error", "error": {"code": 1, "message": "missing required parameter(s): {}".format(", ".join(missing))}})
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self._respond(200, fake_response(int(params["duration"]), params["fingerprint"], self.server.miss_rate))
+
+    def _respond(self, code, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class StandinServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, miss_rate=0.0, verbose=False):
+        """
+        :param tuple address: (host, port) to listen on
+        :param float latency: Seconds to wait before responding to each lookup, to simulate the real service
+        :param float miss_rate: Fraction of fingerprints for which no results are returned
+        :param bool verbose: Log each request to stderr
+        """
+        HTTPServer.__init__(self, address, StandinRequestHandler)
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.verbose = verbose
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the AcoustID lookup web service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", "-p", type=int, default=8080, help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--latency", "-l", type=float, default=0.0, help="Seconds to wait before each response (default: %(default)s)")
+    parser.add_argument("--miss_rate", "-m", type=float, default=0.0, help="Fraction of fingerprints with no results (default: %(default)s)")
+    parser.add_argument("--verbose", "-v", action="store_true", default=False, help="Log each request")
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), args.latency, args.miss_rate, args.verbose)
+    print("Serving lookups at http://{}:{}/v2/".format(args.host, args.port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,13 @@ from __future__ import print_function, division, unicode_literals
 
 import os
 import json
+import sqlite3
+from itertools import islice, groupby
+from operator import itemgetter
 from collections import OrderedDict
 
 from cached_property import cached_property
-from sqlalchemy import create_engine, MetaData, Table, Column, func as sql_func
+from sqlalchemy import create_engine, MetaData, Table, Column, select, func as sql_func
 from sqlalchemy.orm import mapper, sessionmaker
 from sqlalchemy.exc import NoSuchTableError
 import sqlalchemy.types as sqltypes
@@ -52,10 +55,10 @@ class AlchemyDatabase:
             cls._instances[db_path] = cls(db_path, *args, **kwargs)
         return cls._instances[db_path]
 
-    def add_table(self, name, columns=None, pk=None):
+    def add_table(self, name, columns=None, pk=None, indexes=None):
         if name in self._tables:
             raise KeyError("Table '{}' already exists".format(name))
-        return DBTable(self, name, columns, pk)
+        return DBTable(self, name, columns, pk, indexes)
 
     def register_table(self, db_table):
         if not isinstance(db_table, DBTable):
@@ -84,7 +87,15 @@ class AlchemyDatabase:
 
 
 class DBTable(object):
-    def __init__(self, parent_db, name, columns=None, pk=None):
+    def __init__(self, parent_db, name, columns=None, pk=None, indexes=None):
+        """
+        :param AlchemyDatabase parent_db: The DB that this table is in
+        :param str name: Table name
+        :param list columns: Column names or (name, type) tuples; only required if the table does not exist yet
+        :param str pk: Name of the PK column (default: the first column)
+        :param list indexes: Secondary indexes to create if they do not exist; each one is a column name or a tuple of
+          column names
+        """
         class DBRow(object):
             def __getitem__(row, key):
                 if key in self.columns:
@@ -94,7 +105,7 @@ class DBTable(object):
             def __setitem__(row, key, value):
                 if key in self.columns:
                     setattr(row, key, value)
-                    self.session.commit()
+                    self.commit()
                 else:
                     raise KeyError(key)
 
@@ -109,7 +120,7 @@ class DBTable(object):
                 for k, v in kwargs.iteritems():
                     if k in self.columns:
                         setattr(row, k, v)
-                self.session.commit()
+                self.commit()
 
             def keys(row):
                 return self.columns
@@ -136,6 +147,7 @@ class DBTable(object):
         self.name = name
         self.rowType = DBRow
         self.session = self.db.session
+        self._upsert_stmts = {}
 
         col_types = None
         try:
@@ -184,8 +196,40 @@ class DBTable(object):
 
         if (self.name == defintions_metatable) and (self.name not in self):
             self.insert([self.name, json.dumps(col_types)])
+        for index_cols in (indexes or []):
+            self.add_index(index_cols)
         self.db.register_table(self)
 
+    def add_index(self, columns, unique=False):
+        """
+        Creates a secondary index on the given column(s) if it does not already exist
+
+        :param columns: A column name or a tuple of column names
+        :param bool unique: Create a unique index, so that INSERT OR IGNORE skips rows with existing values
+        :return str: The name of the index
+        """
+        columns = (columns,) if isinstance(columns, (str, unicode)) else tuple(columns)
+        for column in columns:
+            if column not in self.columns:
+                raise KeyError(column)
+        quote = self.db.engine.dialect.identifier_preparer.quote
+        index_name = "{}_{}_{}".format("ux" if unique else "ix", self.name, "_".join(columns))
+        self.db.engine.execute("CREATE {}INDEX IF NOT EXISTS {} ON {} ({})".format(
+            "UNIQUE " if unique else "", quote(index_name), quote(self.name), ", ".join(quote(col) for col in columns)
+        ))
+        return index_name
+
+    def commit(self):
+        """
+        The session is switched to autocommit mode after it has already begun its first transaction, so there is only
+        a transaction to commit until that first one has been committed; after that, pending changes just need to be
+        flushed (which happens in its own transaction).
+        """
+        if self.session.transaction is not None:
+            self.session.commit()
+        else:
+            self.session.flush()
+
     def select(self, **kwargs):
         return self.rows().filter_by(**kwargs)
 
@@ -204,6 +248,64 @@ class DBTable(object):
         for val in self.session.query(getattr(self.rowType, column)).distinct():
             yield val[0]
 
+    def column_values(self, *columns, **kwargs):
+        """
+        :param columns: Names of the columns to select
+        :param where: Optional filter clause (keyword-only), e.g., ``table.table.c.size > 0``
+        :return: Generator that yields a tuple of the given columns' values for each row, without building row objects
+        """
+        for column in columns:
+            if column not in self.columns:
+                raise KeyError(column)
+        query = self.session.query(*[getattr(self.rowType, column) for column in columns])
+        if kwargs.get("where") is not None:
+            query = query.filter(kwargs["where"])
+        for row in query:
+            yield tuple(row)
+
+    def duplicate_groups(self, column, *columns):
+        """
+        Groups rows by the given column in SQL, so only the values shared by more than one row (and only the requested
+        columns of those rows) are read; NULLs are not considered to be duplicates of each other.  Indexing the given
+        column keeps this from needing to sort the table.
+
+        :param str column: Name of the column to group by
+        :param columns: Names of the columns to return for each row in a group (default: the PK)
+        :return: Generator that yields (value, [tuple of the given columns' values for each row]) 2-tuples
+        """
+        key_col, cols = self._select_columns(column, columns)
+        shared = select([key_col]).where(key_col.isnot(None)).group_by(key_col).having(sql_func.count() > 1)
+        query = select([key_col] + cols).where(key_col.in_(shared)).order_by(key_col, self.table.c[self.pk])
+        for value, rows in groupby(self.db.engine.execute(query), itemgetter(0)):
+            yield value, [tuple(row[1:]) for row in rows]
+
+    def unique_rows(self, column, *columns):
+        """
+        :param str column: Name of the column to group by
+        :param columns: Names of the columns to return (default: the PK)
+        :return: Generator that yields a tuple of the given columns' values for each row whose value in the given column
+          is not shared by any other row (rows with NULL in that column are skipped)
+        """
+        key_col, cols = self._select_columns(column, columns)
+        query = select([sql_func.min(col) for col in cols]).where(key_col.isnot(None))
+        query = query.group_by(key_col).having(sql_func.count() == 1)
+        for row in self.db.engine.execute(query):
+            yield tuple(row)
+
+    def _select_columns(self, column, columns):
+        for col in (column,) + columns:
+            if col not in self.columns:
+                raise KeyError(col)
+        return self.table.c[column], [self.table.c[col] for col in (columns or (self.pk,))]
+
+    def rename(self, key, new_key):
+        """
+        Changes the PK of the row with the given key, leaving the rest of the row as-is
+        """
+        if not self.session.query(self.rowType).filter_by(**{self.pk: key}).update({self.pk: new_key}):
+            raise KeyError(key)
+        self.commit()
+
     def __getitem__(self, key):
         try:
             return self.session.query(self.rowType).filter_by(**{self.pk: key})[0]
@@ -217,12 +319,12 @@ class DBTable(object):
         if not key in self:
             raise KeyError(key)
         self.session.query(self.rowType).filter_by(**{self.pk: key}).delete()
-        self.session.commit()
+        self.commit()
 
     def bulk_delete(self, keys):
         for key in keys:
             self.session.query(self.rowType).filter_by(**{self.pk: key}).delete()
-        self.session.commit()
+        self.commit()
 
     def insert(self, row):
         if not isinstance(row, (tuple, list, dict)):
@@ -235,6 +337,121 @@ class DBTable(object):
             row = {col_keys[c]: row[c] for c in range(len(col_keys))}
         self.table.insert(row).execute()
 
+    def _row_dict(self, row):
+        if isinstance(row, dict):
+            for key in row:
+                if key not in self.columns:
+                    raise KeyError("Unknown column for table {}: {}".format(self.name, key))
+            return row
+        elif not isinstance(row, (tuple, list)):
+            raise TypeError("Expected tuple, list, or dict; found {}".format(type(row)))
+        elif len(row) != len(self.columns):
+            raise InputValidationException("Found {} columns; expected {}".format(len(row), len(self.columns)))
+        return dict(zip(self.columns.keys(), row))
+
+    def _write_batches(self, rows, batch_size, write_fn, conn=None):
+        """
+        Groups the given rows into batches, and calls write_fn(connection, batch) for each batch in its own transaction,
+        or in the given connection's transaction
+        :return int: The number of rows that were written
+        """
+        self.commit()                                       #Pending ORM changes must not be written after these rows
+        rows = iter(rows)
+        count = 0
+        while True:
+            batch = [self._row_dict(row) for row in islice(rows, batch_size)]
+            if not batch:
+                return count
+            if conn is not None:
+                write_fn(conn, batch)
+            else:
+                with self.db.engine.begin() as batch_conn:
+                    write_fn(batch_conn, batch)
+            count += len(batch)
+
+    def insert_many(self, rows, batch_size=1000, conflict=None, conn=None):
+        """
+        Inserts the given rows with executemany, committing once per batch rather than once per row.
+
+        :param rows: Iterable of rows (lists / tuples with a value for every column, or dicts; columns that are missing
+          from a dict are set to NULL)
+        :param int batch_size: Number of rows to write per transaction
+        :param str conflict: None to fail on duplicate PKs, or "replace" / "ignore" to use INSERT OR REPLACE / IGNORE
+        :param conn: Connection with an open transaction to write in, so that several tables can be written in one
+          transaction (default: one transaction per batch)
+        :return int: The number of rows that were written
+        """
+        if conflict not in (None, "replace", "ignore"):
+            raise ValueError("Invalid conflict resolution: {}".format(conflict))
+        stmt = self.table.insert()
+        if conflict is not None:
+            stmt = stmt.prefix_with("OR {}".format(conflict.upper()))
+        column_names = self.columns.keys()
+
+        def _insert(conn, batch):
+            conn.execute(stmt, [{col: row.get(col) for col in column_names} for row in batch])
+
+        return self._write_batches(rows, batch_size, _insert, conn)
+
+    def upsert_many(self, rows, batch_size=1000, conn=None):
+        """
+        Inserts the given rows, or updates the existing rows that have the same PKs.  As with __setitem__, only the
+        columns present in a given row are updated.  SQLite versions that are too old for INSERT ... ON CONFLICT get
+        the same result from an INSERT OR IGNORE followed by an UPDATE for each group of rows with the same columns.
+
+        :param rows: Iterable of rows (lists / tuples with a value for every column, or dicts that include the PK)
+        :param int batch_size: Number of rows to write per transaction
+        :param conn: Connection with an open transaction to write in (see insert_many)
+        :return int: The number of rows that were written
+        """
+        def _upsert(conn, batch):
+            grouped = OrderedDict()
+            for row in batch:
+                if self.pk not in row:
+                    raise KeyError("Missing PK column '{}' for table {}".format(self.pk, self.name))
+                grouped.setdefault(tuple(col for col in self.columns if col in row), []).append(row)
+            for columns, group in grouped.iteritems():
+                for sql, stmt_columns, processors in self._upsert_stmts_for(columns):
+                    conn.execute(sql, [
+                        tuple(proc(row[col]) if proc else row[col] for col, proc in zip(stmt_columns, processors))
+                        for row in group
+                    ])
+
+        return self._write_batches(rows, batch_size, _upsert, conn)
+
+    def _upsert_stmts_for(self, columns):
+        """
+        :param tuple columns: Names of the columns that will be provided
+        :return list: (sql, columns, processors) for each statement to execute, in order, where columns are the names
+          of the columns whose values are bound to the statement's parameters, and processors are the bind processors
+          for those columns' types, since the raw statements bypass SQLAlchemy's type handling
+        """
+        try:
+            return self._upsert_stmts[columns]
+        except KeyError:
+            pass
+        dialect = self.db.engine.dialect
+        quote = dialect.identifier_preparer.quote
+        table, pk = quote(self.name), quote(self.pk)
+        col_list, params = ", ".join(quote(col) for col in columns), ", ".join("?" for _ in columns)
+        updated = tuple(col for col in columns if col != self.pk)
+        if sqlite3.sqlite_version_info >= (3, 24, 0):
+            updates = ", ".join("{0} = excluded.{0}".format(quote(col)) for col in updated)
+            stmts = [("INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO {}".format(
+                table, col_list, params, pk, "UPDATE SET {}".format(updates) if updates else "NOTHING"
+            ), columns)]
+        else:
+            stmts = [("INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(table, col_list, params), columns)]
+            if updated:                                     #After the insert, so the last of duplicate PKs wins
+                updates = ", ".join("{} = ?".format(quote(col)) for col in updated)
+                stmts.append(("UPDATE {} SET {} WHERE {} = ?".format(table, updates, pk), updated + (self.pk,)))
+
+        self._upsert_stmts[columns] = [
+            (sql, stmt_columns, [self.columns[col].type.bind_processor(dialect) for col in stmt_columns])
+            for sql, stmt_columns in stmts
+        ]
+        return self._upsert_stmts[columns]
+
     def __setitem__(self, key, value):
         if not isinstance(value, (list, dict, tuple)):
             raise TypeError("Expected tuple, list, or dict; found {}".format(type(value)))
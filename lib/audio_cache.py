@@ -0,0 +1,51 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+from sqlalchemy import select, and_, func as sql_func
+
+from alchemy_db import DBTable
+
+"""
+Base class for the tables of results that are keyed by the audio hash (fingerprints, frame hashes, and frame indexes),
+so that each distinct audio stream is only processed once, and results survive rescans / interrupted runs.
+"""
+
+
+class AudioHashCache:
+    def __init__(self, db, music_table, name, columns, indexes=None):
+        """
+        :param db: AlchemyDatabase that contains the music table
+        :param DBTable music_table: The music table
+        :param str name: Name of the cache table
+        :param list columns: (name, type) tuples for the cache table; the first must be audio_sha256
+        :param list indexes: Columns to index in addition to audio_sha256
+        """
+        self.db = db
+        self.music = music_table
+        self.table = DBTable(db, name, columns, "audio_sha256", indexes=indexes)
+        self.tbl = self.table.table
+
+    def pending(self):
+        """
+        :return list: (audio_sha256, path) for one file per distinct audio hash that is not in this cache yet; hashes
+          that previously failed are not retried
+        """
+        music = self.music.table
+        done = select([self.tbl.c.audio_sha256])
+        query = select([music.c.audio_sha256, sql_func.min(music.c.path)]).where(and_(
+            music.c.audio_sha256.isnot(None), music.c.audio_sha256.notin_(done)
+        )).group_by(music.c.audio_sha256)
+        return [tuple(row) for row in self.db.engine.execute(query)]
+
+    @staticmethod
+    def _rows(results, *keys):
+        """
+        :param list results: (audio_sha256, values, error) 3-tuples, where values is None if there was an error
+        :param keys: Names of the columns that hold the values
+        :return: Generator that yields a row dict for each result
+        """
+        for audio_hash, values, error in results:
+            row = dict(zip(keys, values if values is not None else [None] * len(keys)))
+            row.update(audio_sha256=audio_hash, error=error)
+            yield row
@@ -0,0 +1,116 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import struct
+from hashlib import sha256
+from itertools import groupby
+from operator import itemgetter
+
+import numpy
+from sqlalchemy import select, func as sql_func
+
+from eyeD3b.mp3 import find_frames
+from audio_cache import AudioHashCache
+from audio_region import locate_audio
+from mapped_file import MappedFile
+
+"""
+Hashes only the MPEG audio frames in a file, skipping the Xing / Info / VBRI frame that encoders and rippers write at
+the start of the audio (which includes the LAME tag, and differs between otherwise identical rips), along with any junk
+between frames.  Like fingerprints, results are keyed by the audio hash, so each distinct audio stream is only walked
+once.
+
+Frames are found with eyeD3b's find_frames, which is also what frame_index uses to build its indexes.
+"""
+
+INFO_FRAME_IDS = (b"Xing", b"Info")
+
+frame_hash_columns = [("audio_sha256", "TEXT"), ("audio_frames_sha256", "TEXT"), ("frames", "INTEGER"), ("error", "TEXT")]
+_header = struct.Struct(b">I")
+
+
+def is_info_frame(data, pos, header):
+    """
+    :return bool: True if the frame at pos is a Xing / Info / VBRI header frame rather than audio
+    """
+    mpeg1, mono = ((header >> 19) & 0x3) == 3, ((header >> 6) & 0x3) == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    return (data[pos + 4 + side_info:pos + 8 + side_info] in INFO_FRAME_IDS) or (data[pos + 36:pos + 40] == b"VBRI")
+
+
+def find_audio_frames(mapped):
+    """
+    :param MappedFile mapped: A memory-mapped MP3 file
+    :return tuple: (start, end, offsets, lengths, seconds, info_bytes), where start and end are the offsets of the MPEG
+      audio, offsets / lengths / seconds are numpy arrays of the offset, length, and play time of each audio frame (see
+      find_frames), and info_bytes is the length of the leading Xing / Info / VBRI frame, which is not included in the
+      arrays (0 if there is none)
+    """
+    start, end = locate_audio(mapped).audio_range
+    offsets, lengths, seconds = find_frames(mapped, start, end)
+    info_bytes = 0
+    if len(offsets):
+        data = mapped.view(0, end)
+        first = int(offsets[0])
+        if is_info_frame(data, first, _header.unpack_from(data, first)[0]):
+            info_bytes = int(lengths[0])
+            offsets, lengths, seconds = offsets[1:], lengths[1:], seconds[1:]
+    return start, end, offsets, lengths, seconds, info_bytes
+
+
+def audio_frames_hash(file_path):
+    """
+    :param str file_path: Path of an MP3 file
+    :return tuple: (SHA-256 hex digest of the file's audio frames, number of frames); the digest is None if no frames
+      were found
+    """
+    digest = sha256()
+    with MappedFile(file_path) as mapped:
+        start, end, offsets, lengths, seconds, info_bytes = find_audio_frames(mapped)
+        if not len(offsets):
+            return None, 0
+        data = mapped.view(0, end)
+        ends = offsets + lengths
+        breaks = numpy.flatnonzero(offsets[1:] != ends[:-1]) + 1      #Frames after junk start a new run of frames
+        run_starts = offsets[numpy.concatenate(([0], breaks))].tolist()
+        run_ends = ends[numpy.concatenate((breaks - 1, [-1]))].tolist()
+        for run_start, run_end in zip(run_starts, run_ends):
+            digest.update(buffer(data, run_start, run_end - run_start))
+    return digest.hexdigest(), len(offsets)
+
+
+class FrameHashCache(AudioHashCache):
+    def __init__(self, db, music_table):
+        AudioHashCache.__init__(self, db, music_table, "audio_frames", frame_hash_columns, ["audio_frames_sha256"])
+
+    def store(self, results):
+        """
+        :param list results: (audio_sha256, (audio_frames_sha256, frames), error) 3-tuples (see audio_frames_hash), where
+          the values are None if there was an error
+        """
+        self.table.upsert_many(self._rows(results, "audio_frames_sha256", "frames"))
+
+    def _joined(self):
+        music = self.music.table
+        return music.join(self.tbl, music.c.audio_sha256 == self.tbl.c.audio_sha256)
+
+    def duplicate_groups(self):
+        """
+        :return: Generator that yields (audio_frames_sha256, [paths]) for each frame hash shared by more than one file
+        """
+        music, frames_hash = self.music.table, self.tbl.c.audio_frames_sha256
+        shared = select([frames_hash]).select_from(self._joined()).where(frames_hash.isnot(None))
+        shared = shared.group_by(frames_hash).having(sql_func.count() > 1)
+        query = select([frames_hash, music.c.path]).select_from(self._joined()).where(frames_hash.in_(shared))
+        for value, rows in groupby(self.db.engine.execute(query.order_by(frames_hash, music.c.path)), itemgetter(0)):
+            yield value, [path for value, path in rows]
+
+    def unique_paths(self):
+        """
+        :return: Generator that yields the path of each file whose frame hash is not shared by any other file
+        """
+        music, frames_hash = self.music.table, self.tbl.c.audio_frames_sha256
+        query = select([sql_func.min(music.c.path)]).select_from(self._joined()).where(frames_hash.isnot(None))
+        for path, in self.db.engine.execute(query.group_by(frames_hash).having(sql_func.count() == 1)):
+            yield path
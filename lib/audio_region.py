@@ -0,0 +1,140 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import struct
+from io import BytesIO
+from hashlib import sha256
+
+from mutagen.id3 import ID3
+
+"""
+Locates the tags around the MPEG audio in an MP3 file by reading only their headers / footers, so the audio can be
+hashed straight from a memory map (see MappedFile.view) instead of from a copy of the file with its tags removed.
+
+An ID3v2 tag's size is the number of bytes it occupies on disk, so the unsynchronisation flag does not affect where the
+audio starts; it is recorded for completeness.
+"""
+
+ID3V2_UNSYNC = 0x80
+ID3V2_FOOTER = 0x10
+APE_HAS_HEADER = 0x80000000
+
+
+class AudioRegion(object):
+    def __init__(self, size, v2_size=0, v2_version=None, v2_flags=0, footer_size=0, ape_size=0, v1_size=0):
+        """
+        :param int size: Size of the file
+        :param int v2_size: Size of the ID3v2 tag at the start of the file, including its header but not its footer
+        :param tuple v2_version: (major, revision) version of that tag
+        :param int v2_flags: Header flags of that tag
+        :param int footer_size: Size of that tag's footer
+        :param int ape_size: Size of the APEv2 tag before the ID3v1 tag (or the end of the file), including its header
+        :param int v1_size: Size of the ID3v1 tag at the end of the file
+        """
+        self.size = size
+        self.v2_size = v2_size
+        self.v2_version = v2_version
+        self.v2_flags = v2_flags
+        self.footer_size = footer_size
+        self.ape_size = ape_size
+        self.v1_size = v1_size
+
+    def __repr__(self):
+        return "<{}[size={}, audio={}, hashed={}]>".format(type(self).__name__, self.size, self.audio_range, self.hash_range)
+
+    @property
+    def unsync(self):
+        return bool(self.v2_flags & ID3V2_UNSYNC)
+
+    @property
+    def hash_range(self):
+        """
+        (start, end) of the bytes that ID3().delete() leaves behind, which is what audio_sha256 has always covered:
+        everything except the ID3v2 tag (without its footer) and the ID3v1 tag.  start > end if the ID3v2 tag's size is
+        larger than the rest of the file, in which case ID3().delete() fails.
+        """
+        end = self.size - self.v1_size
+        return self.v2_size if end >= 10 else 0, end
+
+    @property
+    def audio_range(self):
+        """(start, end) of the MPEG audio: everything except the ID3v2 tag & footer, the APEv2 tag, and the ID3v1 tag"""
+        end = self.size - self.v1_size - self.ape_size
+        return min(self.v2_size + self.footer_size, end), end
+
+
+def _id3v2_header(header):
+    """
+    :param header: The first 10 bytes of a file
+    :return tuple: (size, (major, revision), flags) of the ID3v2 tag at the start of the file, where size includes its
+      10 byte header but not its footer; size is 0 if there is no tag
+    """
+    if (len(header) < 10) or (header[:3] != b"ID3"):
+        return 0, None, 0
+    size = 0
+    for b in bytearray(header[6:10]):             #Synchsafe: only the lower 7 bits of each byte are used
+        size = (size << 7) | (b & 0x7f)
+    major, revision, flags = bytearray(header[3:6])
+    return size + 10, (major, revision), flags
+
+
+def _id3v1_size(tail):
+    """
+    Follows the same rules as mutagen's find_id3v1, which looks for "TAG" in the last 131 bytes so that it can avoid
+    mistaking the end of an APEv2 "APETAGEX" marker for an ID3v1 tag.
+
+    :param tail: The last 131 bytes of a file (or all of it, if it is smaller than that)
+    :return int: The size of the ID3v1 tag at the end of the file; 0 if there is none
+    """
+    idx = tail.find(b"TAG")
+    if idx == -1:
+        return 0
+    ape_idx = tail.find(b"APETAGEX")
+    if (ape_idx != -1) and (idx == ape_idx + 3):
+        return 0
+    size = len(tail) - idx
+    return size if (124 <= size <= 128) else 0
+
+
+def _ape_size(footer):
+    """
+    :param footer: The 32 bytes before the ID3v1 tag (or the end of the file)
+    :return int: The size of the APEv2 tag that ends with the given footer, including its header; 0 if there is none
+    """
+    if (len(footer) < 32) or (footer[:8] != b"APETAGEX"):
+        return 0
+    version, tag_size, item_count, flags = struct.unpack(b"<4I", footer[8:24])
+    return tag_size + (32 if flags & APE_HAS_HEADER else 0)
+
+
+def locate_audio(mapped):
+    """
+    :param MappedFile mapped: A memory-mapped MP3 file
+    :return AudioRegion: The locations of the tags and audio in the given file
+    """
+    size = mapped.size
+    v1_size = _id3v1_size(bytes(mapped.view(max(size - 131, 0))))
+    v2_size, v2_version, v2_flags = _id3v2_header(bytes(mapped.view(0, 10)))
+    footer_size = 10 if (v2_version is not None) and (v2_version[0] >= 4) and (v2_flags & ID3V2_FOOTER) else 0
+
+    ape_end = size - v1_size
+    ape_size = _ape_size(bytes(mapped.view(ape_end - 32, ape_end))) if ape_end >= 32 else 0
+    if ape_size > ape_end - (v2_size + footer_size):
+        ape_size = 0                                #Not a plausible APEv2 tag if it would overlap the ID3v2 tag
+    return AudioRegion(size, v2_size, v2_version, v2_flags, footer_size, ape_size, v1_size)
+
+
+def reference_audio_hash(file_path):
+    """
+    The original, copying implementation of audio_sha256, kept as the reference that locate_audio's hash_range must
+    match (see dedupe.py verify).
+
+    :param str file_path: Path of an MP3 file
+    :return str: SHA-256 hex digest of the file's content after removing its ID3 tags with mutagen
+    """
+    with open(file_path, "rb") as f:
+        content = BytesIO(f.read())
+    ID3().delete(content)
+    content.seek(0)
+    return sha256(content.read()).hexdigest()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import sys
+import random
+import shutil
+import struct
+import tempfile
+
+from audio_region import locate_audio, reference_audio_hash, ID3V2_FOOTER, APE_HAS_HEADER
+from mapped_file import MappedFile
+from mp3_handling import stream_hashes
+
+"""
+Deterministic check of locate_audio's hash_range rules: builds files from synthetic tags and audio for each of the
+cases that audio_region handles, and checks that stream_hashes' audio hash matches reference_audio_hash (i.e.,
+ID3().delete) for each of them, and that audio_range covers exactly the synthetic audio.  Unlike dedupe.py verify, this
+needs neither a DB nor a music library.
+
+Usage: python lib/audio_region_check.py
+"""
+
+
+def _synchsafe(size):
+    return bytes(bytearray((size >> shift) & 0x7f for shift in (21, 14, 7, 0)))
+
+
+def id3v2(major=3, body_size=200, footer=False, size=None):
+    """
+    :param int major: Major version of the tag
+    :param int body_size: Number of bytes after the header (a TIT2 frame followed by padding)
+    :param bool footer: Set the footer flag and append a footer (v2.4 only)
+    :param int size: Size to write in the header (default: body_size), e.g., to make a tag that claims to be larger
+      than the file
+    :return bytes: An ID3v2 tag
+    """
+    frame_body = b"\x00Synthetic"
+    frame = b"TIT2" + struct.pack(b">I", len(frame_body)) + b"\x00\x00" + frame_body
+    body = frame + b"\x00" * (body_size - len(frame))
+    size = body_size if size is None else size
+    header = b"ID3" + bytes(bytearray((major, 0, ID3V2_FOOTER if footer else 0))) + _synchsafe(size)
+    return header + body + ((b"3DI" + header[3:]) if footer else b"")
+
+
+def id3v1(title=b"Synthetic"):
+    """:return bytes: A 128 byte ID3v1.1 tag"""
+    return b"TAG" + title.ljust(30, b"\x00") + b"\x00" * 93 + b"\x01\xff"
+
+
+def apev2(has_header=True):
+    """
+    :param bool has_header: Include the 32 byte header as well as the footer
+    :return bytes: An APEv2 tag with 1 item
+    """
+    item = struct.pack(b"<2I", 9, 0) + b"Title\x00" + b"Synthetic"
+    size = len(item) + 32                               #The size includes the footer, but not the header
+
+    def _header_or_footer(is_header):
+        flags = APE_HAS_HEADER | (0x20000000 if is_header else 0)
+        return b"APETAGEX" + struct.pack(b"<4I", 2000, size, 1, flags) + b"\x00" * 8
+
+    footer = _header_or_footer(False)
+    if not has_header:
+        footer = footer[:20] + struct.pack(b"<I", 0) + footer[24:]
+    return (_header_or_footer(True) if has_header else b"") + item + footer
+
+
+def audio(size=4096, seed=0):
+    """:return bytes: Stand-in for MPEG audio: frame syncs followed by pseudo-random bytes that never contain "TAG\""""
+    rand = random.Random(seed)
+    data = bytearray(rand.getrandbits(8) for _ in range(size))
+    data[0:4] = b"\xff\xfb\x90\x64"
+    return bytes(data).replace(b"TAG", b"TAF")
+
+
+def cases():
+    """
+    :return list: (name, tags before the audio, audio, tags after the audio) for each case that locate_audio has to
+      handle; the audio is None if the tags are invalid
+    """
+    tag_in_audio = audio()[:-100] + b"TAG" + audio(97, 1)
+    tag_near_end = audio()[:-130] + b"TAG" + audio(127, 2)
+    return [
+        ("no tags", b"", audio(), b""),
+        ("empty file", b"", b"", b""),
+        ("shorter than a header", b"", b"ID3\x03", b""),
+        ("ID3v2.3", id3v2(3), audio(), b""),
+        ("ID3v2.4", id3v2(4), audio(), b""),
+        ("ID3v2.4 with footer", id3v2(4, footer=True), audio(), b""),
+        ("ID3v2.4 with footer and ID3v1", id3v2(4, footer=True), audio(), id3v1()),
+        ("ID3v1", b"", audio(), id3v1()),
+        ("ID3v2.3 and ID3v1", id3v2(3), audio(), id3v1()),
+        ("APEv2 with header", b"", audio(), apev2(True)),
+        ("APEv2 without header", b"", audio(), apev2(False)),
+        ("APEv2 with header and ID3v1", id3v2(3), audio(), apev2(True) + id3v1()),
+        ("APEv2 without header and ID3v1", id3v2(3), audio(), apev2(False) + id3v1()),
+        #The "TAG" in the footer's "APETAGEX" is 128 bytes from the end, where an ID3v1 tag would start
+        ("APEv2 footer 131 bytes from the end", b"", audio() + apev2(False) + audio(99, 3), b""),
+        ("TAG inside the last 128 bytes of audio", b"", tag_in_audio, b""),
+        ("TAG inside the last 131 bytes of audio", b"", tag_near_end, b""),
+        ("TAG inside audio with ID3v1", b"", tag_in_audio, id3v1()),
+        ("ID3v2 tag larger than the file", id3v2(3, size=10000), None, audio(100)),
+    ]
+
+
+def _audio_hashes(file_path):
+    results = []
+    for hash_fn in (lambda: stream_hashes(file_path, full_hash=False)[1], lambda: reference_audio_hash(file_path)):
+        try:
+            results.append(hash_fn())
+        except ValueError as e:                 #Both fail if the ID3v2 tag's size exceeds the file's size
+            results.append(type(e).__name__)
+    return results
+
+
+def check():
+    """
+    :return list: (name, description of the failure) for each case that failed
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="audio_region_check_")
+    failures = []
+    try:
+        for i, (name, before, audio_data, after) in enumerate(cases()):
+            file_path = os.path.join(tmp_dir, "{}.mp3".format(i))
+            with open(file_path, "wb") as f:
+                f.write(before + (audio_data or b"") + after)
+            current, reference = _audio_hashes(file_path)
+            if current != reference:
+                failures.append((name, "stream_hashes={}, reference={}".format(current, reference)))
+            if audio_data is not None:
+                with MappedFile(file_path) as mapped:
+                    start, end = locate_audio(mapped).audio_range
+                expected = (len(before), len(before) + len(audio_data))
+                if (start, end) != expected:
+                    failures.append((name, "audio_range={}, expected={}".format((start, end), expected)))
+    finally:
+        shutil.rmtree(tmp_dir)
+    return failures
+
+
+def main():
+    failures = check()
+    for name, failure in failures:
+        print("Mismatch for {}: {}".format(name, failure), file=sys.stderr)
+    print("Checked {} cases: {} mismatches".format(len(cases()), len(failures)))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,18 @@ import re
 import codecs
 import time
 import sys
+from fnmatch import fnmatch
 from contextlib import contextmanager
 from collections import OrderedDict, Callable
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 open = codecs.open
 str = unicode
 
@@ -49,25 +58,90 @@ def ignore_exceptions_except(*exception_classes):
             raise e
 
 
-def getPaths(path):
+def list_dir(path, sort=True):
+    """
+    Lists the given directory, using the file type reported by scandir when it is available so that entries do not
+    need to be stat'ed separately.  Symlinks are followed, as with os.path.isdir.
+
+    :param str path: A directory
+    :param bool sort: Sort entries by name
+    :return list: (name, is_dir) 2-tuples
+    """
+    if scandir is not None:
+        entries = []
+        for entry in scandir(path):
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entries.append((unicode(entry.name), is_dir))
+    else:
+        entries = [(name, os.path.isdir(os.path.join(path, name))) for name in map(unicode, os.listdir(path))]
+    if sort:
+        entries.sort()
+    return entries
+
+
+def iter_files(path, exts=None, exclude=None, sort=True):
     """
-    Recursively generates a list of absolute paths for every file discoverable
-    via the given path.
+    Lazily walks the given path, yielding files as they are found rather than after the whole tree has been listed.
+    Directories are walked depth-first with an explicit stack, so deep trees do not hit the recursion limit.
+
+    :param str path: A directory or file
+    :param exts: An extension or collection of extensions (without the leading ".", case-insensitive) of files to
+      yield, or None to yield all files
+    :param exclude: A glob or collection of globs; files and directories whose name or full path matches any of them
+      are skipped
+    :param bool sort: Sort the entries in each directory by name
+    :return: Generator that yields absolute paths
     """
     path = unicode(path[:-1] if (path[-1:] == os.sep) else path)
-    paths = []
-    if os.path.isdir(path):
-        for sub in map(unicode, os.listdir(path)):
-            paths.extend(getPaths(os.path.join(path, sub)))
-    elif os.path.isfile(path):
-        paths.append(path)
-    return paths
+    if isinstance(exts, (str, bytes)):
+        exts = [exts]
+    suffixes = tuple("." + ext.lower().lstrip(".") for ext in exts) if exts else None
+    if isinstance(exclude, (str, bytes)):
+        exclude = [exclude]
+    exclude = list(exclude) if exclude else []
+
+    def _include(name, full_path):
+        return not any(fnmatch(name, pat) or fnmatch(full_path, pat) for pat in exclude)
+
+    def _wanted(name):
+        return (suffixes is None) or name.lower().endswith(suffixes)
+
+    if not os.path.isdir(path):
+        if os.path.isfile(path) and _wanted(os.path.basename(path)) and _include(os.path.basename(path), path):
+            yield path
+        return
+
+    stack = [(path, iter(list_dir(path, sort)))]
+    while stack:
+        dir_path, entries = stack[-1]
+        for name, is_dir in entries:
+            full_path = os.path.join(dir_path, name)
+            if not _include(name, full_path):
+                continue
+            elif is_dir:
+                try:
+                    stack.append((full_path, iter(list_dir(full_path, sort))))
+                except OSError:
+                    continue
+                break                                   #Resumes this directory once the subdirectory is exhausted
+            elif _wanted(name):
+                yield full_path
+        else:
+            stack.pop()
+
+
+def getPaths(path):
+    """
+    Generates a list of absolute paths for every file discoverable via the given path.
+    """
+    return list(iter_files(path, sort=False))
 
 
 def getFilteredPaths(path, ext, sort=True):
-    fileFilter = re.compile(r'.*\.' + ext, re.IGNORECASE)
-    filtered = [fname for fname in getPaths(path) if fileFilter.match(fname)]
-    return sorted(filtered) if sort else filtered
+    return list(iter_files(path, ext, sort=sort))
 
 
 def getUnusedPath(rpath, fname, ext=None):
@@ -0,0 +1,53 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+from sqlalchemy import select, and_
+
+from audio_cache import AudioHashCache
+
+"""
+Chromaprint fingerprints are keyed by the hash of the audio content (i.e., excluding tags), so files with identical
+audio are only ever fingerprinted once, and results survive rescans / interrupted runs.
+"""
+
+fingerprint_columns = [("audio_sha256", "TEXT"), ("duration", "FLOAT"), ("fingerprint", "TEXT"), ("error", "TEXT")]
+
+
+class FingerprintCache(AudioHashCache):
+    def __init__(self, db, music_table):
+        AudioHashCache.__init__(self, db, music_table, "fingerprints", fingerprint_columns)
+
+    def fingerprinted(self):
+        """
+        :return: Generator that yields (audio_sha256, fingerprint) for each successfully fingerprinted audio hash
+        """
+        query = select([self.tbl.c.audio_sha256, self.tbl.c.fingerprint]).where(self.tbl.c.fingerprint.isnot(None))
+        for audio_hash, fingerprint in self.db.engine.execute(query):
+            yield audio_hash, fingerprint
+
+    def store(self, results):
+        """
+        :param list results: (audio_sha256, (duration, fingerprint), error) 3-tuples, where the values are None if there
+          was an error
+        """
+        self.table.upsert_many(self._rows(results, "duration", "fingerprint"))
+        self.fill_music([audio_hash for audio_hash, values, error in results if error is None])
+
+    def fill_music(self, audio_hashes=None):
+        """
+        Copies cached fingerprints into the duration / fingerprint columns of the music table.
+
+        :param list audio_hashes: Only update files with these audio hashes (default: all files that are missing one)
+        """
+        music = self.music.table
+        cached = lambda col: select([col]).where(self.tbl.c.audio_sha256 == music.c.audio_sha256).as_scalar()
+        fingerprinted = select([self.tbl.c.audio_sha256]).where(self.tbl.c.fingerprint.isnot(None))
+        stmt = music.update().values(duration=cached(self.tbl.c.duration), fingerprint=cached(self.tbl.c.fingerprint))
+        if audio_hashes is None:
+            stmt = stmt.where(and_(music.c.fingerprint.is_(None), music.c.audio_sha256.in_(fingerprinted)))
+            self.db.engine.execute(stmt)
+        else:
+            with self.db.engine.begin() as conn:
+                for i in range(0, len(audio_hashes), 500):
+                    conn.execute(stmt.where(music.c.audio_sha256.in_(audio_hashes[i:i + 500])))
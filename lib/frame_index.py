@@ -0,0 +1,125 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import sys
+from array import array
+
+from sqlalchemy import select, and_, bindparam
+
+from audio_cache import AudioHashCache
+from audio_frames import find_audio_frames
+from mapped_file import MappedFile
+from mp3_handling import MusicFile
+
+"""
+Exact durations and average bitrates, computed from an index of every MPEG frame in a file rather than estimated from
+the first frame and the file size (as mutagen does for files without a Xing / VBRI header), which is wrong for files
+with junk between frames or frames with mixed bitrates.  Like fingerprints, indexes are keyed by the audio hash, so
+each distinct audio stream is only indexed once.
+
+Frame offsets are stored relative to the start of the audio (i.e., the end of the ID3v2 tag), so files that only
+differ in their tags share an index.
+"""
+
+SKETCHY_FRACTION = 0.01         #Files with more than this fraction of their audio region outside of frames are sketchy
+
+frame_index_columns = [
+    ("audio_sha256", "TEXT"), ("frames", "INTEGER"), ("duration", "FLOAT"), ("bitrate", "INTEGER"),
+    ("sketchy", "FLOAT"), ("offsets", "BLOB"), ("error", "TEXT")
+]
+
+
+def build_frame_index(file_path):
+    """
+    :param str file_path: Path of an MP3 file
+    :return tuple: (array('I') of the offset of each audio frame relative to the start of the audio, duration in
+      seconds, average bitrate in bits per second, fraction of the audio region that is not in any frame); a leading
+      Xing / Info / VBRI frame is not counted as audio
+    """
+    with MappedFile(file_path) as mapped:
+        start, end, offsets, lengths, seconds, info_bytes = find_audio_frames(mapped)
+
+    index = array(b"I", (offsets - start).tolist())
+    duration = float(seconds.sum())
+    audio_bytes = int(lengths.sum())
+    bitrate = int(round(audio_bytes * 8 / duration)) if duration else 0
+    sketchy = (1 - (audio_bytes + info_bytes) / (end - start)) if end > start else 1.0
+    return index, duration, bitrate, sketchy
+
+
+def _index_bytes(index):
+    if sys.byteorder == "big":              #Stored as little-endian, so DBs can be moved between machines
+        index = array(index.typecode, index)
+        index.byteswap()
+    return index.tostring()
+
+
+def _index_array(blob):
+    index = array(b"I")
+    index.fromstring(bytes(blob))
+    if sys.byteorder == "big":
+        index.byteswap()
+    return index
+
+
+class FrameIndexCache(AudioHashCache):
+    def __init__(self, db, music_table):
+        AudioHashCache.__init__(self, db, music_table, "frame_index", frame_index_columns)
+
+    def store(self, results):
+        """
+        :param list results: (audio_sha256, (index, duration, bitrate, sketchy), error) 3-tuples (see
+          build_frame_index), where the values are None if there was an error
+        """
+        rows = []
+        for row in self._rows(results, "offsets", "duration", "bitrate", "sketchy"):
+            index = row["offsets"]
+            row["frames"] = len(index) if index is not None else None
+            if index is not None:
+                row["offsets"] = _index_bytes(index)
+            rows.append(row)
+        self.table.upsert_many(rows)
+        self.fill_music([audio_hash for audio_hash, values, error in results if error is None])
+
+    def offsets(self, audio_hash):
+        """
+        :param str audio_hash: An audio_sha256 value
+        :return array: array('I') of the offset of each audio frame relative to the start of the audio, or None if the
+          given audio has not been indexed
+        """
+        query = select([self.tbl.c.offsets]).where(self.tbl.c.audio_sha256 == audio_hash)
+        blob = self.db.engine.execute(query).scalar()
+        return _index_array(blob) if blob is not None else None
+
+    def fill_music(self, audio_hashes=None):
+        """
+        Copies indexed durations / bitrates into the length, time, bitrate, bitrate_kbps, and sketchy columns of the
+        music table, replacing the estimates from the scan.
+
+        :param list audio_hashes: Only update files with these audio hashes (default: all files whose length differs)
+        """
+        music, tbl = self.music.table, self.tbl
+        query = select([music.c.path, tbl.c.duration, tbl.c.bitrate, tbl.c.sketchy]).select_from(
+            music.join(tbl, music.c.audio_sha256 == tbl.c.audio_sha256)
+        ).where(and_(tbl.c.error.is_(None), tbl.c.frames > 0))
+        if audio_hashes is None:
+            queries = [query.where((music.c.length != tbl.c.duration) | music.c.length.is_(None))]
+        else:
+            queries = [query.where(music.c.audio_sha256.in_(audio_hashes[i:i + 500])) for i in range(0, len(audio_hashes), 500)]
+
+        stmt = music.update().where(music.c.path == bindparam("b_path")).values(
+            length=bindparam("b_length"), time=bindparam("b_time"), bitrate=bindparam("b_bitrate"),
+            bitrate_kbps=bindparam("b_bitrate_kbps"), sketchy=bindparam("b_sketchy")
+        )
+        with self.db.engine.begin() as conn:
+            for query in queries:
+                updates = [
+                    {
+                        "b_path": path, "b_length": duration, "b_time": MusicFile._ftime(duration), "b_bitrate": bitrate,
+                        "b_bitrate_kbps": bitrate // 1000, "b_sketchy": sketchy > SKETCHY_FRACTION
+                    }
+                    for path, duration, bitrate, sketchy in conn.execute(query)
+                ]
+                if updates:
+                    conn.execute(stmt, updates)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import mmap
+
+"""
+Read-only, file-like access to a memory-mapped file, so that parsers like mutagen and the hash functions can read files
+of any size without first copying them into memory.  The OS page cache does the buffering, so the memory used by the
+process does not grow with the size of the file.
+"""
+
+
+class MappedFile(object):
+    def __init__(self, file_path):
+        """
+        :param str file_path: Path of the file to map
+        """
+        self.name = file_path
+        self._file = open(file_path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        #Empty files can't be mapped, but they can still be read (as nothing)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._pos = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        self.closed = True
+
+    def _check_open(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def read(self, size=-1):
+        """
+        :param int size: Maximum number of bytes to read (default: all remaining bytes)
+        :return bytes: The bytes read from the current position
+        """
+        self._check_open()
+        end = self.size if (size is None) or (size < 0) else min(self._pos + size, self.size)
+        if end <= self._pos:
+            return b""
+        data = self._map[self._pos:end]
+        self._pos = end
+        return data
+
+    def seek(self, offset, whence=0):
+        self._check_open()
+        base = {0: 0, 1: self._pos, 2: self.size}[whence]
+        if base + offset < 0:
+            raise IOError(22, "Invalid argument")
+        self._pos = base + offset
+
+    def tell(self):
+        self._check_open()
+        return self._pos
+
+    def view(self, start=0, end=None):
+        """
+        :param int start: Offset of the first byte
+        :param int end: Offset after the last byte (default: the end of the file)
+        :return: A read-only buffer of the given range that refers to the mapped pages rather than copying them
+        """
+        self._check_open()
+        start = min(max(start, 0), self.size)
+        end = self.size if end is None else min(max(end, start), self.size)
+        if self._map is None:
+            return buffer(b"")
+        return buffer(self._map, start, end - start)
+
+    def find(self, sub, start=0, end=None):
+        """
+        :param bytes sub: Bytes to find
+        :param int start: Offset at which to start looking
+        :param int end: Offset at which to stop looking (default: the end of the file)
+        :return int: The lowest offset in [start, end) at which sub was found, or -1 if it was not found
+        """
+        self._check_open()
+        if self._map is None:
+            return -1
+        return self._map.find(sub, start, self.size if end is None else end)
+
+    def windows(self, window_size, start=0, end=None):
+        """
+        Maps the given range one window at a time, so only one window's pages count towards the process' resident size
+        no matter how much of the file is read; useful for reading through an entire file, e.g., to hash it.
+
+        :param int window_size: Number of bytes per window
+        :param int start: Offset of the first byte
+        :param int end: Offset after the last byte (default: the end of the file)
+        :return: Generator that yields (offset, buffer) for each window; each buffer is only valid until the next one is
+          yielded, since its window is unmapped at that point
+        """
+        self._check_open()
+        end = self.size if end is None else min(end, self.size)
+        granularity = mmap.ALLOCATIONGRANULARITY
+        for pos in range(start, end, window_size):
+            map_start = pos - pos % granularity             #Mappings must start at a multiple of the granularity
+            window_end = min(pos + window_size, end)
+            window = mmap.mmap(self._file.fileno(), window_end - map_start, access=mmap.ACCESS_READ, offset=map_start)
+            try:
+                yield pos, buffer(window, pos - map_start, window_end - pos)
+            finally:
+                window.close()
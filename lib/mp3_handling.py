@@ -5,10 +5,12 @@ from __future__ import print_function, division, unicode_literals
 
 import os
 import json
+import time
 import logging
 from io import BytesIO
 from hashlib import sha256
-from collections import defaultdict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
+from multiprocessing.pool import ThreadPool
 from unicodedata import normalize
 from operator import itemgetter
 
@@ -18,10 +20,14 @@ from mutagen.mp3 import MP3, BitrateMode
 from mutagen.id3 import ID3
 import acoustid
 from readchar import readchar
+from sqlalchemy import select
 
 from _constants import tag_name_map, compilation_indicators
 from log_handling import LogManager
 from alchemy_db import AlchemyDatabase, DBTable
+from mapped_file import MappedFile
+from audio_region import locate_audio
+from acoustid_lookup import AcoustidClient, cache_key
 
 # V1_Tags: {"TIT2":"Title", "TPE1":"Artist", "TALB":"Album", "TDRC":"Year", "COMM":"Comment", "TRCK":"Track", "TCON":"Genre"}
 
@@ -33,6 +39,8 @@ db_columns = ["path", "modified", "size", "sha256", "audio_sha256", "tags"] + in
 NoTagVal = (None,)
 primary_tags = {"TIT2": "Title", "TPE1": "Artist", "TALB": "Album", "TDRC": "Year", "TRCK": "Track"}
 default_replacement_db = "/var/tmp/music_deduper_tag_replacements.db"
+hash_chunk_size = 1024 * 1024
+partial_hash_size = 64 * 1024
 
 
 class TagReplacementDB:
@@ -59,8 +67,15 @@ class MusicFile:
     bitrate_modes = {getattr(BitrateMode, attr).real: attr for attr in dir(BitrateMode) if attr.isupper()}
     db_attr_keymap = {"v1_ver": "v1", "v2_ver": "v2", "audio_hash": "audio_sha256", "full_hash": "sha256", "size": "size", "modified": "modified"}
 
-    def __init__(self, file_path, dbrow=None):
+    def __init__(self, file_path, dbrow=None, mmap_content=True):
+        """
+        :param str file_path: Path of an MP3 file
+        :param dbrow: Row from the music table for this file, to use instead of reading / parsing the file
+        :param bool mmap_content: Read the file through a memory map, so that memory use does not depend on its size;
+          otherwise it is copied into memory
+        """
         self.file_path = file_path
+        self.mmap_content = mmap_content
         self.tags_modified = False
         self.v1_ver = None
         self.v2_ver = None
@@ -78,34 +93,40 @@ class MusicFile:
         else:
             RawInfo = namedtuple("RawInfo", self.info_copy_keys)
             self._raw_info = RawInfo(**{k: dbrow[k] for k in self.info_copy_keys})
-            self.__dict__.update({attr: dbrow[key] for attr, key in self.db_attr_keymap.iteritems()})
-            self.tag_dict = json.loads(dbrow["tags"])
+            #Hashes that were not stored (e.g., by a staged scan) are computed on demand
+            self.__dict__.update({attr: dbrow[key] for attr, key in self.db_attr_keymap.iteritems() if dbrow[key] is not None})
+            self._tags_json = dbrow["tags"]         #Only decoded if tag_dict is used
 
-    @cached_property
-    def content(self):
+    def _open_content(self):
+        """
+        :return: The file's content as a file-like object, which should be closed as soon as it has been parsed, so that
+          MusicFiles never hold open files / memory maps
+        """
+        if self.mmap_content:
+            return MappedFile(self.file_path)
         with open(self.file_path, "rb") as mfile:
             return BytesIO(mfile.read())
 
     @cached_property
     def mp3(self):
-        return MP3(self.content)
+        with self._open_content() as content:       #MP3 reads everything it needs while it is being constructed
+            return MP3(content)
 
     @cached_property
     def id3_versions(self):
         return tuple(self.tags.keys())
 
+    @cached_property
+    def _hashes(self):
+        return stream_hashes(self.file_path)
+
     @cached_property
     def audio_hash(self):
-        self.content.seek(0)
-        content = BytesIO(self.content.read())
-        ID3().delete(content)
-        content.seek(0)
-        return sha256(content.read()).hexdigest()
+        return self._hashes[1]
 
     @cached_property
     def full_hash(self):
-        self.content.seek(0)
-        return sha256(self.content.read()).hexdigest()
+        return self._hashes[0]
 
     @cached_property
     def true_file(self):
@@ -133,6 +154,7 @@ class MusicFile:
     def tags(self):
         if "tag_dict" in self.__dict__:
             del self.__dict__["tag_dict"]   #invalidate cached tag_dict
+        self.__dict__.pop("_tags_json", None)
 
         if self.mp3.tags is None:
             return {}
@@ -164,7 +186,8 @@ class MusicFile:
         return tags
 
     def _get_v1_tags(self):
-        return find_id3v1(self.content)
+        with self._open_content() as content:
+            return find_id3v1(content)
 
     @classmethod
     def tag_val(cls, frame):
@@ -184,6 +207,9 @@ class MusicFile:
 
         :return dict: mapping of id3_version:dict(frame_id:value(s))
         """
+        if "_tags_json" in self.__dict__:
+            return json.loads(self.__dict__.pop("_tags_json"))
+
         tag_dict = {}
         for ver, tags in self.tags.iteritems():
             tag_dict[ver] = {}
@@ -382,6 +408,52 @@ class MusicFile:
         return acoustid.fingerprint_file(self.file_path)
 
 
+def stream_hashes(file_path, chunk_size=None, full_hash=True, audio_hash=True):
+    """
+    Computes the full and audio SHA-256 digests of the given file in a single pass over memory-mapped windows of it, so
+    it is never copied into memory, and at most one window of it is resident at a time.  The audio digest covers
+    locate_audio's hash_range: the same bytes that would remain after ID3().delete().
+
+    :param str file_path: Path of an MP3 file
+    :param int chunk_size: Number of bytes to hash at a time
+    :param bool full_hash: Compute the full digest
+    :param bool audio_hash: Compute the audio digest
+    :return tuple: (full_sha256, audio_sha256) hex digests; None for digests that were not computed
+    """
+    chunk_size = chunk_size or hash_chunk_size
+    full, audio = sha256() if full_hash else None, sha256() if audio_hash else None
+    with MappedFile(file_path) as f:
+        audio_start, audio_end = locate_audio(f).hash_range
+        if audio_start > audio_end:
+            raise ValueError("ID3v2 tag size exceeds file size in {}".format(file_path))
+
+        #Mapped pages are hashed without being copied; both digests consume each window while it is mapped
+        for pos, window in f.windows(chunk_size):
+            if full is not None:
+                full.update(window)
+            a, b = max(audio_start, pos), min(audio_end, pos + len(window))
+            if (audio is not None) and (a < b):
+                audio.update(buffer(window, a - pos, b - a))
+    return tuple(digest.hexdigest() if digest is not None else None for digest in (full, audio))
+
+
+def partial_hash(file_path, edge_size=None):
+    """
+    Hashes only the start and end of the given file, where MP3s tend to differ (tags, encoder headers, padding), as a
+    cheap filter before comparing full hashes.  Only comparable between files of the same size.
+
+    :param str file_path: Path of a file
+    :param int edge_size: Number of bytes to read from each end of the file
+    :return str: SHA-256 hex digest of the first and last edge_size bytes (or the whole file, if it is smaller)
+    """
+    edge_size = edge_size or partial_hash_size
+    digest = sha256()
+    with MappedFile(file_path) as f:
+        digest.update(f.view(0, edge_size))
+        digest.update(f.view(max(f.size - edge_size, edge_size)))
+    return digest.hexdigest()
+
+
 def _normalize(val):
     if not val:
         return val
@@ -398,76 +470,225 @@ acoustid results -> .results[].recordings[].id = musicbrainz recording id
 
 class AcoustidDB:
     lookup_meta = "recordings releasegroups"
-
-    def __init__(self, db_path="/var/tmp/acoustid_info.db", apikey=None):
+    cache_columns = [("key", "TEXT"), ("status", "TEXT"), ("fetched", "INTEGER"), ("resp", "PickleType")]
+    #Many-to-many relationships between entities, as (table, (column, column))
+    link_tables = [
+        ("artist_album", ("artist_id", "album_id")), ("album_track", ("album_id", "track_id")),
+        ("track_artist", ("track_id", "artist_id")), ("album_types", ("album_id", "type")),
+    ]
+    #PickleType set columns that were used before the link tables existed, as (entity table, column, link table, pos)
+    #where pos is the position of the entity's ID in the link table's columns
+    legacy_sets = [
+        ("artists", "album_ids", "artist_album", 0), ("albums", "artist_ids", "artist_album", 1),
+        ("albums", "track_ids", "album_track", 0), ("albums", "types", "album_types", 0),
+        ("tracks", "artist_ids", "track_artist", 0), ("tracks", "album_ids", "album_track", 1),
+    ]
+
+    def __init__(self, db_path="/var/tmp/acoustid_info.db", apikey=None, base_url=None, rate=3, miss_ttl=30 * 86400):
+        """
+        :param str db_path: Path of the DB that caches responses and the entities in them
+        :param str apikey: AcoustID API key (default: read from ~/acoustid_apikey.txt)
+        :param str base_url: Base URL of the lookup service (default: AcoustID's); see AcoustidClient
+        :param float rate: Maximum number of lookup requests per second
+        :param int miss_ttl: Number of seconds for which lookups with no results are cached
+        """
         if apikey is None:
             keyfile_path = os.path.expanduser("~/acoustid_apikey.txt")
             try:
                 with open(keyfile_path, "r") as keyfile:
-                    apikey = keyfile.read()
-            except OSError as e:
+                    apikey = keyfile.read().strip()
+            except (IOError, OSError) as e:
                 raise AcoustidKeyfileException("An API key is required; unable to find or read {}".format(keyfile_path))
         self.apikey = apikey
+        self.client = AcoustidClient(apikey, base_url, rate, meta=self.lookup_meta)
+        self.miss_ttl = miss_ttl
 
         self.lm = LogManager.get_instance()
         self.db = AlchemyDatabase.get_db(db_path, logger=self.lm)
+        table_names = self.db.engine.table_names()
+        self.cache = DBTable(self.db, "acoustid_cache", self.cache_columns, "key")
         self.acoustids = DBTable(self.db, "acoustid_responses", [("id", "TEXT"), ("resp", "PickleType")], "id")
-        self.artists = DBTable(self.db, "artists", [("id", "TEXT"), ("name", "TEXT"), ("album_ids", "PickleType")], "id")
-        self.albums = DBTable(self.db, "albums", [("id", "TEXT"), ("title", "TEXT"), ("artist_ids", "PickleType"), ("types", "PickleType"), ("track_ids", "PickleType")], "id")
-        self.tracks = DBTable(self.db, "tracks", [("id", "TEXT"), ("title", "TEXT"), ("duration", "INTEGER"), ("artist_ids", "PickleType"), ("album_ids", "PickleType")], "id")
+        self.artists = DBTable(self.db, "artists", [("id", "TEXT"), ("name", "TEXT")], "id")
+        self.albums = DBTable(self.db, "albums", [("id", "TEXT"), ("title", "TEXT")], "id")
+        self.tracks = DBTable(self.db, "tracks", [("id", "TEXT"), ("title", "TEXT"), ("duration", "INTEGER")], "id")
+        self.links = OrderedDict()
+        for name, columns in self.link_tables:
+            self.links[name] = DBTable(self.db, name, [("id", "INTEGER")] + [(col, "TEXT") for col in columns], "id", indexes=[columns[1]])
+            self.links[name].add_index(columns, unique=True)
+
+        if "artist_album" not in table_names:
+            self._migrate_sets()
+        if "acoustid_cache" not in table_names:
+            self._migrate_responses()
+
+    def _migrate_sets(self):
+        """Copies the relationships stored in the entity tables' old PickleType set columns to the link tables"""
+        links = {name: set() for name, columns in self.link_tables}
+        for table_name, column, link_table, pos in self.legacy_sets:
+            table = self.db[table_name]
+            if column not in table.columns:
+                continue
+            for entity_id, values in table.column_values("id", column):
+                for value in (values or ()):
+                    links[link_table].add((entity_id, value) if pos == 0 else (value, entity_id))
+        with self.db.engine.begin() as conn:
+            self._write_links(links, conn)
+
+    def _migrate_responses(self):
+        """Copies responses cached under the old [duration, fingerprint] JSON keys to the hashed-key cache"""
+        self._store((cache_key(*json.loads(dbkey)), resp) for dbkey, resp in self.acoustids.column_values("id", "resp"))
+
+    @classmethod
+    def _cache_row(cls, key, resp, fetched):
+        return {"key": key, "status": "ok" if resp.get("results") else "miss", "fetched": fetched, "resp": resp}
 
-    def _fetch_lookup(self, duration, fingerprint, meta=None):
-        return acoustid.lookup(self.apikey, fingerprint, duration, meta or self.lookup_meta)
+    def _fetch_lookup(self, duration, fingerprint):
+        return self.client.lookup(duration, fingerprint)
+
+    def _cached(self, keys):
+        """
+        :param list keys: Cache keys
+        :return dict: Mapping of key:response for the given keys that are cached (and whose miss has not expired)
+        """
+        cached = {}
+        tbl = self.cache.table
+        expired = int(time.time()) - self.miss_ttl
+        for i in range(0, len(keys), 500):
+            query = tbl.select().where(tbl.c.key.in_(keys[i:i + 500]))
+            for row in self.db.engine.execute(query):
+                if (row["status"] == "ok") or (row["fetched"] > expired):
+                    cached[row["key"]] = row["resp"]
+        return cached
 
     def _lookup(self, duration, fingerprint):
-        dbkey = json.dumps([duration, fingerprint])
-        if dbkey in self.acoustids:
-            #logging.debug("Found in Acoustid DB: ({}, {})".format(duration, fingerprint))
-            return self.acoustids[dbkey]["resp"]
-        logging.debug("Not found in Acoustid DB - looking up: ({}, {})".format(duration, fingerprint))
+        key = cache_key(duration, fingerprint)
+        cached = self._cached([key])
+        if key in cached:
+            return cached[key]
+        logging.debug("Not found in Acoustid DB - looking up: ({}, {})".format(duration, key))
         resp = self._fetch_lookup(duration, fingerprint)
-        self.acoustids.insert([dbkey, resp])
-        self._process_resp(resp)
+        self._store([(key, resp)])
         return resp
 
-    def register(self, entity_type, entity_id, *args):
+    def lookup_many(self, items, workers=4, batch_size=50):
+        """
+        Looks up any number of fingerprints, only sending requests for the ones that are not cached.  Requests are made
+        by a pool of threads (subject to the client's rate limit), while responses are stored by the calling thread.
+
+        :param items: Iterable of (duration, fingerprint) 2-tuples
+        :param int workers: Number of concurrent requests
+        :param int batch_size: Number of responses to store at a time
+        :return dict: Mapping of cache_key(duration, fingerprint):response; failed lookups are logged and omitted
+        """
+        pending = OrderedDict()
+        for duration, fingerprint in items:
+            pending.setdefault(cache_key(duration, fingerprint), (duration, fingerprint))
+        responses = self._cached(list(pending))
+        to_fetch = [(key, duration, fingerprint) for key, (duration, fingerprint) in pending.iteritems() if key not in responses]
+        self.lm.verbose("Lookups: {:,d} cached; {:,d} to fetch".format(len(responses), len(to_fetch)))
+        if not to_fetch:
+            return responses
+
+        def _fetch(args):
+            key, duration, fingerprint = args
+            try:
+                return key, self._fetch_lookup(duration, fingerprint), None
+            except acoustid.WebServiceError as e:
+                return key, None, e
+
+        batch = []
+        pool = ThreadPool(max(workers, 1))
         try:
-            if entity_id not in self.db[entity_type]:
-                self.db[entity_type].insert([entity_id] + list(args))
-        except KeyError:
-            raise ValueError("Invalid entity table: {}".format(entity_type))
+            for key, resp, error in pool.imap_unordered(_fetch, to_fetch):
+                if error is not None:
+                    self.lm.error("Lookup failed for {}: {}".format(key, error))
+                    continue
+                responses[key] = resp
+                batch.append((key, resp))
+                if len(batch) >= batch_size:
+                    self._store(batch)
+                    batch = []
+        finally:
+            pool.terminate()
+            pool.join()
+            if batch:
+                self._store(batch)
+        return responses
+
+    def _store(self, responses):
+        """
+        Caches the given responses and registers the entities in them, all in 1 transaction
+
+        :param responses: Iterable of (cache key, response) 2-tuples
+        """
+        now = int(time.time())
+        responses = list(responses)
+        artists, albums, tracks = {}, {}, {}
+        links = {name: set() for name, columns in self.link_tables}
+        for key, resp in responses:
+            self._process_resp(resp, artists, albums, tracks, links)
+
+        with self.db.engine.begin() as conn:
+            self.cache.upsert_many((self._cache_row(key, resp, now) for key, resp in responses), conn=conn)
+            self.artists.upsert_many(({"id": aid, "name": name} for aid, name in artists.iteritems()), conn=conn)
+            self.albums.upsert_many(({"id": aid, "title": title} for aid, title in albums.iteritems()), conn=conn)
+            self.tracks.upsert_many(tracks.itervalues(), conn=conn)
+            self._write_links(links, conn)
+
+    def _write_links(self, links, conn):
+        """
+        :param dict links: Mapping of link table name:set of (id, id) 2-tuples to add to that table
+        :param conn: Connection with an open transaction
+        """
+        for name, columns in self.link_tables:
+            rows = (dict(zip(columns, pair)) for pair in links[name])
+            self.links[name].insert_many(rows, conflict="ignore", conn=conn)
 
-    def _process_resp(self, resp):
+    def _process_resp(self, resp, artists, albums, tracks, links):
+        """
+        Collects the entities in the given response
+
+        :param dict resp: A lookup response
+        :param dict artists: Mapping of artist ID:name to add to
+        :param dict albums: Mapping of album ID:title to add to
+        :param dict tracks: Mapping of track ID:track row to add to
+        :param dict links: Mapping of link table name:set of (id, id) 2-tuples to add to
+        """
         for result in resp["results"]:
             logging.debug("Processing result {}".format(result["id"]))
-            for recording in result["recordings"]:
+            for recording in result.get("recordings", []):
                 logging.debug("Processing recording {}".format(recording["id"]))
-                artist_ids = set()
-                for artist in recording["artists"]:
-                    logging.debug("Processing artist {}".format(artist["id"]))
-                    self.register("artists", artist["id"], artist["name"], set())
-                    artist_ids.add(artist["id"])
-                alb_ids = set()
-                for album in recording["releasegroups"]:
-                    logging.debug("Processing album {}".format(album["id"]))
-                    alb_artist_ids = set()
-                    for alb_artist in album.get("artists", {}):
-                        logging.debug("Processing album artist {}".format(alb_artist["id"]))
-                        self.register("artists", alb_artist["id"], alb_artist["name"], set())
-                        self.artists[alb_artist["id"]]["album_ids"].add(album["id"])
-                        alb_artist_ids.add(alb_artist["id"])
-
-                    album_types = set()
+                for artist in recording.get("artists", []):
+                    artists[artist["id"]] = artist["name"]
+                    links["track_artist"].add((recording["id"], artist["id"]))
+                for album in recording.get("releasegroups", []):
+                    for alb_artist in album.get("artists", []):
+                        artists[alb_artist["id"]] = alb_artist["name"]
+                    if "title" not in album:                #Untitled albums aren't registered, so nothing may link to them
+                        continue
+                    albums[album["id"]] = album["title"]
+                    links["album_track"].add((album["id"], recording["id"]))
+                    for alb_artist in album.get("artists", []):
+                        links["artist_album"].add((alb_artist["id"], album["id"]))
                     if "type" in album:
-                        album_types.add(album["type"])
-                    if "secondarytypes" in album:
-                        album_types.update(album["secondarytypes"])
-
-                    if "title" in album:
-                        self.register("albums", album["id"], album["title"], alb_artist_ids, album_types, set())
-                        self.albums[album["id"]]["track_ids"].add(recording["id"])
-                        alb_ids.add(album["id"])
-                self.register("tracks", recording["id"], recording["title"], recording["duration"], artist_ids, alb_ids)
+                        links["album_types"].add((album["id"], album["type"]))
+                    for album_type in album.get("secondarytypes", []):
+                        links["album_types"].add((album["id"], album_type))
+                tracks[recording["id"]] = {
+                    "id": recording["id"], "title": recording.get("title"), "duration": recording.get("duration")
+                }
+
+    def _linked(self, link_table, entity_id, pos=0):
+        """
+        :param str link_table: Name of a link table
+        :param str entity_id: ID of an entity
+        :param int pos: Position of the entity's column in the link table's columns
+        :return list: The values linked to the given entity
+        """
+        tbl = self.links[link_table].table
+        columns = dict(self.link_tables)[link_table]
+        query = select([tbl.c[columns[1 - pos]]]).where(tbl.c[columns[pos]] == entity_id).order_by(tbl.c.id)
+        return [row[0] for row in self.db.engine.execute(query)]
 
     def get_track(self, track_id):
         try:
@@ -475,8 +696,8 @@ class AcoustidDB:
         except KeyError:
             raise ValueError("Track ID not found: {}".format(track_id))
         resp = {k: track[k] for k in ("id", "title", "duration")}
-        resp["artists"] = {aid: self.get_artist_name(aid) for aid in track["artist_ids"]}
-        resp["albums"] = [self.get_album(aid) for aid in track["album_ids"]]
+        resp["artists"] = {aid: self.get_artist_name(aid) for aid in self._linked("track_artist", track_id)}
+        resp["albums"] = [self.get_album(aid) for aid in self._linked("album_track", track_id, 1)]
         return resp
 
     def get_album(self, album_id):
@@ -484,8 +705,9 @@ class AcoustidDB:
             album = self.albums[album_id]
         except KeyError:
             raise ValueError("Album ID not found: {}".format(album_id))
-        resp = {k: album[k] for k in ("id", "title", "type")}
-        resp["artists"] = {aid: self.get_artist_name(aid) for aid in album["artist_ids"]}
+        resp = {k: album[k] for k in ("id", "title")}
+        resp["types"] = sorted(self._linked("album_types", album_id))
+        resp["artists"] = {aid: self.get_artist_name(aid) for aid in self._linked("artist_album", album_id, 1)}
         return resp
 
     def get_artist_name(self, artist_id):
@@ -495,7 +717,16 @@ class AcoustidDB:
             raise ValueError("Artist ID not found: {}".format(artist_id))
 
     def lookup(self, duration, fingerprint):
-        results = self._lookup(duration, fingerprint)["results"]
+        return self.best_track(self._lookup(duration, fingerprint))
+
+    def best_track(self, resp):
+        """
+        :param dict resp: A lookup response
+        :return dict: The track info for the best result, or None if there were no results
+        """
+        results = resp["results"]
+        if not results:
+            return None
         best = max(results, key=itemgetter("score"))
 
         """
@@ -0,0 +1,148 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import json
+from collections import OrderedDict
+
+from sqlalchemy import select, and_, func as sql_func
+
+from alchemy_db import DBTable
+
+"""
+Normalized copy of the tags stored as JSON in the music table, with one row per (file, tag version, frame, value), so
+that tag reports can be answered by indexed queries instead of decoding the JSON for every file.
+"""
+
+tag_columns = [("id", "INTEGER"), ("path", "TEXT"), ("version", "TEXT"), ("frame_id", "TEXT"), ("value", "TEXT")]
+
+
+def tag_rows(file_path, tag_dict):
+    """
+    :param str file_path: Path of an MP3 file
+    :param dict tag_dict: MusicFile.tag_dict for that file
+    :return list: Rows for the music_tags table; frames that occur more than once get one row per frame, and the
+      strings in a COMM frame are joined with " / "
+    """
+    rows = []
+    for version, tags in tag_dict.iteritems():
+        for frame_id, value in tags.iteritems():
+            values = value if isinstance(value, list) else [value]
+            if (frame_id == "COMM") and not (values and isinstance(values[0], list)):
+                values = [values]                               #1 COMM frame: its value is the frame's list of strings
+            for val in values:
+                if isinstance(val, list):
+                    val = " / ".join(val)
+                rows.append({"path": file_path, "version": version, "frame_id": frame_id, "value": val})
+    return rows
+
+
+class MusicTags:
+    def __init__(self, db, music_table, batch_size=1000):
+        self.db = db
+        self.music = music_table
+        self.batch_size = batch_size
+        is_new = "music_tags" not in self.db.engine.table_names()
+        self.table = DBTable(db, "music_tags", tag_columns, "id", indexes=["path", "frame_id", "value"])
+        self.tbl = self.table.table
+        if is_new:
+            self.backfill()
+
+    def backfill(self):
+        """
+        Populates the table from the JSON tags of the files that were scanned before it existed.  This is the only
+        place that the JSON needs to be decoded.
+        """
+        rows = (
+            tag_row for path, tags in self.music.column_values("path", "tags") if tags
+            for tag_row in tag_rows(path, json.loads(tags))
+        )
+        count = self.table.insert_many(rows, self.batch_size)
+        if count:
+            self.db.logger.info("Populated music_tags with {:,d} rows".format(count))
+
+    def replace(self, rows_by_path, conn=None):
+        """
+        :param dict rows_by_path: Mapping of path:[tag rows] for files that were (re)scanned
+        :param conn: Connection with an open transaction to write in, so that the tags can be written in the same
+          transaction as their music rows (default: a new transaction)
+        """
+        if conn is None:
+            with self.db.engine.begin() as conn:
+                return self.replace(rows_by_path, conn)
+
+        paths = list(rows_by_path)
+        for i in range(0, len(paths), 500):
+            conn.execute(self.tbl.delete().where(self.tbl.c.path.in_(paths[i:i + 500])))
+        self.table.insert_many((row for rows in rows_by_path.itervalues() for row in rows), self.batch_size, conn=conn)
+
+    def rename(self, path, new_path):
+        self.db.engine.execute(self.tbl.update().where(self.tbl.c.path == path).values(path=new_path))
+
+    def _primary_tags(self, *where):
+        """
+        :return: Query for (path, frame_id, value) of the tags in each file's ID3v2 tag, or its ID3v1 tag if it has no
+          v2 tag, ordered by path
+        """
+        music = self.music.table
+        primary = sql_func.coalesce(music.c.v2, music.c.v1)
+        query = select([self.tbl.c.path, self.tbl.c.frame_id, self.tbl.c.value]).select_from(
+            self.tbl.join(music, and_(music.c.path == self.tbl.c.path, self.tbl.c.version == primary))
+        )
+        return query.where(and_(*where)) if where else query
+
+    def popularity(self):
+        """
+        :return tuple: (number of files, OrderedDict of frame_id:number of files whose primary tag contains it)
+        """
+        total = self.db.engine.execute(select([sql_func.count()]).select_from(self.music.table)).scalar()
+        primary = self._primary_tags().alias("primary_tags")
+        query = select([primary.c.frame_id, sql_func.count(sql_func.distinct(primary.c.path))])
+        query = query.group_by(primary.c.frame_id).order_by(primary.c.frame_id)
+        return total, OrderedDict((frame_id, count) for frame_id, count in self.db.engine.execute(query))
+
+    def files_with(self, frame_id):
+        """
+        :param str frame_id: A frame ID, e.g., TPE1
+        :return: Generator that yields (path, [(frame_id, value)]) for each file whose primary tag contains the given
+          frame, with all of the frames in that tag
+        """
+        matching = self._primary_tags(self.tbl.c.frame_id == frame_id).alias("matching")
+        query = self._primary_tags(self.tbl.c.path.in_(select([matching.c.path])))
+        return self._grouped(query.order_by(self.tbl.c.path, self.tbl.c.id))
+
+    def v2_values(self, frame_ids):
+        """
+        :param list frame_ids: Frame IDs to retrieve
+        :return: Generator that yields (path, [(frame_id, value)]) for each file whose ID3v2 tag contains any of them
+        """
+        music = self.music.table
+        query = select([self.tbl.c.path, self.tbl.c.frame_id, self.tbl.c.value]).select_from(
+            self.tbl.join(music, and_(music.c.path == self.tbl.c.path, self.tbl.c.version == music.c.v2))
+        ).where(self.tbl.c.frame_id.in_(frame_ids))
+        return self._grouped(query.order_by(self.tbl.c.path, self.tbl.c.id))
+
+    def values_for(self, paths):
+        """
+        :param paths: Paths of files
+        :return dict: Mapping of path:{version:{frame_id:[values]}}
+        """
+        values = {}
+        paths = list(paths)
+        for i in range(0, len(paths), 500):
+            query = select([self.tbl.c.path, self.tbl.c.version, self.tbl.c.frame_id, self.tbl.c.value])
+            query = query.where(self.tbl.c.path.in_(paths[i:i + 500])).order_by(self.tbl.c.id)
+            for path, version, frame_id, value in self.db.engine.execute(query):
+                values.setdefault(path, {}).setdefault(version, {}).setdefault(frame_id, []).append(value)
+        return values
+
+    def _grouped(self, query):
+        path, frames = None, []
+        for row_path, frame_id, value in self.db.engine.execute(query):
+            if row_path != path:
+                if frames:
+                    yield path, frames
+                path, frames = row_path, []
+            frames.append((frame_id, value))
+        if frames:
+            yield path, frames
@@ -0,0 +1,199 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import base64
+
+import numpy as np
+
+"""
+Near-duplicate detection based on chromaprint fingerprints, for finding re-encodes of the same recording that do not
+share an audio hash.
+
+Each fingerprint is a sequence of 32-bit sub-fingerprints.  Two fingerprints of the same recording differ in a fraction
+of their bits (the bit error rate), while unrelated ones differ in about half.  Rather than comparing every pair of
+files, every sub-fingerprint is split into overlapping bands of bits, and only files that share several identical
+(band, value) keys are compared in full.
+"""
+
+
+class FingerprintDecodeException(Exception):
+    pass
+
+
+def _unpack_ints(data, width):
+    """
+    :param data: numpy uint8 array
+    :param int width: Number of bits per value
+    :return: numpy int64 array of the width-bit values packed into data, least significant bit first
+    """
+    bits = np.unpackbits(data).reshape(-1, 8)[:, ::-1].ravel()
+    count = len(bits) // width
+    return bits[:count * width].reshape(count, width).astype(np.int64).dot(1 << np.arange(width, dtype=np.int64))
+
+
+def decode_fingerprint(fingerprint):
+    """
+    Decodes a fingerprint in chromaprint's compressed + base64 format (as returned by acoustid.fingerprint_file) without
+    needing libchromaprint.
+
+    :param str fingerprint: An encoded fingerprint
+    :return tuple: (algorithm, numpy uint32 array of sub-fingerprints)
+    """
+    if isinstance(fingerprint, unicode):
+        fingerprint = fingerprint.encode("ascii")
+    try:
+        data = np.frombuffer(base64.urlsafe_b64decode(fingerprint + b"=" * (-len(fingerprint) % 4)), dtype=np.uint8)
+    except TypeError as e:
+        raise FingerprintDecodeException("Invalid base64 data: {}".format(e))
+    if len(data) < 4:
+        raise FingerprintDecodeException("Fingerprint is too short")
+    algorithm = int(data[0])
+    num_values = (int(data[1]) << 16) | (int(data[2]) << 8) | int(data[3])
+    if num_values == 0:
+        return algorithm, np.zeros(0, dtype=np.uint32)
+
+    # Each sub-fingerprint (XORed with the previous one) is stored as the gaps between its set bits, ending with a 0;
+    # gaps >= 7 store 7 in the 3-bit section and the remainder in the 5-bit section that follows it.
+    bits = _unpack_ints(data[4:], 3)
+    ends = np.flatnonzero(bits == 0)
+    if len(ends) < num_values:
+        raise FingerprintDecodeException("Expected {} values; found {}".format(num_values, len(ends)))
+    bits = bits[:ends[num_values - 1] + 1]
+    exceptional = np.flatnonzero(bits == 7)
+    if len(exceptional):
+        extra = _unpack_ints(data[4 + (len(bits) * 3 + 7) // 8:], 5)
+        if len(extra) < len(exceptional):
+            raise FingerprintDecodeException("Fingerprint is truncated")
+        bits[exceptional] += extra[:len(exceptional)]
+
+    item = np.cumsum(bits == 0) - (bits == 0)                   #Index of the sub-fingerprint that each gap belongs to
+    total = np.cumsum(bits)
+    segment_start = np.r_[0, total[ends[:num_values - 1]]]
+    positions = total - segment_start[item]
+    set_bits = (bits != 0) & (positions <= 32)
+    values = np.zeros(num_values, dtype=np.uint64)
+    np.bitwise_or.at(values, item[set_bits], np.left_shift(np.uint64(1), (positions[set_bits] - 1).astype(np.uint64)))
+    return algorithm, np.bitwise_xor.accumulate(values).astype(np.uint32)
+
+
+def _popcount(values):
+    return int(np.unpackbits(values.view(np.uint8)).sum())
+
+
+def similarity(a, b, max_offset=8, min_overlap=20):
+    """
+    :param a: numpy uint32 array of sub-fingerprints
+    :param b: numpy uint32 array of sub-fingerprints
+    :param int max_offset: Maximum number of sub-fingerprints by which the two may be misaligned
+    :param int min_overlap: Minimum number of overlapping sub-fingerprints for an alignment to be considered
+    :return float: 1 - the lowest bit error rate between the two for any alignment (0 if they are too short)
+    """
+    best = 0.0
+    for offset in range(-max_offset, max_offset + 1):
+        x, y = (a[offset:], b) if offset >= 0 else (a, b[-offset:])
+        overlap = min(len(x), len(y))
+        if overlap < min_overlap:
+            continue
+        best = max(best, 1 - _popcount(np.bitwise_xor(x[:overlap], y[:overlap])) / (32 * overlap))
+    return best
+
+
+class NearDupeIndex(object):
+    def __init__(self, band_bits=28, bands=2, max_items=1000, max_bucket=50):
+        """
+        :param int band_bits: Number of bits in each band of a sub-fingerprint
+        :param int bands: Number of (evenly spaced, possibly overlapping) bands per sub-fingerprint
+        :param int max_items: Maximum number of sub-fingerprints from the start of each fingerprint to index
+        :param int max_bucket: Keys shared by more than this many fingerprints (e.g., silence) are ignored
+        """
+        if not 0 < band_bits <= 32:
+            raise ValueError("band_bits must be between 1 and 32")
+        self.band_bits = band_bits
+        self.shifts = [(32 - band_bits) * i // max(bands - 1, 1) for i in range(bands)]
+        self.max_items = max_items
+        self.max_bucket = max_bucket
+        self.keys = []
+        self.fingerprints = []
+        self._band_keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, fingerprint):
+        """
+        :param key: Identifier for the fingerprint (e.g., its audio hash)
+        :param fingerprint: numpy uint32 array of sub-fingerprints
+        """
+        items = fingerprint[:self.max_items].astype(np.int64)
+        mask = (1 << self.band_bits) - 1
+        band_keys = [(band << self.band_bits) | ((items >> shift) & mask) for band, shift in enumerate(self.shifts)]
+        self._band_keys.append(np.unique(np.concatenate(band_keys)) if band_keys else np.zeros(0, dtype=np.int64))
+        self.keys.append(key)
+        self.fingerprints.append(fingerprint)
+
+    def candidates(self, min_shared=3):
+        """
+        :param int min_shared: Minimum number of keys that two fingerprints need to share to be compared
+        :return: numpy array of (i, j) index pairs, with i < j
+        """
+        if len(self) < 2:
+            return np.zeros((0, 2), dtype=np.int64)
+        owners = np.repeat(np.arange(len(self), dtype=np.int64), [len(k) for k in self._band_keys])
+        combined = np.concatenate(self._band_keys) * len(self) + owners     #Sorting 1 array is faster than argsort
+        combined.sort()
+        keys, owners = np.divmod(combined, len(self))
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+
+        pair_codes = []
+        for size in np.unique(sizes[(sizes > 1) & (sizes <= self.max_bucket)]):
+            members = owners[starts[sizes == size][:, None] + np.arange(size)]
+            first, second = np.triu_indices(size, 1)
+            pair_codes.append((members[:, first] * len(self) + members[:, second]).ravel())
+        if not pair_codes:
+            return np.zeros((0, 2), dtype=np.int64)
+        codes, counts = np.unique(np.concatenate(pair_codes), return_counts=True)
+        codes = codes[counts >= min_shared]
+        return np.column_stack((codes // len(self), codes % len(self)))
+
+    def matches(self, min_similarity=0.8, min_shared=3, max_offset=8):
+        """
+        :return list: (similarity, key_a, key_b) for candidate pairs at least as similar as min_similarity, most similar
+          first
+        """
+        matches = []
+        for i, j in self.candidates(min_shared).tolist():
+            sim = similarity(self.fingerprints[i], self.fingerprints[j], max_offset)
+            if sim >= min_similarity:
+                matches.append((sim, self.keys[i], self.keys[j]))
+        matches.sort(key=lambda match: -match[0])
+        return matches
+
+
+def cluster(matches):
+    """
+    :param list matches: (similarity, key_a, key_b) 3-tuples
+    :return list: (best similarity, {key: best similarity to another member}) for each group of keys that are connected
+      by matches, most similar groups first
+    """
+    parents = {}
+
+    def find(key):
+        root = key
+        while parents.setdefault(root, root) != root:
+            root = parents[root]
+        while parents[key] != root:
+            parents[key], key = root, parents[key]
+        return root
+
+    best = {}
+    for sim, a, b in matches:
+        parents[find(a)] = find(b)
+        best[a] = max(best.get(a, 0), sim)
+        best[b] = max(best.get(b, 0), sim)
+
+    clusters = {}
+    for key, sim in best.iteritems():
+        clusters.setdefault(find(key), {})[key] = sim
+    return sorted(((max(members.itervalues()), members) for members in clusters.itervalues()), key=lambda c: -c[0])
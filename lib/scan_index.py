@@ -0,0 +1,178 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+import json
+
+from alchemy_db import DBTable
+from common import list_dir
+
+"""
+Persistent record of what the last scan saw, so that rescans can skip files (and directory listings) that have not
+changed since then without opening them or querying the music table for each one.
+"""
+
+file_columns = [("path", "TEXT"), ("dev", "INTEGER"), ("inode", "INTEGER"), ("size", "INTEGER"), ("mtime_ns", "INTEGER")]
+dir_columns = [("path", "TEXT"), ("mtime_ns", "INTEGER"), ("files", "TEXT"), ("dirs", "TEXT")]
+
+
+def _mtime_ns(stat):
+    try:
+        return stat.st_mtime_ns
+    except AttributeError:                          #Python 2's stat_result only has a float mtime
+        return int(stat.st_mtime * 1000000000)
+
+
+def file_signature(stat):
+    """
+    :param stat: os.stat result for a file
+    :return tuple: (dev, inode, size, mtime_ns)
+    """
+    return stat.st_dev, stat.st_ino, stat.st_size, _mtime_ns(stat)
+
+
+class ScanIndex:
+    def __init__(self, db):
+        self.db = db
+        self.file_table = DBTable(db, "scan_files", file_columns, "path")
+        self.dir_table = DBTable(db, "scan_dirs", dir_columns, "path")
+        self.files = {row[0]: tuple(row[1:]) for row in self.file_table.column_values(*[c[0] for c in file_columns])}
+        self.dirs = {
+            path: (mtime_ns, json.loads(files), json.loads(dirs))
+            for path, mtime_ns, files, dirs in self.dir_table.column_values(*[c[0] for c in dir_columns])
+        }
+        self.by_inode = {sig[:2]: path for path, sig in self.files.iteritems()}
+        self._stored_files = set(self.files)
+        self._stored_dirs = set(self.dirs)
+        self._changed_files = set()
+        self._changed_dirs = set()
+        self._removed_files = {}
+        self._removed_dirs = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.save()
+
+    def walk(self, root, ext):
+        """
+        Directories whose mtime has not changed since they were last listed are not listed again; the file / subdir
+        names recorded for them are used instead.  Every file is still stat'ed, since modifying a file in place does
+        not change its parent directory's mtime.
+
+        :param str root: Directory to walk
+        :param str ext: Extension of files to yield (without the leading ".")
+        :return: Generator that yields (path, signature) 2-tuples for files with the given extension
+        """
+        suffix = "." + ext.lower()
+        stack = [unicode(root[:-1] if (root[-1:] == os.sep) else root)]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime_ns = _mtime_ns(os.stat(dir_path))
+            except OSError:
+                continue
+
+            try:
+                known_mtime_ns, files, dirs = self.dirs[dir_path]
+            except KeyError:
+                known_mtime_ns = None
+            if known_mtime_ns != mtime_ns:
+                files, dirs = self._list_dir(dir_path)
+                self._forget_removed(dir_path, files, dirs)
+                self.dirs[dir_path] = (mtime_ns, files, dirs)
+                self._changed_dirs.add(dir_path)
+
+            stack.extend(os.path.join(dir_path, d) for d in reversed(dirs))
+            for name in files:
+                if name.lower().endswith(suffix):
+                    file_path = os.path.join(dir_path, name)
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    yield file_path, file_signature(stat)
+
+    @classmethod
+    def _list_dir(cls, dir_path):
+        files, dirs = [], []
+        for name, is_dir in list_dir(dir_path):
+            if is_dir:
+                dirs.append(name)
+            else:
+                files.append(name)
+        return files, dirs
+
+    def _forget_removed(self, dir_path, files, dirs):
+        if dir_path in self.dirs:
+            known_mtime_ns, known_files, known_dirs = self.dirs[dir_path]
+            for name in set(known_files).difference(files):
+                self.forget(os.path.join(dir_path, name))
+            for name in set(known_dirs).difference(dirs):
+                self._forget_tree(os.path.join(dir_path, name))
+
+    def _forget_tree(self, dir_path):
+        prefix = dir_path + os.sep
+        for path in [p for p in self.files if p.startswith(prefix)]:
+            self.forget(path)
+        for path in [p for p in self.dirs if (p == dir_path) or p.startswith(prefix)]:
+            del self.dirs[path]
+            self._changed_dirs.discard(path)
+            self._removed_dirs.add(path)
+
+    def is_unchanged(self, file_path, signature):
+        return self.files.get(file_path) == signature
+
+    def find_moved(self, file_path, signature):
+        """
+        :param str file_path: Path of a file that is not in the index
+        :param tuple signature: The file's current signature
+        :return str|None: The path that the file used to have, if it was renamed / moved, otherwise None
+        """
+        old_path = self.by_inode.get(signature[:2])
+        if (old_path is None) or (old_path == file_path):
+            return None
+        old_sig = self.files.get(old_path) or self._removed_files.get(old_path)
+        if (old_sig is None) or (old_sig[2:] != signature[2:]) or os.path.lexists(old_path):
+            return None
+        return old_path
+
+    def record(self, file_path, signature):
+        self.files[file_path] = signature
+        self.by_inode[signature[:2]] = file_path
+        self._changed_files.add(file_path)
+        self._removed_files.pop(file_path, None)
+
+    def forget(self, file_path):
+        """
+        Removes the given file from the index.  Its inode is remembered until the next save so that it can still be
+        matched by find_moved if the file turns up somewhere else during the same walk.
+        """
+        sig = self.files.pop(file_path, None)
+        if sig is not None:
+            self._changed_files.discard(file_path)
+            self._removed_files[file_path] = sig
+
+    def save(self):
+        self.file_table.bulk_delete(self._stored_files.intersection(self._removed_files))
+        self.file_table.upsert_many(
+            dict(zip(("path", "dev", "inode", "size", "mtime_ns"), (path,) + self.files[path])) for path in self._changed_files
+        )
+
+        self.dir_table.bulk_delete(self._stored_dirs.intersection(self._removed_dirs))
+        self.dir_table.upsert_many(
+            {"path": path, "mtime_ns": self.dirs[path][0], "files": json.dumps(self.dirs[path][1]), "dirs": json.dumps(self.dirs[path][2])}
+            for path in self._changed_dirs
+        )
+
+        self._stored_files.difference_update(self._removed_files)
+        self._stored_files.update(self._changed_files)
+        self._stored_dirs.difference_update(self._removed_dirs)
+        self._stored_dirs.update(self._changed_dirs)
+        for path in self._removed_files:
+            sig = self._removed_files[path]
+            if self.by_inode.get(sig[:2]) == path:
+                del self.by_inode[sig[:2]]
+        self._changed_files, self._changed_dirs, self._removed_files, self._removed_dirs = set(), set(), {}, set()
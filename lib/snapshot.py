@@ -0,0 +1,212 @@
+#!/usr/bin/env python2
+
+from __future__ import print_function, division, unicode_literals
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+"""
+Columnar, read-only copy of the music table for reports that need to look at every row.  Numeric columns are numpy
+arrays; string columns are stored as integer codes into an array of their distinct values, so equal strings (e.g.,
+duplicate hashes) share one object and can be grouped by comparing integers.
+"""
+
+numeric_columns = OrderedDict([
+    ("modified", np.int64), ("size", np.int64), ("bitrate", np.int32), ("bitrate_kbps", np.int32),
+    ("length", np.float64), ("sample_rate", np.int32), ("channels", np.int8), ("sketchy", np.bool_),
+])
+string_columns = ("path", "sha256", "audio_sha256", "bitrate_mode")
+
+
+def _factorize(values):
+    """
+    :param list values: Strings (or None)
+    :return tuple: (codes, uniques) such that uniques[codes[i]] == values[i]; None is given the code -1
+    """
+    index = {}
+    codes = np.fromiter(
+        (-1 if val is None else index.setdefault(val, len(index)) for val in values), np.int32, len(values)
+    )
+    uniques = np.empty(len(index), dtype=object)
+    for val, i in index.iteritems():
+        uniques[i] = val
+    return codes, uniques
+
+
+def _pack_strings(strings):
+    encoded = [s.encode("utf-8") for s in strings]
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), np.array([len(s) for s in encoded], dtype=np.int32)
+
+
+def _unpack_strings(blob, lengths):
+    data = blob.tobytes()
+    ends = np.cumsum(lengths)
+    strings = np.empty(len(lengths), dtype=object)
+    for i, (end, length) in enumerate(zip(ends.tolist(), lengths.tolist())):
+        strings[i] = data[end - length:end].decode("utf-8")
+    return strings
+
+
+def _db_stamp(db_path):
+    stat = os.stat(db_path)
+    return np.array([stat.st_mtime, stat.st_size], dtype=np.float64)
+
+
+class MusicSnapshot(object):
+    def __init__(self, numbers, codes, uniques):
+        """
+        :param dict numbers: Mapping of column name:numpy array for numeric_columns
+        :param dict codes: Mapping of column name:int32 array of codes for string_columns
+        :param dict uniques: Mapping of column name:object array of distinct values for string_columns
+        """
+        self.numbers = numbers
+        self.codes = codes
+        self.uniques = uniques
+
+    def __len__(self):
+        return len(self.codes["path"])
+
+    def __getitem__(self, column):
+        """
+        :param str column: Name of a column
+        :return: numpy array of that column's values (object array for string columns)
+        """
+        if column in self.numbers:
+            return self.numbers[column]
+        codes, uniques = self.codes[column], self.uniques[column]
+        values = np.empty(len(codes), dtype=object)
+        known = codes >= 0
+        values[known] = uniques[codes[known]]
+        return values
+
+    @classmethod
+    def from_table(cls, music_table):
+        columns = list(numeric_columns) + list(string_columns)
+        values = {column: [] for column in columns}
+        appenders = [values[column].append for column in columns]
+        for row in music_table.column_values(*columns):
+            for append, value in zip(appenders, row):
+                append(value)
+
+        numbers = {}
+        for column, dtype in numeric_columns.iteritems():
+            missing = np.nan if dtype is np.float64 else 0
+            numbers[column] = np.array([missing if v is None else v for v in values[column]], dtype=dtype)
+        codes, uniques = {}, {}
+        for column in string_columns:
+            codes[column], uniques[column] = _factorize(values[column])
+        return cls(numbers, codes, uniques)
+
+    @classmethod
+    def load(cls, music_table, refresh=False):
+        """
+        Loads the snapshot cached next to the DB if the DB has not been modified since it was saved; otherwise builds a
+        new one from the given table and caches it.
+
+        :param DBTable music_table: The music table
+        :param bool refresh: Ignore the cached snapshot
+        :return MusicSnapshot: Snapshot of the table
+        """
+        db_path = music_table.db.db_path
+        if db_path == ":memory:":
+            return cls.from_table(music_table)
+
+        cache_path = cls.cache_path(db_path)
+        stamp = _db_stamp(db_path)
+        if not refresh and os.path.exists(cache_path):
+            try:
+                snapshot, cached_stamp = cls._read(cache_path)
+            except Exception as e:
+                music_table.logger.debug("Ignoring unreadable snapshot {}: {}".format(cache_path, e))
+            else:
+                if np.array_equal(cached_stamp, stamp):
+                    return snapshot
+
+        snapshot = cls.from_table(music_table)
+        snapshot.save(cache_path, stamp)
+        return snapshot
+
+    @classmethod
+    def cache_path(cls, db_path):
+        return os.path.splitext(db_path)[0] + "_snapshot.npz"
+
+    @classmethod
+    def _read(cls, cache_path):
+        numbers, codes, uniques = {}, {}, {}
+        with np.load(cache_path) as cached:
+            for column in numeric_columns:
+                numbers[column] = cached[column]
+            for column in string_columns:
+                codes[column] = cached[column + "_codes"]
+                uniques[column] = _unpack_strings(cached[column + "_blob"], cached[column + "_lengths"])
+            stamp = cached["db_stamp"]
+        return cls(numbers, codes, uniques), stamp
+
+    def save(self, cache_path, stamp):
+        arrays = {str(column): values for column, values in self.numbers.iteritems()}
+        for column in string_columns:
+            arrays[str(column + "_codes")] = self.codes[column]
+            arrays[str(column + "_blob")], arrays[str(column + "_lengths")] = _pack_strings(self.uniques[column])
+        arrays[str("db_stamp")] = stamp
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.rename(tmp_path, cache_path)
+
+    def bitrate_distribution(self):
+        """
+        :return list: (bitrate_kbps, bitrate_mode, count) 3-tuples, sorted by bitrate then mode
+        """
+        mode_codes = self.codes["bitrate_mode"]
+        keys = self.numbers["bitrate_kbps"].astype(np.int64) * (len(self.uniques["bitrate_mode"]) + 1) + (mode_codes + 1)
+        unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        dist = []
+        for i, count in zip(first.tolist(), counts.tolist()):
+            code = mode_codes[i]
+            dist.append((int(self.numbers["bitrate_kbps"][i]), self.uniques["bitrate_mode"][code] if code >= 0 else None, count))
+        dist.sort(key=lambda entry: (entry[0], entry[1] or ""))
+        return dist
+
+    def sketchy(self):
+        """
+        :return: numpy array of the row positions of files whose audio may not be valid MPEG data
+        """
+        return np.flatnonzero(self.numbers["sketchy"])
+
+    def duplicate_groups(self, column):
+        """
+        :param str column: Name of a string column, e.g., sha256
+        :return: Generator that yields (value, numpy array of row positions) for each value shared by more than one row
+          (None is not considered to be a duplicate of itself), in order of value
+        """
+        codes = self.codes[column]
+        known = np.flatnonzero(codes >= 0)
+        counts = np.bincount(codes[known], minlength=len(self.uniques[column]))
+        dupe_rows = known[counts[codes[known]] > 1]
+        if not len(dupe_rows):
+            return
+        dupe_rows = dupe_rows[np.argsort(codes[dupe_rows], kind="mergesort")]
+        dupe_codes = codes[dupe_rows]
+        bounds = np.flatnonzero(np.diff(dupe_codes)) + 1
+        groups = sorted(zip(self.uniques[column][dupe_codes[np.r_[0, bounds]]], np.split(dupe_rows, bounds)))
+        for value, rows in groups:
+            yield value, rows
+
+    def unique(self, column, include_missing=False):
+        """
+        :param str column: Name of a string column, e.g., sha256
+        :param bool include_missing: Also include rows with no value (e.g., files without a full hash after a staged
+          scan), after the others, in order of path
+        :return: numpy array of the row positions of files whose value is not shared by any other row, in order of value
+        """
+        codes = self.codes[column]
+        known = np.flatnonzero(codes >= 0)
+        counts = np.bincount(codes[known], minlength=len(self.uniques[column]))
+        rows = known[counts[codes[known]] == 1]
+        rows = rows[np.argsort(self.uniques[column][codes[rows]], kind="mergesort")]
+        if include_missing:
+            missing = np.flatnonzero(codes < 0)
+            rows = np.r_[rows, missing[np.argsort(self["path"][missing], kind="mergesort")]]
+        return rows
@@ -0,0 +1,180 @@
+'''
+MPEG audio frame tables, and the numpy frame sync search and frame walk that
+both eyeD3b.mp3 and eyed3_79.mp3.headers use. It depends on neither package
+(eyeD3b is Python 2 only, and eyed3_79 needs eyed3 to be installed), so that
+each of them can import it.
+'''
+from bisect import bisect_right
+import struct
+
+import numpy
+
+#                   MPEG1  MPEG2  MPEG2.5
+SAMPLE_FREQ_TABLE = ((44100, 22050, 11025),
+                     (48000, 24000, 12000),
+                     (32000, 16000, 8000),
+                     (None,  None,  None))
+
+#              V1/L1  V1/L2 V1/L3 V2/L1 V2/L2&L3
+BIT_RATE_TABLE = ((0,    0,    0,    0,    0),
+                  (32,   32,   32,   32,   8),
+                  (64,   48,   40,   48,   16),
+                  (96,   56,   48,   56,   24),
+                  (128,  64,   56,   64,   32),
+                  (160,  80,   64,   80,   40),
+                  (192,  96,   80,   96,   48),
+                  (224,  112,  96,   112,  56),
+                  (256,  128,  112,  128,  64),
+                  (288,  160,  128,  144,  80),
+                  (320,  192,  160,  160,  96),
+                  (352,  224,  192,  176,  112),
+                  (384,  256,  224,  192,  128),
+                  (416,  320,  256,  224,  144),
+                  (448,  384,  320,  256,  160),
+                  (None, None, None, None, None))
+
+# MPEG 2 and 2.5 layer III frames hold half as many samples
+#                                  L1   L2   L3
+SAMPLES_PER_FRAME_TABLE = ((None, 384, 1152, 1152),  # MPEG 1
+                           (None, 384, 1152, 576),   # MPEG 2
+                           (None, 384, 1152, 576))   # MPEG 2.5
+
+
+def _frame_tables():
+    '''Build the frame length and play time of every combination of the
+    version, layer, bit rate, sample rate and padding bits of a frame header,
+    indexed by the 11 bits that hold them (bits 20-17 and 15-9, i.e., skipping
+    the protection bit). Invalid combinations have a length of 0.'''
+    lengths = numpy.zeros(1 << 11, dtype=numpy.int32)
+    seconds = numpy.zeros(1 << 11, dtype=numpy.float64)
+    for key in range(1 << 11):
+        version_bits, layer_bits = (key >> 9) & 0x3, (key >> 7) & 0x3
+        bit_rate_row, sample_bits = (key >> 3) & 0xf, (key >> 1) & 0x3
+        if (version_bits == 1 or layer_bits == 0 or bit_rate_row in (0, 0xf) or
+                sample_bits == 0x3):
+            continue
+        version_key = {3: 0, 2: 1, 0: 2}[version_bits]
+        layer = 4 - layer_bits
+        if version_key == 0:
+            bit_rate_col = layer - 1
+        else:
+            bit_rate_col = 3 if layer == 1 else 4
+        br = BIT_RATE_TABLE[bit_rate_row][bit_rate_col] * 1000
+        sf = SAMPLE_FREQ_TABLE[sample_bits][version_key]
+        samples = SAMPLES_PER_FRAME_TABLE[version_key][layer]
+        # Layer 1 uses 32 bit slots, layers 2 and 3 use 8 bit slots
+        slot = 4 if layer == 1 else 1
+        lengths[key] = ((samples // 8 // slot) * br // sf + (key & 0x1)) * slot
+        seconds[key] = float(samples) / sf
+    return lengths, seconds
+
+FRAME_LENGTHS, FRAME_SECONDS = _frame_tables()
+FRAME_LENGTHS_LIST = FRAME_LENGTHS.tolist()
+MAX_FRAME_LENGTH = int(FRAME_LENGTHS.max())
+
+
+def find_syncs(data):
+    '''Locate every valid mp3 frame header in ``data`` at once. Returned is a
+    2-tuple of numpy arrays: the offsets of the headers in ``data``, and their
+    indexes into ``FRAME_LENGTHS``.'''
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    if len(buf) < 4:
+        return (numpy.empty(0, dtype=numpy.intp),
+                numpy.empty(0, dtype=numpy.intp))
+
+    # Candidates have the 11 sync bits set; the version, layer, bitrate,
+    # sample rate and padding bits that follow them select a frame length,
+    # which is 0 for the reserved / free / bad combinations.
+    offsets = numpy.flatnonzero((buf[:-3] == 0xff) & (buf[1:-2] >= 0xe0))
+    keys = ((buf[offsets + 1] & 0x1e).astype(numpy.intp) << 6) | \
+           (buf[offsets + 2] >> 1)
+    valid = FRAME_LENGTHS[keys] > 0
+    return offsets[valid], keys[valid]
+
+
+def find_header(fp, start_pos=0):
+    '''Locate the first mp3 header in file stream ``fp`` starting at offset
+    ``start_pos`` (defaults to 0). Returned is a 3-tuple containing the offset
+    where the header was found, the header as an integer, and the header as 4
+    bytes. If no header is found all 3 values are None.'''
+    CHUNK_SIZE = 65536
+
+    chunk_pos = start_pos
+    while True:
+        fp.seek(chunk_pos)
+        # The 3 extra bytes complete any header that starts at the end of the
+        # chunk; the next chunk starts right after it.
+        data = fp.read(CHUNK_SIZE + 3)
+        offsets, keys = find_syncs(data)
+        if len(offsets):
+            sync_pos = int(offsets[0])
+            header_bytes = data[sync_pos:sync_pos + 4]
+            return (chunk_pos + sync_pos,
+                    struct.unpack(">I", header_bytes)[0], header_bytes)
+        if len(data) < CHUNK_SIZE + 3:
+            return (None, None, None)
+        chunk_pos += CHUNK_SIZE
+
+
+def find_frames(fp, start_pos=0, end_pos=None):
+    '''Locate every mp3 frame in file stream ``fp`` between offsets
+    ``start_pos`` and ``end_pos`` (defaults to the end of the file) in 1 pass,
+    by following the frame lengths from the first header that is followed by
+    another. If sync is lost (e.g., junk between frames) it is regained at the
+    next header that is followed by another, and a truncated final frame is
+    not counted. Returned is a 3-tuple of numpy arrays containing the offset,
+    length, and play time in seconds of each frame.
+
+    Frame lengths take into account that MPEG 2 and 2.5 layer III frames hold
+    half as many samples.
+    '''
+    CHUNK_SIZE = 1 << 20
+
+    if end_pos is None:
+        fp.seek(0, 2)
+        end_pos = fp.tell()
+
+    frames, keys = [], []
+    pos, synced = start_pos, False
+    chunk_pos = start_pos
+    while chunk_pos < end_pos:
+        fp.seek(chunk_pos)
+        # Read enough past the chunk to check the frame after any frame that
+        # starts in it
+        data = fp.read(min(CHUNK_SIZE + MAX_FRAME_LENGTH + 4,
+                           end_pos - chunk_pos))
+        if not data:
+            break
+        chunk_end = min(chunk_pos + CHUNK_SIZE, end_pos)
+        offsets, chunk_keys = find_syncs(data)
+        offsets = (offsets + chunk_pos).tolist()
+        found = dict(zip(offsets, chunk_keys.tolist()))
+
+        while pos < chunk_end:
+            key = found.get(pos)
+            length = FRAME_LENGTHS_LIST[key] if key is not None else 0
+            if length and synced:
+                if pos + length > end_pos:
+                    # Truncated final frame
+                    pos = end_pos
+                    break
+            elif length and (pos + length == end_pos or
+                             pos + length in found):
+                synced = True
+            else:
+                # Resync at the next header that is followed by another
+                synced = False
+                idx = bisect_right(offsets, pos)
+                if idx == len(offsets):
+                    pos = chunk_end
+                    break
+                pos = offsets[idx]
+                continue
+            frames.append(pos)
+            keys.append(key)
+            pos += length
+        chunk_pos = max(chunk_end, pos)
+
+    keys = numpy.array(keys, dtype=numpy.intp)
+    return (numpy.array(frames, dtype=numpy.int64), FRAME_LENGTHS[keys],
+            FRAME_SECONDS[keys])
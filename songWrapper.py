@@ -10,6 +10,7 @@ from __future__ import division, unicode_literals
 #from django.utils import text as dtext
 import re
 import eyed3_79 as eyed3
+from eyed3_79.mp3 import loadAllTags, loadAudioInfo
 from lib.common import *
 from lib._constants import *
 
@@ -68,8 +69,14 @@ class SongTag():
 
 class Song():
     gpat = re.compile(r'\D*(\d+).*')
-    def __init__(self, fpath):
+    placementTags = ("TCMP", "PCST", "TPE1", "TPE2", "TALB", "TIT2", "TRCK")   #Tags used to decide where a song belongs
+
+    def __init__(self, fpath, frameIds=None, lazyInfo=False):
         self.fpath = fpath
+        self.frameIds = frameIds                                                #Only these frames are read (default: all)
+        self.lazyInfo = lazyInfo                                                #Only read the audio info if it's needed
+        self._loaded = None                                                     #(v1 tag, v2 tag, audio info), read once
+        self._infoChecked = False
         self._isBadFile = False
         self.newPath = None
         self.better = None
@@ -89,72 +96,111 @@ class Song():
         self.newPath = newPath
     
     def getBitrate(self):
+        self._checkInfo()
         return self.bitrate
     
     def isBad(self):
+        self._checkInfo()
         return self._isBadFile
     
+    def _load(self):
+        """
+        Reads both tags and the audio info with a single open of the file, and returns the same objects until one of the
+        tags is saved.  When only some frames are wanted, the others are never decoded.
+        :return tuple: (v1 tag, v2 tag, audio info), each of which may be None; the audio info is None if lazyInfo is set
+        """
+        if self._loaded is None:
+            self._loaded = loadAllTags(self.fpath, lazy_frames=(self.frameIds is not None), audio_info=(not self.lazyInfo))
+            self._infoChecked = False
+        return self._loaded
+    
+    def _checkInfo(self):
+        """
+        Sets the bitrate from the audio info (which is read now if lazyInfo is set), or marks the file as bad if it has
+        tags but no audio info.  Only done once per load of the tags.
+        :return bool: False if the file is bad
+        """
+        if not (self._infoChecked or self._isBadFile):
+            v1tag, v2tag, info = self._load()
+            self._infoChecked = True
+            if (v1tag is not None) or (v2tag is not None):
+                if self.lazyInfo:
+                    info = loadAudioInfo(self.fpath, v2tag or v1tag)
+                if info is not None:
+                    self.bitrate = info.mp3_header.bit_rate
+                else:
+                    clio.println("No Audio info for: " + self.fpath)
+                    self._isBadFile = True
+        return not self._isBadFile
+    
+    def _saveTag(self, tag, version=None):
+        tag.save(version=version)
+        self._loaded = None                                                     #Re-read what was actually written next time
+    
+    def _getTag(self, version):
+        v1tag, v2tag, info = self._load()
+        return v2tag if (version == 2) else v1tag
+    
     def updateTags(self):
         self.tags = []
         self.tagsById = {}
         self.versions = {}
         try:
-            self._addTagsFromAudioFile(eyed3.load(self.fpath, (1,None,None)))
-            self._addTagsFromAudioFile(eyed3.load(self.fpath, (2,None,None)))
+            v1tag, v2tag, info = self._load()
+            if self.lazyInfo or self._checkInfo():
+                self._addTagsFromTag(v1tag)
+                self._addTagsFromTag(v2tag)
         except (ValueError, SongException) as e:
             self._isBadFile = True
     
     def trimTags(self):
         changed = {}
-        changed1 = self._trimTags(eyed3.load(self.fpath, (1,None,None)))
+        changed1 = self._trimTags(self._getTag(1))
         if changed1 is not None:
             changed.update(changed1)
-        changed2 = self._trimTags(eyed3.load(self.fpath, (2,None,None)))
+        changed2 = self._trimTags(self._getTag(2))
         if changed2 is not None:
             changed.update(changed2)
         return changed
     
-    def _trimTags(self, af):
-        if af.tag is None: return None
-        fs = af.tag.frame_set
-        ver = af.tag.version
+    def _trimTags(self, tag):
+        if tag is None: return None
+        fs = tag.frame_set
+        ver = tag.version
         tver = "[" + str(ver[0] + (ver[1]/10)) + "]"
         
-        s_artist = af.tag.artist.strip() if (af.tag.artist is not None) else None
-        s_aartist = af.tag.album_artist.strip() if (af.tag.album_artist is not None) else None
-        s_title = af.tag.title.strip() if (af.tag.title is not None) else None
-        s_album = af.tag.album.strip() if (af.tag.album is not None) else None
+        s_artist = tag.artist.strip() if (tag.artist is not None) else None
+        s_aartist = tag.album_artist.strip() if (tag.album_artist is not None) else None
+        s_title = tag.title.strip() if (tag.title is not None) else None
+        s_album = tag.album.strip() if (tag.album is not None) else None
         
         changed = {}
-        if af.tag.artist != s_artist:
-            changed[tver + "Artist"] = "'{}' -> '{}'".format(af.tag.artist, s_artist)
-            af.tag.artist = s_artist
-        if af.tag.album_artist != s_aartist:
-            changed[tver + "Album Artist"] = "'{}' -> '{}'".format(af.tag.album_artist, s_aartist)
-            af.tag.album_artist = s_aartist
-        if af.tag.title != s_title:
-            changed[tver + "Title"] = "'{}' -> '{}'".format(af.tag.title, s_title)
-            af.tag.title = s_title
-        if af.tag.album != s_album:
-            changed[tver + "Album"] = "'{}' -> '{}'".format(af.tag.album, s_album)
-            af.tag.album = s_album
+        if tag.artist != s_artist:
+            changed[tver + "Artist"] = "'{}' -> '{}'".format(tag.artist, s_artist)
+            tag.artist = s_artist
+        if tag.album_artist != s_aartist:
+            changed[tver + "Album Artist"] = "'{}' -> '{}'".format(tag.album_artist, s_aartist)
+            tag.album_artist = s_aartist
+        if tag.title != s_title:
+            changed[tver + "Title"] = "'{}' -> '{}'".format(tag.title, s_title)
+            tag.title = s_title
+        if tag.album != s_album:
+            changed[tver + "Album"] = "'{}' -> '{}'".format(tag.album, s_album)
+            tag.album = s_album
         
         if len(changed) > 0:
-            af.tag.save()
+            self._saveTag(tag)
         return changed
     
-    def _addTagsFromAudioFile(self, af):
-        if af is None: return
-        if af.tag is None: return
-        if af.info is not None:
-            self.bitrate = af.info.mp3_header.bit_rate
-        else:
-            clio.println("No Audio info for: " + self.fpath)
-            raise SongException("No Audio Info")
-        fs = af.tag.frame_set
-        ver = af.tag.version
+    def _addTagsFromTag(self, tag):
+        if tag is None: return
+        fs = tag.frame_set
+        fs.decodeFrames(self.frameIds)                                          #Decode the wanted frames in one pass
+        ver = tag.version
         tver = ver[0] + (ver[1]/10)
         for tid in fs:
+            if (self.frameIds is not None) and (tid not in self.frameIds):
+                continue                                                        #Skipped without being decoded
             frames = fs[tid]
             for frame in frames:
                 self._addTagInfo(tid, tver, frame)
@@ -184,67 +230,67 @@ class Song():
         return af.tag.frame_set
 
     def convert_comment_to_lyrics(self):
-        if self._isBadFile: return
+        if self.isBad(): return
         for v in range(2, 0, -1):
             changed = False
-            af = eyed3.load(self.fpath, (v,None,None))
-            if af is not None and af.tag is not None:
-                if "COMM" in af.tag.frame_set:
-                    comm_frames = af.tag.frame_set["COMM"]
+            tag = self._getTag(v)
+            if tag is not None:
+                if "COMM" in tag.frame_set:
+                    comm_frames = tag.frame_set["COMM"]
                     if len(comm_frames) > 1:
                         raise ValueError("Expected only one comment frame, found {}".format(len(comm_frames)))
-                    comment = af.tag.frame_set["COMM"].pop(0)
+                    comment = tag.frame_set["COMM"].pop(0)
                     lyrics = eyed3.id3.frames.LyricsFrame(text=comment.text)
                     print("Converting comment to lyrics for {}".format(self.fpath))
-                    af.tag.frame_set["USLT"] = lyrics
-                    atv = af.tag.version
+                    tag.frame_set["USLT"] = lyrics
+                    atv = tag.version
                     if atv[0] == 2:
-                        af.tag.save(version=(2,4,0))
+                        self._saveTag(tag, (2,4,0))
                     else:
-                        af.tag.save(version=atv)
+                        self._saveTag(tag, atv)
                     self.updateTags()
                     break
                     
     def remove_tag(self, tag_id, tag_val):
-        if self._isBadFile: return
+        if self.isBad(): return
         for v in range(2, 0, -1):                                                #Check V2 then V1
             changed = False
-            af = eyed3.load(self.fpath, (v,None,None))                            #Load the tags for the selected version
-            if af.tag is not None:                                                #If there are any tags
-                if tag_id in af.tag.frame_set:
-                    for i, frame in enumerate(af.tag.frame_set[tag_id]):
+            tag = self._getTag(v)                                                 #Load the tags for the selected version
+            if tag is not None:                                                   #If there are any tags
+                if tag_id in tag.frame_set:
+                    for i, frame in enumerate(tag.frame_set[tag_id]):
                         if hasattr(frame, "text") and frame.text == tag_val:
                             print("Removing {} # {} from {}".format(tag_id, i, self.fpath))
-                            af.tag.frame_set[tag_id].pop(i)
+                            tag.frame_set[tag_id].pop(i)
                             changed = True
                             break
 
                 if changed:                                                        #If a change was made
-                    atv = af.tag.version                                        #Check the version number of the tag
+                    atv = tag.version                                           #Check the version number of the tag
                     if atv[0] == 2:                                            #If it's version 2
-                        af.tag.save(version=(2,4,0))                            #Save as version 2.4
+                        self._saveTag(tag, (2,4,0))                             #Save as version 2.4
                     else:                                                        #Otherwise if it's version 1
-                        af.tag.save(version=atv)                                #Save as its original version
+                        self._saveTag(tag, atv)                                 #Save as its original version
                     self.updateTags()
 
     def remTags(self, toRemove):
-        if self._isBadFile: return
+        if self.isBad(): return
         for v in range(2, 0, -1):                                                #Check V2 then V1
             changed = False
-            af = eyed3.load(self.fpath, (v,None,None))                            #Load the tags for the selected version
-            if af.tag is not None:                                                #If there are any tags
+            tag = self._getTag(v)                                                 #Load the tags for the selected version
+            if tag is not None:                                                   #If there are any tags
                 for tagid in toRemove:                                            #Iterate through the tags to be removed
                     trv = toRemove[tagid]                                        #Get the version to be removed
                     if (trv is None) or (int(trv) == v):                        #If the version isn't set or matches the selected version
-                        if tagid in af.tag.frame_set:                            #If the tag id is present in the file
-                            af.tag.frame_set.pop(tagid)                        #Remove it
+                        if tagid in tag.frame_set:                               #If the tag id is present in the file
+                            tag.frame_set.pop(tagid)                           #Remove it
                             changed = True                                        #Indicate that a change was made that should be saved
                 if changed:                                                        #If a change was made
-                    atv = af.tag.version                                        #Check the version number of the tag
+                    atv = tag.version                                           #Check the version number of the tag
                     if atv[0] == 2:                                            #If it's version 2
-                        af.tag.save(version=(2,4,0))                            #Save as version 2.4
+                        self._saveTag(tag, (2,4,0))                             #Save as version 2.4
                     else:                                                        #Otherwise if it's version 1
-                        af.tag.save(version=atv)                                #Save as its original version
+                        self._saveTag(tag, atv)                                 #Save as its original version
         self.updateTags()
     
     def getArtist(self):        return self.getTagVal("TPE1")
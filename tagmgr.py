@@ -89,24 +89,29 @@ def main():
     elif args.analyzeDupes:
         pmgr = PlacementManager(None)
     
+    frameIds = None                                                              #Only read the frames that will be used
+    if not args.printTags:
+        frameIds = set(Song.placementTags) | (set(toShow) if showFilter else set())
+    lazyInfo = not (reorganize or args.analyzeDupes)                             #Bitrates are only used to place songs
+    
     efmt = (('cp' if copyMode else 'mv') + ' "{}" "{}"\n') if export else None    #Set the export format string
-    paths = getFilteredPaths(args.dir, "mp3")
-    rfmt = "{:" + str(max([len(p) for p in paths])) + "} -> {}"                #Set the reorganize format string
+    paths = iter_files(args.dir, "mp3")                                          #Processed as they are found
+    pw = 0
     c = 0
-    t = len(paths)
-    spfmt = "[{}][{:7.2%}|{:"+str(len(str(t)))+"d}/"+str(t)+"][{:,.2f} files/sec]Current: {}"
+    spfmt = "[{}][{:,d} files][{:,.2f} files/sec]Current: {}"
     pt = PerfTimer()
     last_time = pt.elapsed()
     
     for path in paths:
         c += 1
+        pw = max(pw, len(path))
         dt = pt.elapsed()
         rate = c/dt
         if ((dt - last_time) > 0.25):
             last_time = dt
-            clio.showf(spfmt, fTime(dt), c/t, c, rate, path)
+            clio.showf(spfmt, fTime(dt), c, rate, path)
         
-        song = Song(path)
+        song = Song(path, frameIds, lazyInfo)
         compStr = " [Compilation]" if song.hasTag("TCMP") else ""
         
         if removeMode:
@@ -158,6 +163,7 @@ def main():
         if limit and (args.limit <= c):
             break
     
+    rfmt = "{:" + str(pw) + "} -> {}"                                          #Set the reorganize format string
     if reorganize:
         if args.undupe:
             moves = pmgr.analyzeSongs()